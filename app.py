@@ -1,5 +1,7 @@
 import streamlit as st
+import html
 import sys
+import time
 from pathlib import Path
 import logging
 from datetime import datetime
@@ -7,9 +9,14 @@ from datetime import datetime
 # Add project root to path
 sys.path.insert(0, str(Path(__file__).parent))
 
-from utils import PDFParser, TextAnalyzer, Visualizer
+from utils import Visualizer, RollupEngine, DedupIndex, BillSearchIndex
+from utils.jobs import JobManager, ANALYZING, DONE, FAILED, CANCELLED
+from utils.profiling import file_hash
 from models import LLMHandler
-from config import UPLOAD_DIR, CURRENCY
+from config import UPLOAD_DIR, CURRENCY, LANGUAGES
+
+# Seconds between reruns while background work is in progress
+POLL_INTERVAL = 0.5
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -76,16 +83,48 @@ def initialize_session_state():
         st.session_state.parsed_data = None
     if 'analyzed_data' not in st.session_state:
         st.session_state.analyzed_data = None
-    if 'llm_handler' not in st.session_state:
-        st.session_state.llm_handler = None
+    if 'job_key' not in st.session_state:
+        st.session_state.job_key = None
+    if 'job_manager' not in st.session_state:
+        st.session_state.job_manager = JobManager(
+            explainer_factory=load_llm,
+            rollups=load_rollups(),
+            dedup=load_dedup_index(),
+            search=load_search_index()
+        )
+
+
+@st.cache_resource(show_spinner=False)
+def load_rollups():
+    """Portfolio rollups shared by all sessions, loaded from ROLLUP_FILE"""
+    return RollupEngine()
+
+
+@st.cache_resource(show_spinner=False)
+def load_dedup_index():
+    """Duplicate-upload index shared by all sessions"""
+    return DedupIndex()
+
+
+@st.cache_resource(show_spinner=False)
+def load_search_index():
+    """Search index of processed bills, shared by all sessions"""
+    return BillSearchIndex()
 
 
+@st.cache_resource(show_spinner=False)
 def load_llm():
-    """Load LLM model with caching"""
-    if st.session_state.llm_handler is None:
-        with st.spinner("Loading AI model... This may take a minute on first run."):
-            st.session_state.llm_handler = LLMHandler()
-    return st.session_state.llm_handler
+    """Load the LLM once per process (called from a background worker)"""
+    return LLMHandler()
+
+
+def reset_bill_state():
+    """Cancel work for the previous upload and clear its results"""
+    if st.session_state.job_key is not None:
+        st.session_state.job_manager.cancel(st.session_state.job_key)
+    st.session_state.job_key = None
+    st.session_state.parsed_data = None
+    st.session_state.analyzed_data = None
 
 
 def main():
@@ -116,6 +155,13 @@ def main():
             help="Upload your utility bill in PDF format"
         )
         
+        st.selectbox(
+            "🌐 Explanation language",
+            options=list(LANGUAGES),
+            format_func=lambda code: LANGUAGES[code][0],
+            key='language'
+        )
+        
         st.markdown("---")
         st.header("ℹ️ About")
         st.markdown("""
@@ -142,7 +188,12 @@ def main():
     if uploaded_file is not None:
         process_bill(uploaded_file)
     else:
+        if st.session_state.job_key is not None:
+            reset_bill_state()
         show_demo_info()
+        if load_rollups().bills:
+            st.markdown("---")
+            show_portfolio()
 
 
 def show_demo_info():
@@ -192,59 +243,57 @@ def show_demo_info():
 
 
 def process_bill(uploaded_file):
-    """Process uploaded bill file"""
-    
-    # Create tabs for different sections
-    tab1, tab2, tab3, tab4 = st.tabs([
-        "📊 Overview", 
-        "🤖 AI Explanation", 
-        "📈 Visualizations", 
-        "⚠️ Alerts & Insights"
-    ])
-    
-    # Parse PDF
-    if st.session_state.parsed_data is None:
-        with st.spinner("📄 Extracting text from PDF..."):
-            try:
-                parser = PDFParser()
-                st.session_state.parsed_data = parser.parse_pdf(uploaded_file)
-                st.success("✅ PDF parsed successfully!")
-            except Exception as e:
-                st.error(f"❌ Error parsing PDF: {str(e)}")
-                return
+    """Process uploaded bill file in the background, rendering results as they arrive"""
+    manager = st.session_state.job_manager
+    file_bytes = uploaded_file.getvalue()
+    
+    # A different file was uploaded: drop the old one's work and results, and
+    # restart it if an earlier upload of it failed or was cancelled
+    new_upload = st.session_state.job_key != file_hash(file_bytes)
+    if new_upload:
+        reset_bill_state()
+    job = manager.submit(file_bytes, uploaded_file.name, retry=new_upload)
+    st.session_state.job_key = job.key
+    
+    # One status read per run: DONE is set together with the results
+    status = job.status
+    if status in (FAILED, CANCELLED):
+        if status == FAILED:
+            st.error(f"❌ Error processing bill: {job.error}")
+        else:
+            st.warning("Processing was cancelled.")
+        if st.button("🔄 Retry"):
+            manager.submit(file_bytes, uploaded_file.name, retry=True)
+            st.rerun()
+        return
+    
+    if status != DONE:
+        if status == ANALYZING:
+            text = "🔍 Analyzing charges..."
+        else:
+            pages = f" (page {job.pages_done} of {job.pages_total})" if job.pages_total else ""
+            text = f"📄 Extracting text from PDF...{pages}"
+        st.progress(job.progress, text=text)
+        rerun_shortly()
+        return
+    st.session_state.parsed_data = job.parsed
+    st.session_state.analyzed_data = job.analysis
     
     parsed_data = st.session_state.parsed_data
-    
-    # Analyze charges
-    if st.session_state.analyzed_data is None:
-        with st.spinner("🔍 Analyzing charges..."):
-            try:
-                analyzer = TextAnalyzer()
-                charges = analyzer.analyze_charges(
-                    parsed_data['text'],
-                    parsed_data['structured_data']
-                )
-                anomalies = analyzer.detect_anomalies(charges)
-                insights = analyzer.generate_insights(
-                    charges,
-                    parsed_data['structured_data'].get('bill_type')
-                )
-                
-                st.session_state.analyzed_data = {
-                    'charges': charges,
-                    'anomalies': anomalies,
-                    'insights': insights
-                }
-                st.success("✅ Analysis complete!")
-            except Exception as e:
-                st.error(f"❌ Error analyzing bill: {str(e)}")
-                return
-    
     analyzed_data = st.session_state.analyzed_data
     charges = analyzed_data['charges']
     anomalies = analyzed_data['anomalies']
     insights = analyzed_data['insights']
     
+    # Create tabs for different sections
+    tab1, tab2, tab3, tab4, tab5 = st.tabs([
+        "📊 Overview", 
+        "🤖 AI Explanation", 
+        "📈 Visualizations", 
+        "⚠️ Alerts & Insights",
+        "📁 Portfolio"
+    ])
+    
     # TAB 1: Overview
     with tab1:
         show_overview(parsed_data, charges)
@@ -260,6 +309,20 @@ def process_bill(uploaded_file):
     # TAB 4: Alerts & Insights
     with tab4:
         show_alerts_insights(anomalies, insights)
+    
+    # TAB 5: Portfolio
+    with tab5:
+        show_portfolio()
+    
+    # Keep polling while an explanation is being generated
+    if job.pending_explanations:
+        rerun_shortly()
+
+
+def rerun_shortly():
+    """Rerun the script after a short pause to pick up background progress"""
+    time.sleep(POLL_INTERVAL)
+    st.rerun()
 
 
 def show_overview(parsed_data, charges):
@@ -350,3 +413,99 @@ def show_overview(parsed_data, charges):
         st.write("**Pages:**", parsed_data['metadata']['num_pages'])
 
 
+def show_ai_explanation(parsed_data, charges):
+    """Display AI explanation tab content"""
+    st.header("🤖 AI Explanation")
+    
+    manager = st.session_state.job_manager
+    job = manager.get(st.session_state.job_key)
+    language = st.session_state.get('language', 'en')
+    
+    if language in job.explanations:
+        st.markdown(job.explanations[language])
+    elif language in job.pending_explanations:
+        st.info("⏳ Generating explanation... The other tabs stay available meanwhile. "
+                "The first run also loads the AI model, which may take a minute.")
+    else:
+        if language in job.explanation_errors:
+            st.error(f"❌ Error generating explanation: {job.explanation_errors[language]}")
+        if st.button("✨ Generate AI Explanation"):
+            manager.request_explanation(job.key, language)
+            st.rerun()
+
+
+def show_visualizations(charges):
+    """Display visualizations tab content"""
+    st.header("📈 Visualizations")
+    
+    if not charges.get('summary'):
+        st.info("No categorized charges to chart for this bill.")
+        return
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        pie_chart = Visualizer.create_pie_chart(charges['summary'])
+        if pie_chart is not None:
+            st.plotly_chart(pie_chart, use_container_width=True)
+    
+    with col2:
+        bar_chart = Visualizer.create_bar_chart(charges['summary'])
+        if bar_chart is not None:
+            st.plotly_chart(bar_chart, use_container_width=True)
+
+
+def show_alerts_insights(anomalies, insights):
+    """Display alerts and insights tab content"""
+    st.header("⚠️ Alerts & Insights")
+    
+    st.subheader("🔍 Detected Issues")
+    if anomalies:
+        for anomaly in anomalies:
+            css_class = 'anomaly-alert' if anomaly.get('severity') == 'alert' else 'anomaly-warning'
+            st.markdown(
+                f'<div class="{css_class}"><strong>{html.escape(anomaly["message"])}</strong><br>'
+                f'💡 {html.escape(anomaly.get("suggestion", ""))}</div>',
+                unsafe_allow_html=True
+            )
+    else:
+        st.success("✅ No unusual charges detected.")
+    
+    st.subheader("💡 Insights")
+    if insights:
+        for insight in insights:
+            st.markdown(f'<div class="insight-box">{html.escape(insight)}</div>', unsafe_allow_html=True)
+    else:
+        st.info("No additional insights for this bill.")
+
+
+def show_portfolio():
+    """Display spend across every processed bill, from the pre-aggregated rollups"""
+    st.header("📁 Portfolio")
+    
+    rollups = load_rollups()
+    if not rollups.bills:
+        st.info("Processed bills will be summarized here.")
+        return
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Bills Processed", len(rollups.bills))
+    with col2:
+        st.metric("Total Spend", f"Rs. {sum(rollups.rollup('provider').values()):,.2f}")
+    
+    by_provider = Visualizer.create_portfolio_chart(
+        rollups.rollup('month', 'provider'), title="Monthly Spend by Provider"
+    )
+    if by_provider is not None:
+        st.plotly_chart(by_provider, use_container_width=True)
+    
+    by_category = Visualizer.create_portfolio_chart(
+        rollups.rollup('month', 'category'), title="Monthly Spend by Category"
+    )
+    if by_category is not None:
+        st.plotly_chart(by_category, use_container_width=True)
+
+
+if __name__ == "__main__":
+    main()
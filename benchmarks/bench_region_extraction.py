@@ -0,0 +1,75 @@
+"""
+Benchmark crop-based region extraction against full-page parsing.
+
+Usage:
+    python benchmarks/bench_region_extraction.py bill1.pdf bill2.pdf --provider CEB
+    python benchmarks/bench_region_extraction.py bills/*.pdf --learn-from sample.pdf
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils import PDFParser
+from config import BILL_REGIONS
+
+
+def time_parse(path: Path, regions=None, repeats: int = 3) -> float:
+    """Return the median wall time in milliseconds for one parse of a bill"""
+    timings = []
+    for _ in range(repeats):
+        parser = PDFParser()
+        start = time.perf_counter()
+        parser.parse_pdf(str(path), regions=regions)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('pdfs', nargs='+', type=Path, help='Bills to benchmark')
+    arg_parser.add_argument('--provider', default='CEB', choices=sorted(BILL_REGIONS),
+                            help='Use the configured regions for this provider')
+    arg_parser.add_argument('--learn-from', type=Path,
+                            help='Learn regions from this sample bill instead')
+    arg_parser.add_argument('--repeats', type=int, default=3)
+    arg_parser.add_argument('--json', action='store_true', help='Emit JSON results')
+    args = arg_parser.parse_args()
+    
+    if args.learn_from:
+        regions = PDFParser().learn_regions(str(args.learn_from))
+    else:
+        regions = BILL_REGIONS[args.provider]
+    
+    results = []
+    for path in args.pdfs:
+        full_ms = time_parse(path, repeats=args.repeats)
+        crop_ms = time_parse(path, regions=regions, repeats=args.repeats)
+        results.append({
+            'bill': path.name,
+            'full_page_ms': round(full_ms, 2),
+            'region_ms': round(crop_ms, 2),
+            'speedup': round(full_ms / crop_ms, 2) if crop_ms else None
+        })
+    
+    if args.json:
+        print(json.dumps({'regions': regions, 'results': results}, indent=2))
+        return
+    
+    print(f"{'bill':40} {'full (ms)':>12} {'regions (ms)':>14} {'speedup':>9}")
+    for row in results:
+        print(f"{row['bill'][:40]:40} {row['full_page_ms']:>12.2f} "
+              f"{row['region_ms']:>14.2f} {row['speedup'] or 0:>8.2f}x")
+    if results:
+        print(f"\nMedian per bill: full {statistics.median(r['full_page_ms'] for r in results):.2f} ms, "
+              f"regions {statistics.median(r['region_ms'] for r in results):.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+"""
+Synthetic Sri Lankan bill corpus for benchmarks.
+
+Generates CEB, LECO, NWSDB, Dialog and hospital bills as PDFs, either with
+a text layer or as scanned (image-only) pages. Layouts follow the regions
+in config.BILL_REGIONS so region extraction can be benchmarked too.
+
+Usage:
+    python benchmarks/corpus.py --out data/bench_corpus --pages 1 10 100 --scanned
+"""
+import argparse
+import random
+import zlib
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+PAGE_WIDTH = 595  # A4 in points
+PAGE_HEIGHT = 842
+LINE_HEIGHT = 14
+SCAN_DPI = 150
+
+PROVIDERS = {
+    'CEB': {
+        'name': 'Ceylon Electricity Board (CEB)',
+        'bill_type': 'Electricity',
+        'unit': 'kWh',
+        'items': [
+            ('Fixed Charge', 400, 1000),
+            ('Energy Charge - Usage', 1500, 12000),
+            ('Fuel Adjustment Charge', 100, 900),
+            ('Surcharge', 50, 500),
+            ('Late Fee', 100, 300),
+            ('Reconnection Charge', 1000, 3000)
+        ]
+    },
+    'LECO': {
+        'name': 'Lanka Electricity Company (LECO)',
+        'bill_type': 'Electricity',
+        'unit': 'kWh',
+        'items': [
+            ('Fixed Charge', 400, 1000),
+            ('Energy Charge - Usage', 1500, 10000),
+            ('Meter Rental', 100, 200),
+            ('Interest on Arrears', 50, 400)
+        ]
+    },
+    'NWSDB': {
+        'name': 'National Water Supply and Drainage Board (NWSDB)',
+        'bill_type': 'Water',
+        'unit': 'm3',
+        'items': [
+            ('Service Charge', 300, 600),
+            ('Water Usage Charge', 500, 5000),
+            ('Sewerage Charge', 200, 1200),
+            ('Late Payment Penalty', 50, 250)
+        ]
+    },
+    'Dialog': {
+        'name': 'Dialog Axiata PLC',
+        'bill_type': 'Telecom',
+        'unit': 'GB',
+        'items': [
+            ('Monthly Rental', 500, 3000),
+            ('Data Usage GB', 200, 4000),
+            ('IDD Calls Usage', 50, 2000),
+            ('Roaming Usage', 100, 8000),
+            ('Loyalty Discount', 50, 500)
+        ]
+    },
+    'hospital': {
+        'name': 'Asiri Hospital - Patient Bill',
+        'bill_type': 'Hospital',
+        'unit': 'days',
+        'items': [
+            ('Room Charges', 5000, 40000),
+            ('Doctor Consultation Fee', 2000, 10000),
+            ('Laboratory Investigations', 1000, 15000),
+            ('Pharmacy Charges', 500, 20000),
+            ('Medical Consumables', 200, 8000),
+            ('Hospital Service Charge', 1000, 5000)
+        ]
+    }
+}
+
+
+def build_bill(provider: str, pages: int = 1, line_items: int = 10, seed: int = 0) -> Dict:
+    """
+    Build the content of a synthetic bill
+    
+    Args:
+        provider: One of PROVIDERS
+        pages: Total number of pages (extra pages carry usage detail)
+        line_items: Number of charge line items
+        seed: Random seed, so corpora are reproducible
+    
+    Returns:
+        Dictionary with the page lines and the expected field values
+    """
+    spec = PROVIDERS[provider]
+    rng = random.Random(f"{provider}-{pages}-{line_items}-{seed}")
+    
+    period_start = date(2025, 1, 1) + timedelta(days=30 * rng.randint(0, 11))
+    period_end = period_start + timedelta(days=29)
+    account = f"{rng.randint(10, 99)}-{rng.randint(1000000, 9999999)}"
+    units = rng.randint(30, 450)
+    
+    items = []
+    for index in range(line_items):
+        description, low, high = spec['items'][index % len(spec['items'])]
+        if index >= len(spec['items']):
+            description = f"{description} ({index // len(spec['items']) + 1})"
+        items.append((description, round(rng.uniform(low, high), 2)))
+    
+    subtotal = sum(amount for _, amount in items)
+    vat = round(subtotal * 0.15, 2)
+    items.append(('VAT 15%', vat))
+    total = round(subtotal + vat, 2)
+    
+    header = [
+        (0.05, spec['name']),
+        (0.08, f"{spec['bill_type']} Bill"),
+        (0.12, f"Account No: {account}"),
+        (0.15, f"Billing Period: {period_start:%d/%m/%Y} - {period_end:%d/%m/%Y}"),
+        (0.18, f"Units Consumed: {units} {spec['unit']}"),
+        (0.30, "Description                                   Amount (Rs.)")
+    ]
+    
+    # Charges table between 0.32 and 0.74 of the first page, overflowing to
+    # continuation pages when there are more items than fit
+    table_rows = int((0.74 - 0.32) * PAGE_HEIGHT / LINE_HEIGHT)
+    charge_lines = [f"{description:<45} {amount:>12,.2f}" for description, amount in items]
+    
+    page_lines: List[List[Tuple[float, str]]] = []
+    first_page = list(header)
+    for row, line in enumerate(charge_lines[:table_rows]):
+        first_page.append((0.32 + row * LINE_HEIGHT / PAGE_HEIGHT, line))
+    first_page.append((0.80, f"Total Amount Due: Rs. {total:,.2f}"))
+    first_page.append((0.84, f"Please pay before {period_end + timedelta(days=21):%d/%m/%Y}"))
+    page_lines.append(first_page)
+    
+    rows_per_page = int(0.85 * PAGE_HEIGHT / LINE_HEIGHT)
+    remaining = charge_lines[table_rows:]
+    detail_day = 0
+    while len(page_lines) < pages or remaining:
+        page = [(0.05, f"{spec['name']} - continued (page {len(page_lines) + 1})")]
+        for row in range(rows_per_page):
+            top = 0.08 + row * LINE_HEIGHT / PAGE_HEIGHT
+            if remaining:
+                page.append((top, remaining.pop(0)))
+            else:
+                # Usage detail lines: no trailing amount, like real annexures
+                day = period_start + timedelta(days=detail_day % 30)
+                reading = rng.randint(10000, 99999)
+                usage = rng.uniform(0.5, 20)
+                page.append((top, f"Ref #{detail_day} {day:%d/%m/%Y} reading {reading} "
+                                  f"usage {usage:.1f} {spec['unit']} (actual)"))
+                detail_day += 1
+        page_lines.append(page)
+    
+    return {
+        'provider': provider,
+        'pages': page_lines,
+        'expected': {
+            'account_number': account,
+            'total_amount': total,
+            'line_items': len(items),
+            'units': units,
+            'period_start': period_start.isoformat(),
+            'period_end': period_end.isoformat()
+        }
+    }
+
+
+def _escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _write_pdf(page_streams: List[Tuple[bytes, Dict[str, bytes]]]) -> bytes:
+    """
+    Assemble a minimal PDF
+    
+    Args:
+        page_streams: (content stream, {xobject name: image object body}) per page
+    """
+    objects: List[bytes] = []
+    
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+    
+    catalog = add(b'')  # Filled in once the page tree exists
+    pages_obj = add(b'')
+    font = add(b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>')
+    
+    page_ids = []
+    for content, images in page_streams:
+        xobjects = b''
+        if images:
+            refs = b' '.join(b'/%s %d 0 R' % (name.encode(), add(body)) for name, body in images.items())
+            xobjects = b' /XObject << ' + refs + b' >>'
+        stream = zlib.compress(content)
+        content_id = add(b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(stream)
+                         + stream + b'\nendstream')
+        page_ids.append(add(
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] '
+            b'/Resources << /Font << /F1 %d 0 R >>%s >> /Contents %d 0 R >>'
+            % (pages_obj, PAGE_WIDTH, PAGE_HEIGHT, font, xobjects, content_id)
+        ))
+    
+    objects[catalog - 1] = b'<< /Type /Catalog /Pages %d 0 R >>' % pages_obj
+    objects[pages_obj - 1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % page_id for page_id in page_ids), len(page_ids))
+    
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        out += b'%010d 00000 n \n' % offset
+    out += b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (
+        len(objects) + 1, catalog, xref)
+    return bytes(out)
+
+
+def _text_page(lines: List[Tuple[float, str]]) -> bytes:
+    ops = [b'BT', b'/F1 9 Tf']
+    for top, text in lines:
+        y = PAGE_HEIGHT * (1 - top) - 9
+        ops.append(b'1 0 0 1 36 %.2f Tm (%s) Tj' % (y, _escape(text).encode('latin-1', 'replace')))
+    ops.append(b'ET')
+    return b'\n'.join(ops)
+
+
+def _scanned_page(lines: List[Tuple[float, str]], seed: int) -> Tuple[bytes, Dict[str, bytes]]:
+    from PIL import Image, ImageDraw, ImageFont
+    
+    scale = SCAN_DPI / 72
+    width, height = int(PAGE_WIDTH * scale), int(PAGE_HEIGHT * scale)
+    img = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(img)
+    try:
+        font = ImageFont.truetype('DejaVuSansMono.ttf', int(9 * scale))
+    except OSError:
+        font = ImageFont.load_default()
+    
+    # Slight skew and noise so OCR sees something closer to a real scan
+    rng = random.Random(seed)
+    for top, text in lines:
+        draw.text((36 * scale + rng.uniform(-2, 2), top * height), text, fill=0, font=font)
+    img = img.rotate(rng.uniform(-0.6, 0.6), fillcolor=255)
+    
+    data = zlib.compress(img.tobytes())
+    image = (b'<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray '
+             b'/BitsPerComponent 8 /Filter /FlateDecode /Length %d >>\nstream\n'
+             % (width, height, len(data)) + data + b'\nendstream')
+    content = b'q %d 0 0 %d 0 0 cm /Im0 Do Q' % (PAGE_WIDTH, PAGE_HEIGHT)
+    return content, {'Im0': image}
+
+
+def render_pdf(bill: Dict, scanned: bool = False) -> bytes:
+    """Render a bill from build_bill() to PDF bytes"""
+    if scanned:
+        streams = [_scanned_page(lines, index) for index, lines in enumerate(bill['pages'])]
+    else:
+        streams = [(_text_page(lines), {}) for lines in bill['pages']]
+    return _write_pdf(streams)
+
+
+def generate_bill(provider: str, pages: int = 1, line_items: int = 10,
+                  scanned: bool = False, seed: int = 0) -> bytes:
+    """Generate one synthetic bill PDF"""
+    return render_pdf(build_bill(provider, pages, line_items, seed), scanned=scanned)
+
+
+def generate_corpus(out_dir: Path, providers: List[str] = None, page_counts: List[int] = None,
+                    line_items: int = 10, scanned: bool = False, seed: int = 0) -> List[Path]:
+    """
+    Write a corpus of bills to disk
+    
+    Returns:
+        Paths of the generated PDFs
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for provider in providers or list(PROVIDERS):
+        for pages in page_counts or [1]:
+            variants = [False, True] if scanned else [False]
+            for is_scanned in variants:
+                kind = 'scanned' if is_scanned else 'text'
+                path = out_dir / f"{provider}_{pages}p_{line_items}items_{kind}.pdf"
+                path.write_bytes(generate_bill(provider, pages, line_items, is_scanned, seed))
+                paths.append(path)
+    return paths
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--out', type=Path, default=Path('data/bench_corpus'))
+    arg_parser.add_argument('--providers', nargs='+', choices=sorted(PROVIDERS))
+    arg_parser.add_argument('--pages', nargs='+', type=int, default=[1])
+    arg_parser.add_argument('--line-items', type=int, default=10)
+    arg_parser.add_argument('--scanned', action='store_true', help='Also write scanned variants')
+    arg_parser.add_argument('--seed', type=int, default=0)
+    args = arg_parser.parse_args()
+    
+    paths = generate_corpus(args.out, args.providers, args.pages, args.line_items,
+                            args.scanned, args.seed)
+    print(f"Wrote {len(paths)} bills to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,522 @@
+"""
+Benchmark harness for the BillBuster pipeline.
+
+Runs each registered benchmark against the synthetic corpus and writes
+machine-readable results that can be compared across commits.
+
+Usage:
+    python benchmarks/run.py                          # quick suite, print table
+    python benchmarks/run.py --full --out results.json
+    python benchmarks/run.py --filter parse_pdf --compare baseline.json
+"""
+import argparse
+import io
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.corpus import build_bill, render_pdf
+
+BENCHMARKS: List[Dict] = []
+
+
+class SkipBenchmark(Exception):
+    """Raised by a benchmark setup when it cannot run here"""
+
+
+def benchmark(name: str, full_only: bool = False, **params):
+    """Register a setup function returning the callable to time"""
+    def decorator(setup: Callable[..., Callable]):
+        BENCHMARKS.append({'name': name, 'setup': setup, 'params': params, 'full_only': full_only})
+        return setup
+    return decorator
+
+
+def bill_text(bill: Dict) -> str:
+    """Plain text of a synthetic bill, as a text-layer parse would return it"""
+    return "\n\n".join("\n".join(text for _, text in lines) for lines in bill['pages'])
+
+
+def analyzed_bill(provider: str = 'CEB', line_items: int = 10) -> Dict:
+    from utils import TextAnalyzer
+    
+    bill = build_bill(provider, pages=1, line_items=line_items)
+    charges = TextAnalyzer().analyze_charges(bill_text(bill), {'amounts': []})
+    return {
+        'charges': charges,
+        'structured_data': {'bill_type': 'electricity'}
+    }
+
+
+# PDF parsing
+
+def _parse_setup(pages: int, scanned: bool = False, regions: bool = False):
+    from utils import PDFParser
+    from config import BILL_REGIONS
+    
+    if scanned and shutil.which('tesseract') is None:
+        raise SkipBenchmark('tesseract binary not found')
+    pdf_bytes = render_pdf(build_bill('CEB', pages=pages, line_items=20), scanned=scanned)
+    region_spec = BILL_REGIONS['CEB'] if regions else None
+    return lambda: PDFParser().parse_pdf(io.BytesIO(pdf_bytes), regions=region_spec)
+
+
+@benchmark('parse_pdf[text-1p]')
+def bench_parse_text_1p():
+    return _parse_setup(1)
+
+
+@benchmark('parse_pdf[text-50p]')
+def bench_parse_text_50p():
+    return _parse_setup(50)
+
+
+@benchmark('parse_pdf[text-500p]', full_only=True)
+def bench_parse_text_500p():
+    return _parse_setup(500)
+
+
+@benchmark('parse_pdf[scanned-1p]')
+def bench_parse_scanned_1p():
+    return _parse_setup(1, scanned=True)
+
+
+@benchmark('parse_pdf[scanned-10p]', full_only=True)
+def bench_parse_scanned_10p():
+    return _parse_setup(10, scanned=True)
+
+
+@benchmark('parse_pdf[regions-50p]')
+def bench_parse_regions_50p():
+    return _parse_setup(50, regions=True)
+
+
+@benchmark('extract_structured_data[50p]')
+def bench_structured_data():
+    from utils import PDFParser
+    
+    parser = PDFParser()
+    parser.text_content = bill_text(build_bill('LECO', pages=50, line_items=100))
+    return parser._extract_structured_data
+
+
+# Analysis
+
+def _analyze_setup(line_items: int):
+    from utils import TextAnalyzer
+    
+    analyzer = TextAnalyzer()
+    text = bill_text(build_bill('CEB', pages=1, line_items=line_items))
+    return lambda: analyzer.analyze_charges(text, {'amounts': []})
+
+
+@benchmark('analyze_charges[10-items]')
+def bench_analyze_10():
+    return _analyze_setup(10)
+
+
+@benchmark('analyze_charges[1000-items]')
+def bench_analyze_1000():
+    return _analyze_setup(1000)
+
+
+@benchmark('detect_anomalies[1000-items]')
+def bench_anomalies():
+    from utils import TextAnalyzer
+    
+    analyzer = TextAnalyzer()
+    charges = analyzed_bill(line_items=1000)['charges']
+    history = [{'total_amount': 20000 + month * 500} for month in range(24)]
+    return lambda: analyzer.detect_anomalies(charges, history)
+
+
+def _portfolio(bills: int) -> List[Dict]:
+    import random
+    
+    from utils import TextAnalyzer
+    
+    analyzer = TextAnalyzer()
+    providers = ['CEB', 'LECO', 'NWSDB', 'Dialog', 'hospital']
+    # A few hundred distinct bills repeated, like monthly bills of many branches
+    distinct = [
+        analyzer.analyze_charges(bill_text(build_bill(providers[i % len(providers)], 1,
+                                                      random.Random(i).randint(3, 12), seed=i)),
+                                 {'amounts': []})
+        for i in range(min(bills, 500))
+    ]
+    return [distinct[i % len(distinct)] for i in range(bills)]
+
+
+@benchmark('detect_anomalies[10000-bills-loop]')
+def bench_anomalies_loop():
+    from utils import TextAnalyzer
+    
+    analyzer = TextAnalyzer()
+    bills = _portfolio(10000)
+    return lambda: [analyzer.detect_anomalies(bill) for bill in bills]
+
+
+@benchmark('detect_anomalies_bulk[10000-bills]')
+def bench_anomalies_bulk():
+    from utils import TextAnalyzer
+    
+    analyzer = TextAnalyzer()
+    bills = _portfolio(10000)
+    return lambda: analyzer.detect_anomalies_bulk(bills)
+
+
+@benchmark('tariff.expected_charges[100000-bills]')
+def bench_tariff_batch():
+    import numpy as np
+    from datetime import date
+    
+    from utils.tariffs import TariffEngine
+    
+    engine = TariffEngine()
+    rng = np.random.default_rng(0)
+    units = rng.uniform(0, 600, 100000)
+    providers = ['CEB', 'LECO'] * 50000
+    dates = [date(2025, 1, 1)] * 100000
+    return lambda: engine.expected_charges(providers, units, dates)
+
+
+# Deduplication
+
+def _dedup_setup(bills: int):
+    import random
+    import tempfile
+    
+    from utils.dedup import DedupIndex
+    
+    rng = random.Random(0)
+    index = DedupIndex(Path(tempfile.mkdtemp()) / 'dedup.sqlite')
+    index.add_many((f"bill-{i}", {'simhash': rng.getrandbits(64), 'keys': [f"key-{i}"]})
+                   for i in range(bills))
+    queries = [rng.getrandbits(64) for _ in range(100)]
+    return lambda: [index.find_similar(query, ['missing-key']) for query in queries]
+
+
+@benchmark('dedup.find_similar[100-lookups-100000-bills]')
+def bench_dedup_100k():
+    return _dedup_setup(100000)
+
+
+@benchmark('dedup.find_similar[100-lookups-1000000-bills]', full_only=True)
+def bench_dedup_1m():
+    return _dedup_setup(1000000)
+
+
+# Search
+
+def _search_setup(line_items: int):
+    import random
+    import tempfile
+    
+    from utils.search import BillSearchIndex
+    
+    rng = random.Random(0)
+    providers = ['CEB', 'LECO', 'NWSDB', 'Dialog', 'SLT']
+    descriptions = ['Energy Charge', 'Fixed Charge', 'Fuel Adjustment Charge', 'VAT', 'SSCL',
+                    'Late Payment Surcharge', 'Reconnection Fee', 'Meter Rent', 'Water Charge',
+                    'Sewerage Charge', 'Data Add-on', 'IDD Calls', 'Roaming Charges']
+    index = BillSearchIndex(Path(tempfile.mkdtemp()) / 'search.sqlite', semantic=False)
+    per_bill = 10
+    bills = (
+        (f"bill-{i}", "", {
+            'total_amount': 0.0,
+            'line_items': [{'description': rng.choice(descriptions), 'category': 'Other Charges',
+                            'amount': round(rng.uniform(50, 5000), 2)} for _ in range(per_bill)]
+        }, {
+            'provider': providers[i % len(providers)],
+            'bill_type': 'electricity',
+            'dates': [f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.choice([2024, 2025])}"]
+        })
+        for i in range(line_items // per_bill)
+    )
+    index.add_bills(bills)
+    return lambda: index.search('reconnection fees', provider='LECO',
+                                date_from='2025-01-01', date_to='2025-12-31')
+
+
+@benchmark('search[100000-line-items]')
+def bench_search_100k():
+    return _search_setup(100000)
+
+
+@benchmark('search[1000000-line-items]', full_only=True)
+def bench_search_1m():
+    return _search_setup(1000000)
+
+
+# Storage
+
+def _stored_bills(count: int) -> Dict[str, Dict]:
+    from utils import PDFParser, TextAnalyzer
+    
+    parser, analyzer = PDFParser(), TextAnalyzer()
+    providers = ['CEB', 'LECO', 'NWSDB', 'Dialog', 'hospital']
+    bills = {}
+    for i in range(count):
+        bill = build_bill(providers[i % len(providers)], pages=2, line_items=10 + i % 20, seed=i)
+        page_text = ["\n".join(text for _, text in lines) for lines in bill['pages']]
+        parser.text_content = "\n\n".join(page_text)
+        structured_data = parser._extract_structured_data()
+        bills[f"bill-{i}"] = {
+            'parsed': {'text': parser.text_content, 'tables': [], 'page_text': page_text,
+                       'metadata': {'num_pages': len(page_text), 'metadata': {}},
+                       'structured_data': structured_data},
+            'charges': analyzer.analyze_charges(parser.text_content, structured_data)
+        }
+    return bills
+
+
+def _archive_setup(mode: str, count: int = 1000):
+    import tempfile
+    
+    from utils.archive import BillArchive, BillArchiveWriter
+    
+    bills = _stored_bills(count)
+    directory = Path(tempfile.mkdtemp())
+    archive_path, json_path = directory / 'bills.bbar', directory / 'bills.json'
+    
+    def save_archive():
+        archive_path.unlink(missing_ok=True)
+        with BillArchiveWriter(archive_path) as writer:
+            for bill_id, bill in bills.items():
+                writer.add(bill_id, bill['parsed'], bill['charges'])
+    
+    def save_json():
+        json_path.write_text(json.dumps(bills, default=str))
+    
+    def load_archive():
+        with BillArchive(archive_path) as archive:
+            return [archive.get(bill_id) for bill_id in archive]
+    
+    def load_json():
+        return json.loads(json_path.read_text())
+    
+    def get_one_archive():
+        with BillArchive(archive_path) as archive:
+            return archive.get('bill-500')
+    
+    def get_one_json():
+        return json.loads(json_path.read_text())['bill-500']
+    
+    save_archive()
+    save_json()
+    return {
+        'save_archive': save_archive, 'save_json': save_json,
+        'load_archive': load_archive, 'load_json': load_json,
+        'get_one_archive': get_one_archive, 'get_one_json': get_one_json
+    }[mode]
+
+
+@benchmark('archive.save[1000-bills]')
+def bench_archive_save():
+    return _archive_setup('save_archive')
+
+
+@benchmark('json.save[1000-bills]')
+def bench_json_save():
+    return _archive_setup('save_json')
+
+
+@benchmark('archive.load[1000-bills]')
+def bench_archive_load():
+    return _archive_setup('load_archive')
+
+
+@benchmark('json.load[1000-bills]')
+def bench_json_load():
+    return _archive_setup('load_json')
+
+
+@benchmark('archive.get[1-of-1000-bills]')
+def bench_archive_get():
+    return _archive_setup('get_one_archive')
+
+
+@benchmark('json.get[1-of-1000-bills]')
+def bench_json_get():
+    return _archive_setup('get_one_json')
+
+
+# Visualisation
+
+@benchmark('visualizer.pie_chart')
+def bench_pie():
+    from utils import Visualizer
+    
+    summary = dict(analyzed_bill()['charges']['summary'])
+    return lambda: Visualizer.create_pie_chart(summary)
+
+
+@benchmark('visualizer.bar_chart')
+def bench_bar():
+    from utils import Visualizer
+    
+    summary = dict(analyzed_bill()['charges']['summary'])
+    return lambda: Visualizer.create_bar_chart(summary)
+
+
+def _history(points: int) -> List[Dict]:
+    import random
+    
+    rng = random.Random(points)
+    return [{'date': f"{2000 + month // 12}-{month % 12 + 1:02d}-01", 'amount': rng.uniform(2000, 20000)}
+            for month in range(points)]
+
+
+@benchmark('visualizer.comparison_chart[24-points]')
+def bench_comparison_24():
+    from utils import Visualizer
+    
+    history = _history(24)
+    return lambda: Visualizer.create_comparison_chart(history)
+
+
+@benchmark('visualizer.comparison_chart[5000-points]')
+def bench_comparison_5000():
+    from utils import Visualizer
+    
+    history = _history(5000)
+    return lambda: Visualizer.create_comparison_chart(history)
+
+
+@benchmark('visualizer.comparison_chart[5000-points-uncached]')
+def bench_comparison_5000_uncached():
+    from utils import Visualizer
+    
+    history = _history(5000)
+    
+    def build():
+        Visualizer.clear_cache()
+        return Visualizer.create_comparison_chart(history)
+    return build
+
+
+# Explanations
+
+@benchmark('fallback_explanation')
+def bench_fallback():
+    from models import LLMHandler
+    
+    handler = LLMHandler(load_model=False)
+    bill_data = analyzed_bill()
+    return lambda: handler.explain_bill(bill_data)
+
+
+@benchmark('fallback_explanation[1000-bills]')
+def bench_fallback_1000():
+    from models import LLMHandler
+    
+    handler = LLMHandler(load_model=False)
+    bill_types = ['electricity', 'water', 'telecom', 'medical', None]
+    bills = [
+        {'charges': charges, 'structured_data': {'bill_type': bill_types[i % len(bill_types)]}}
+        for i, charges in enumerate(_portfolio(1000))
+    ]
+    return lambda: [handler.explain_bill(bill) for bill in bills]
+
+
+def run_benchmark(func: Callable, min_time: float, max_runs: int) -> Dict:
+    """Time func repeatedly (after one warm-up call) and summarise"""
+    func()
+    timings = []
+    start = time.perf_counter()
+    while len(timings) < max_runs and (len(timings) < 3 or time.perf_counter() - start < min_time):
+        t0 = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - t0) * 1000)
+    return {
+        'runs': len(timings),
+        'min_ms': min(timings),
+        'median_ms': statistics.median(timings),
+        'mean_ms': statistics.mean(timings),
+        'stdev_ms': statistics.stdev(timings) if len(timings) > 1 else 0.0
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=Path(__file__).parent, text=True).strip()
+    except Exception:
+        return None
+
+
+def run_suite(name_filter: str = None, full: bool = False,
+              min_time: float = 1.0, max_runs: int = 200) -> Dict:
+    """Run the registered benchmarks and return the results document"""
+    results = {}
+    for entry in BENCHMARKS:
+        if name_filter and name_filter not in entry['name']:
+            continue
+        if entry['full_only'] and not full:
+            continue
+        try:
+            func = entry['setup']()
+            results[entry['name']] = {'status': 'ok', **run_benchmark(func, min_time, max_runs)}
+        except (SkipBenchmark, ImportError) as e:
+            results[entry['name']] = {'status': 'skipped', 'reason': str(e)}
+        except Exception as e:
+            results[entry['name']] = {'status': 'error', 'reason': f"{type(e).__name__}: {e}"}
+    
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results
+    }
+
+
+def print_results(document: Dict, baseline: Optional[Dict] = None):
+    base = (baseline or {}).get('results', {})
+    header = f"{'benchmark':45} {'median (ms)':>12} {'min (ms)':>10} {'runs':>6}"
+    if baseline:
+        header += f" {'vs ' + str(baseline.get('commit')):>14}"
+    print(header)
+    for name, result in document['results'].items():
+        if result['status'] != 'ok':
+            print(f"{name:45} {result['status']}: {result['reason']}")
+            continue
+        line = f"{name:45} {result['median_ms']:>12.3f} {result['min_ms']:>10.3f} {result['runs']:>6}"
+        old = base.get(name, {})
+        if old.get('status') == 'ok':
+            line += f" {result['median_ms'] / old['median_ms']:>13.2f}x"
+        print(line)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--filter', help='Only run benchmarks whose name contains this')
+    arg_parser.add_argument('--full', action='store_true', help='Include the slow large-bill cases')
+    arg_parser.add_argument('--min-time', type=float, default=1.0, help='Seconds per benchmark')
+    arg_parser.add_argument('--max-runs', type=int, default=200)
+    arg_parser.add_argument('--out', type=Path, help='Write JSON results here')
+    arg_parser.add_argument('--compare', type=Path, help='Earlier JSON results to compare with')
+    args = arg_parser.parse_args()
+    
+    document = run_suite(args.filter, args.full, args.min_time, args.max_runs)
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    print_results(document, baseline)
+    
+    if args.out:
+        args.out.write_text(json.dumps(document, indent=2))
+        print(f"\nResults written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -20,6 +20,18 @@ COMMON_UTILITIES = ["CEB", "Ceylon Electricity Board", "LECO",
                     "National Water Supply", "Dialog", "Mobitel", 
                     "Hutch", "Airtel", "SLT"]
 
+# Canonical provider names and the text that identifies them on a bill
+PROVIDERS = {
+    "CEB": ["CEB", "Ceylon Electricity Board"],
+    "LECO": ["LECO", "Lanka Electricity Company"],
+    "NWSDB": ["NWSDB", "National Water Supply"],
+    "Dialog": ["Dialog"],
+    "Mobitel": ["Mobitel"],
+    "Hutch": ["Hutch"],
+    "Airtel": ["Airtel"],
+    "SLT": ["SLT", "Sri Lanka Telecom"]
+}
+
 # Common bill types in Sri Lanka
 BILL_TYPES = {
     "electricity": ["CEB", "LECO", "electricity", "power"],
@@ -36,4 +48,194 @@ SL_TAXES = {
 }
 
 # Anomaly detection thresholds
-ANOMALY_THRESHOLD = 1.5  # 50% increase from average
\ No newline at end of file
+ANOMALY_THRESHOLD = 1.5  # 50% increase from average
+
+# Fixed field regions on common bill layouts, used by PDFParser's
+# crop-based extraction mode. Boxes are (x0, top, x1, bottom) as fractions
+# of the page size so they survive A4/Letter differences.
+BILL_REGIONS = {
+    "CEB": {
+        "account_number": {"bbox": (0.0, 0.10, 1.0, 0.14), "page": 1},
+        "billing_period": {"bbox": (0.0, 0.14, 1.0, 0.20), "page": 1},
+        "charges_table": {"bbox": (0.0, 0.28, 1.0, 0.76), "page": 1, "tables": True},
+        "total": {"bbox": (0.0, 0.78, 1.0, 0.83), "page": 1}
+    },
+    "LECO": {
+        "account_number": {"bbox": (0.0, 0.10, 1.0, 0.14), "page": 1},
+        "billing_period": {"bbox": (0.0, 0.14, 1.0, 0.20), "page": 1},
+        "charges_table": {"bbox": (0.0, 0.28, 1.0, 0.76), "page": 1, "tables": True},
+        "total": {"bbox": (0.0, 0.78, 1.0, 0.83), "page": 1}
+    },
+    "NWSDB": {
+        "account_number": {"bbox": (0.0, 0.10, 1.0, 0.14), "page": 1},
+        "billing_period": {"bbox": (0.0, 0.14, 1.0, 0.20), "page": 1},
+        "charges_table": {"bbox": (0.0, 0.28, 1.0, 0.76), "page": 1, "tables": True},
+        "total": {"bbox": (0.0, 0.78, 1.0, 0.83), "page": 1}
+    }
+}
+
+# Label words used to learn region boxes from a sample bill
+REGION_ANCHORS = {
+    "account_number": ["account", "reference"],
+    "billing_period": ["period", "billing date", "bill date"],
+    "charges_table": ["description", "particulars", "charges"],
+    "total": ["total", "amount due", "payable"]
+}
+
+# OCR worker pool
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", min(4, os.cpu_count() or 1)))
+OCR_QUEUE_DEPTH = 32  # Max pages waiting or running before submit blocks
+OCR_TIMEOUT = 120  # Seconds to wait for a single page
+OCR_RESOLUTION = 300  # DPI used when rendering pages for OCR
+OCR_LANG = "eng"
+
+# Instrumentation (timing spans and counters)
+INSTRUMENTATION_ENABLED = os.getenv("BILLBUSTER_INSTRUMENTATION", "0") == "1"
+# Comma separated: memory, json, prometheus
+INSTRUMENTATION_EXPORTERS = os.getenv("BILLBUSTER_INSTRUMENTATION_EXPORTERS", "json").split(",")
+# Where the prometheus exporter writes its text exposition (e.g. for node_exporter's textfile collector)
+INSTRUMENTATION_PROMETHEUS_FILE = Path(os.getenv("BILLBUSTER_PROMETHEUS_FILE", str(DATA_DIR / "metrics.prom")))
+
+# On-demand profiling (cProfile + tracemalloc per bill)
+PROFILE_ENABLED = os.getenv("BILLBUSTER_PROFILE", "0") == "1"
+PROFILE_DIR = DATA_DIR / "profiles"
+
+# Chart caching and downsampling
+FIGURE_CACHE_SIZE = 128  # Cached figures kept across Streamlit reruns
+MAX_CHART_POINTS = 500  # History charts are LTTB-downsampled above this
+
+# Portfolio rollups
+ROLLUP_FILE = DATA_DIR / "rollups.json"
+
+# Block (slab) tariffs used to recompute usage charges, keyed by provider
+# and effective date. Each revision has regimes chosen by total units; a
+# regime's slabs are (upper unit limit or None, LKR per unit) with the
+# monthly fixed charge applied for the highest slab reached.
+# Domestic rates from the PUCSL July 2024 revision; check the current
+# notice before relying on them.
+_CEB_DOMESTIC_2024_07 = {
+    "effective_from": "2024-07-16",
+    "regimes": [
+        {"max_units": 60, "slabs": [[30, 6.0], [60, 9.0]], "fixed": [100, 250]},
+        {"max_units": None,
+         "slabs": [[60, 11.0], [90, 18.0], [120, 30.0], [180, 50.0], [None, 75.0]],
+         "fixed": [0, 400, 1000, 1500, 2100]}
+    ]
+}
+TARIFFS = {
+    "CEB": [_CEB_DOMESTIC_2024_07],
+    "LECO": [_CEB_DOMESTIC_2024_07]
+}
+TARIFF_TOLERANCE_PCT = 5  # Allowed gap between billed and recomputed usage charge
+
+# Declarative anomaly rules, compiled once by utils.anomaly_rules.RuleEngine.
+# A JSON list in ANOMALY_RULES_FILE (same format) replaces these and is
+# hot-reloaded when the file changes.
+#   kind: "compare" (metric op value), "outside_range" (metric < min or > max)
+#         or "line_item_match" (one anomaly per line item containing a keyword)
+#   metrics: total, taxes, other_charges, tax_rate, history_avg,
+#            history_ratio, increase_pct, units, usage_charge,
+#            expected_usage_charge, tariff_deviation, category:<Category Name>
+#   message / suggestion: str.format templates over metric names; {value} is
+#            the rule's metric, {description}/{amount} the matched line item
+#   bill_types / providers: optional lists restricting where the rule applies
+ANOMALY_RULES = [
+    {
+        "type": "high_total",
+        "kind": "compare",
+        "metric": "total",
+        "op": ">",
+        "value": 50000,  # LKR
+        "severity": "warning",
+        "message": "Bill amount (Rs. {total:,.2f}) is unusually high",
+        "suggestion": "Please verify your consumption and check for any penalties or arrears"
+    },
+    {
+        "type": "penalty_charge",
+        "kind": "line_item_match",
+        "keywords": ["penalty", "late fee", "interest", "arrears"],
+        "severity": "alert",
+        "message": "Penalty charge detected: {description} - Rs. {amount:,.2f}",
+        "suggestion": "Consider paying bills on time to avoid penalty charges"
+    },
+    {
+        "type": "unusual_tax",
+        "kind": "outside_range",
+        "metric": "tax_rate",
+        "min": SL_TAXES["VAT"] - 3,
+        "max": SL_TAXES["VAT"] + 3,
+        "severity": "info",
+        "message": "Tax percentage ({tax_rate:.1f}%) seems unusual",
+        "suggestion": f"Standard VAT in Sri Lanka is {SL_TAXES['VAT']}%"
+    },
+    {
+        "type": "usage_spike",
+        "kind": "compare",
+        "metric": "history_ratio",
+        "op": ">",
+        "value": ANOMALY_THRESHOLD,
+        "severity": "warning",
+        "message": "Bill is {increase_pct:.1f}% higher than your average",
+        "suggestion": "Check for increased usage or meter reading errors"
+    },
+    {
+        # Recompute the usage charge from units consumed and the slab tariff
+        "type": "tariff_mismatch",
+        "kind": "outside_range",
+        "metric": "tariff_deviation",
+        "min": -TARIFF_TOLERANCE_PCT,
+        "max": TARIFF_TOLERANCE_PCT,
+        "providers": list(TARIFFS),
+        "severity": "warning",
+        "message": ("Usage charge (Rs. {usage_charge:,.2f}) differs from the Rs. {expected_usage_charge:,.2f} "
+                    "expected for {units:,.0f} units under the current tariff ({value:+.1f}%)"),
+        "suggestion": "Check the meter reading and tariff category with your provider"
+    }
+]
+ANOMALY_RULES_FILE = DATA_DIR / "anomaly_rules.json"
+ANOMALY_RULES_CHECK_INTERVAL = 2.0  # Seconds between rule file mtime checks
+
+# Intermediate pipeline artefacts, for incremental re-analysis
+ARTEFACT_DIR = DATA_DIR / "artefacts"
+
+# Duplicate / near-duplicate bill detection
+DEDUP_DB = DATA_DIR / "dedup.sqlite"
+DEDUP_MAX_DISTANCE = 3  # Max SimHash Hamming distance (of 64 bits) for a near-duplicate
+# Cheap pre-OCR probe: the page 1 header band identifies the provider, then
+# only that provider's key-field bands are read. Providers without a known
+# layout are matched on the exact file hash only.
+DEDUP_HEADER_REGION = {"header": {"bbox": (0.0, 0.0, 1.0, 0.10), "page": 1}}
+DEDUP_PROBE_REGIONS = {
+    provider: {name: spec for name, spec in regions.items()
+               if name in ("account_number", "billing_period", "total")}
+    for provider, regions in BILL_REGIONS.items()
+}
+# Fewer probe shingles than this (e.g. no digits read) is too little text for
+# a near-duplicate match
+DEDUP_MIN_SHINGLES = 16
+
+# Bill search
+SEARCH_DB = DATA_DIR / "search.sqlite"
+# Optional semantic search over line items (needs chromadb + sentence-transformers)
+SEMANTIC_SEARCH_ENABLED = os.getenv("BILLBUSTER_SEMANTIC_SEARCH", "0") == "1"
+SEMANTIC_INDEX_DIR = DATA_DIR / "chroma"
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Binary archive of parsed + analyzed bills
+ARCHIVE_FILE = DATA_DIR / "bills.bbar"
+ARCHIVE_COMPRESSION_LEVEL = 1  # zlib level; 6 saves ~10% more space but saves ~40% slower
+
+# Explanation languages: code -> (display name, NLLB language code)
+LANGUAGES = {
+    "en": ("English", "eng_Latn"),
+    "si": ("සිංහල (Sinhala)", "sin_Sinh"),
+    "ta": ("தமிழ் (Tamil)", "tam_Taml")
+}
+TRANSLATION_MODEL = "facebook/nllb-200-distilled-600M"  # Local translation model
+TRANSLATION_MEMORY_DB = DATA_DIR / "translation_memory.sqlite"
+TRANSLATION_CACHE_SIZE = 10000  # In-process segments kept per language
+
+# Background bill processing (Streamlit UI)
+JOB_WORKERS = 2  # Bills processed concurrently
+JOB_HISTORY = 32  # Finished jobs kept for re-uploads of the same file
+EXPLANATION_WORKERS = 1  # Explanations generated concurrently, on their own pool (one shared LLM)
@@ -1,3 +1,4 @@
 from .llm_handler import LLMHandler
+from .fallback import FallbackRenderer
 
-__all__ = ['LLMHandler']
\ No newline at end of file
+__all__ = ['LLMHandler', 'FallbackRenderer']
\ No newline at end of file
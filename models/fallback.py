@@ -0,0 +1,153 @@
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Tuple
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Per-category notes, matched by substring in this order
+CATEGORY_NOTES = (
+    (('usage', 'consumption'), "- This is based on your actual usage/consumption during the billing period.\n"),
+    (('fixed',), "- This is a standard monthly charge that stays the same regardless of usage.\n"),
+    (('tax',), "- Government taxes (typically VAT at 15% in Sri Lanka).\n"),
+    (('additional',), "- Extra charges such as surcharges, penalties, or special fees.\n"),
+)
+
+# Saving tips per bill type: (match, tips). 'electricity' is matched exactly,
+# the others by substring; the last entry is the default.
+BILL_TYPE_TIPS = (
+    (('electricity',), True, """
+- Use energy-efficient appliances
+- Avoid usage during peak hours (6:30 PM - 10:30 PM)
+- Switch off appliances when not in use
+- Consider LED bulbs instead of regular bulbs
+"""),
+    (('telecom', 'mobile'), False, """
+- Check if a package plan suits your usage better
+- Monitor data usage to avoid excess charges
+- Consider family plans if multiple users
+- Use Wi-Fi when available to save mobile data
+"""),
+    ((), False, """
+- Pay on time to avoid penalty charges
+- Monitor your usage regularly
+- Contact the provider if you notice unusual charges
+- Keep track of historical bills to spot trends
+"""),
+)
+
+# Explanations for individual charges, matched by substring in this order
+CHARGE_EXPLANATIONS = (
+    ('fixed', "This is a standard monthly charge that you pay regardless of how much you use. It covers maintenance and service costs."),
+    ('usage', "This charge is based on how much electricity/water/data you actually used during this billing period."),
+    ('vat', "Value Added Tax (VAT) is a government tax currently at 15% in Sri Lanka. This adds Rs. {amount:,.2f} to your bill."),
+    ('nbt', "Nation Building Tax (NBT) is a government tax used for development projects in Sri Lanka."),
+    ('penalty', "This is a late payment fee. Pay your bills on time to avoid this charge in the future."),
+    ('surcharge', "An additional charge, often applied during peak usage times or for excess consumption."),
+    ('reconnection', "A fee charged for reconnecting your service after disconnection, usually due to non-payment."),
+)
+DEFAULT_CHARGE_EXPLANATION = ("This charge of Rs. {amount:,.2f} is for: {description}. "
+                              "Contact your service provider for specific details.")
+
+_HEADER = "## Your {bill_type} Bill Explained\n\n**Total Amount Due: Rs. "
+_HEADER_END = "**\n\n### What You're Paying For:\n\n"
+_OVERVIEW = """
+### Understanding Your Bill:
+
+Your bill consists of different types of charges:
+- **Fixed charges**: Standard monthly fees
+- **Usage charges**: Based on how much you consumed
+- **Taxes**: Government-mandated taxes (VAT, NBT, etc.)
+- **Other charges**: Any additional fees or penalties
+
+### Tips to Save:
+"""
+_CATEGORY_AMOUNT = "{:,.2f} ({:.1f}% of total)\n".format
+
+
+class FallbackRenderer:
+    """
+    Template renderer for explanations when the LLM is unavailable
+    
+    Everything that depends only on the bill type (header, overview, tips)
+    is compiled once per bill type and cached; the per-category label and
+    note are compiled once per category name. Rendering a bill is then a handful of
+    number formats and a single join.
+    """
+    
+    def __init__(self, cache_size: int = 256):
+        self._compile = lru_cache(maxsize=cache_size)(self._compile_template)
+        self._category = lru_cache(maxsize=cache_size * 4)(self._compile_category)
+    
+    @staticmethod
+    def _compile_template(bill_type: str) -> Tuple[str, str]:
+        """(text before the total, text after the category lines) for a bill type"""
+        bill_type_lower = bill_type.lower()
+        for matches, exact, tips in BILL_TYPE_TIPS:
+            if not matches or any(bill_type_lower == m if exact else m in bill_type_lower for m in matches):
+                break
+        return _HEADER.format(bill_type=bill_type), _OVERVIEW + tips
+    
+    @staticmethod
+    def _compile_category(category: str) -> Tuple[str, str]:
+        """(text before the amount, note after it) for a category"""
+        category_lower = category.lower()
+        for matches, note in CATEGORY_NOTES:
+            if any(m in category_lower for m in matches):
+                break
+        else:
+            note = ""
+        return f"\n**{category}**: Rs. ", note
+    
+    def warm(self, bill_types: Iterable[str]):
+        """Compile the templates for the given bill types ahead of the first request"""
+        for bill_type in bill_types:
+            self._compile(bill_type.title())
+    
+    def render(self, bill_data: Dict) -> str:
+        """
+        Render the fallback explanation of a bill
+        
+        Args:
+            bill_data: Dictionary with 'charges' and 'structured_data'
+        
+        Returns:
+            Markdown explanation
+        """
+        bill_type = bill_data.get('structured_data', {}).get('bill_type', 'utility')
+        bill_type = ('utility' if bill_type is None else bill_type).title()
+        charges = bill_data.get('charges', {})
+        total = charges.get('total_amount', 0)
+        head, tail = self._compile(bill_type)
+        
+        compiled = self._category
+        parts = [head, f"{total:,.2f}", _HEADER_END]
+        for category, amount in charges.get('summary', {}).items():
+            prefix, note = compiled(category)
+            percentage = (amount / total * 100) if total > 0 else 0
+            parts += (prefix, _CATEGORY_AMOUNT(amount, percentage), note)
+        parts.append(tail)
+        return "".join(parts)
+    
+    @staticmethod
+    def explain_charge(charge_description: str, amount: float) -> str:
+        """Explain a specific charge in simple terms"""
+        desc_lower = charge_description.lower()
+        for key, template in CHARGE_EXPLANATIONS:
+            if key in desc_lower:
+                return template.format(amount=amount)
+        return DEFAULT_CHARGE_EXPLANATION.format(amount=amount, description=charge_description)
+
+
+_renderer: Optional[FallbackRenderer] = None
+
+
+def get_fallback_renderer() -> FallbackRenderer:
+    """Shared renderer, warmed with the configured bill types"""
+    global _renderer
+    if _renderer is None:
+        from config import BILL_TYPES
+        
+        _renderer = FallbackRenderer()
+        _renderer.warm(list(BILL_TYPES) + ['utility'])
+    return _renderer
@@ -1,5 +1,5 @@
 import os
-from typing import Dict, List
+from typing import Dict, List, Optional
 import logging
 from langchain.llms import HuggingFacePipeline
 from langchain.prompts import PromptTemplate
@@ -7,6 +7,11 @@ from langchain.chains import LLMChain
 from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
 import torch
 
+from utils.instrumentation import instrumentation
+from utils.profiling import profiled
+from .fallback import get_fallback_renderer
+from .translation import Translator
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -14,10 +19,15 @@ logger = logging.getLogger(__name__)
 class LLMHandler:
     """Handle LLM operations for bill explanation"""
     
-    def __init__(self, model_name: str = "mistralai/Mistral-7B-Instruct-v0.2"):
+    def __init__(self, model_name: str = "mistralai/Mistral-7B-Instruct-v0.2",
+                 load_model: bool = True, translator: Optional[Translator] = None):
         self.model_name = model_name
         self.llm = None
-        self._initialize_model()
+        self.fallback = get_fallback_renderer()
+        self.load_model = load_model
+        self._translator = translator
+        if load_model:
+            self._initialize_model()
     
     def _initialize_model(self):
         """Initialize the LLM model"""
@@ -56,21 +66,58 @@ class LLMHandler:
             logger.info("Falling back to simplified mode...")
             self.llm = None
     
-    def explain_bill(self, bill_data: Dict) -> str:
+    @property
+    def translator(self) -> Translator:
+        """Translator for non-English output (created on first use)"""
+        if self._translator is None:
+            self._translator = Translator(load_model=self.load_model)
+        return self._translator
+    
+    def _translate(self, text: str, language: str) -> str:
+        if language == 'en':
+            return text
+        with instrumentation.span('translate', language=language):
+            return self.translator.translate(text, language)
+    
+    @profiled('explain_bill', key=lambda self, bill_data, language='en': bill_data.get('bill_id'))
+    @instrumentation.timed('explain')
+    def explain_bill(self, bill_data: Dict, language: str = 'en') -> str:
         """
-        Generate a plain English explanation of the bill
+        Generate a plain-language explanation of the bill
         
         Args:
-            bill_data: Dictionary containing bill information
+            bill_data: Dictionary containing bill information (an optional
+                'bill_id' keys its profile artefacts)
+            language: Output language code (see config.LANGUAGES)
             
         Returns:
-            Plain English explanation
+            Explanation in the requested language
         """
+        return self._translate(self._explain_english(bill_data), language)
+    
+    def _explain_english(self, bill_data: Dict) -> str:
+        """Generate the English explanation (LLM, or templates as fallback)"""
         if self.llm is None:
             return self._fallback_explanation(bill_data)
         
         try:
-            prompt_template = """You are a helpful assistant explaining utility bills to people in Sri Lanka. 
+            with instrumentation.span('prompt_build'):
+                prompt, inputs = self._build_prompt(bill_data)
+            
+            chain = LLMChain(llm=self.llm, prompt=prompt)
+            
+            with instrumentation.span('generate'):
+                response = chain.run(**inputs)
+            
+            return response.strip()
+            
+        except Exception as e:
+            logger.error(f"Error generating explanation: {str(e)}")
+            return self._fallback_explanation(bill_data)
+    
+    def _build_prompt(self, bill_data: Dict):
+        """Build the explanation prompt and its input values"""
+        prompt_template = """You are a helpful assistant explaining utility bills to people in Sri Lanka. 
 Explain this bill in simple, clear language that anyone can understand.
 
 Bill Information:
@@ -88,122 +135,40 @@ Provide a clear, friendly explanation in 3-4 paragraphs:
 3. Explain any taxes or additional fees
 4. Give practical advice if relevant
 
-Use simple Sinhala/English terms that Sri Lankan people understand. Be concise and helpful.
+Use simple, everyday terms that Sri Lankan people understand. Be concise and helpful.
 
 Explanation:"""
 
-            # Prepare data
-            charges_summary = "\n".join([
-                f"- {category}: Rs. {amount:,.2f}"
-                for category, amount in bill_data.get('charges', {}).get('summary', {}).items()
-            ])
-            
-            line_items = "\n".join([
-                f"- {item['description']}: Rs. {item['amount']:,.2f}"
-                for item in bill_data.get('charges', {}).get('line_items', [])[:10]
-            ])
-            
-            prompt = PromptTemplate(
-                template=prompt_template,
-                input_variables=["bill_type", "total_amount", "charges_summary", "line_items"]
-            )
-            
-            chain = LLMChain(llm=self.llm, prompt=prompt)
-            
-            response = chain.run(
-                bill_type=bill_data.get('structured_data', {}).get('bill_type', 'utility').title(),
-                total_amount=f"{bill_data.get('charges', {}).get('total_amount', 0):,.2f}",
-                charges_summary=charges_summary,
-                line_items=line_items
-            )
-            
-            return response.strip()
-            
-        except Exception as e:
-            logger.error(f"Error generating explanation: {str(e)}")
-            return self._fallback_explanation(bill_data)
-    
-    def _fallback_explanation(self, bill_data: Dict) -> str:
-        """Generate explanation without LLM (fallback mode)"""
-        bill_type = bill_data.get('structured_data', {}).get('bill_type', 'utility').title()
-        total = bill_data.get('charges', {}).get('total_amount', 0)
-        summary = bill_data.get('charges', {}).get('summary', {})
-        
-        explanation = f"""## Your {bill_type} Bill Explained
-
-**Total Amount Due: Rs. {total:,.2f}**
-
-### What You're Paying For:
-
-"""
+        # Prepare data
+        charges_summary = "\n".join([
+            f"- {category}: Rs. {amount:,.2f}"
+            for category, amount in bill_data.get('charges', {}).get('summary', {}).items()
+        ])
         
-        for category, amount in summary.items():
-            percentage = (amount / total * 100) if total > 0 else 0
-            explanation += f"""
-**{category}**: Rs. {amount:,.2f} ({percentage:.1f}% of total)
-"""
-            
-            # Add category-specific explanations
-            if 'usage' in category.lower() or 'consumption' in category.lower():
-                explanation += "- This is based on your actual usage/consumption during the billing period.\n"
-            elif 'fixed' in category.lower():
-                explanation += "- This is a standard monthly charge that stays the same regardless of usage.\n"
-            elif 'tax' in category.lower():
-                explanation += "- Government taxes (typically VAT at 15% in Sri Lanka).\n"
-            elif 'additional' in category.lower():
-                explanation += "- Extra charges such as surcharges, penalties, or special fees.\n"
+        line_items = "\n".join([
+            f"- {item['description']}: Rs. {item['amount']:,.2f}"
+            for item in bill_data.get('charges', {}).get('line_items', [])[:10]
+        ])
         
-        explanation += """
-### Understanding Your Bill:
-
-Your bill consists of different types of charges:
-- **Fixed charges**: Standard monthly fees
-- **Usage charges**: Based on how much you consumed
-- **Taxes**: Government-mandated taxes (VAT, NBT, etc.)
-- **Other charges**: Any additional fees or penalties
-
-### Tips to Save:
-"""
+        prompt = PromptTemplate(
+            template=prompt_template,
+            input_variables=["bill_type", "total_amount", "charges_summary", "line_items"]
+        )
         
-        if bill_type.lower() == 'electricity':
-            explanation += """
-- Use energy-efficient appliances
-- Avoid usage during peak hours (6:30 PM - 10:30 PM)
-- Switch off appliances when not in use
-- Consider LED bulbs instead of regular bulbs
-"""
-        elif 'telecom' in bill_type.lower() or 'mobile' in bill_type.lower():
-            explanation += """
-- Check if a package plan suits your usage better
-- Monitor data usage to avoid excess charges
-- Consider family plans if multiple users
-- Use Wi-Fi when available to save mobile data
-"""
-        else:
-            explanation += """
-- Pay on time to avoid penalty charges
-- Monitor your usage regularly
-- Contact the provider if you notice unusual charges
-- Keep track of historical bills to spot trends
-"""
+        inputs = {
+            'bill_type': bill_data.get('structured_data', {}).get('bill_type', 'utility').title(),
+            'total_amount': f"{bill_data.get('charges', {}).get('total_amount', 0):,.2f}",
+            'charges_summary': charges_summary,
+            'line_items': line_items
+        }
         
-        return explanation
+        return prompt, inputs
     
-    def explain_specific_charge(self, charge_description: str, amount: float) -> str:
+    def _fallback_explanation(self, bill_data: Dict) -> str:
+        """Generate explanation without LLM (fallback mode)"""
+        return self.fallback.render(bill_data)
+    
+    def explain_specific_charge(self, charge_description: str, amount: float,
+                                language: str = 'en') -> str:
         """Explain a specific charge in simple terms"""
-        explanations = {
-            'fixed': "This is a standard monthly charge that you pay regardless of how much you use. It covers maintenance and service costs.",
-            'usage': "This charge is based on how much electricity/water/data you actually used during this billing period.",
-            'vat': f"Value Added Tax (VAT) is a government tax currently at 15% in Sri Lanka. This adds Rs. {amount:,.2f} to your bill.",
-            'nbt': "Nation Building Tax (NBT) is a government tax used for development projects in Sri Lanka.",
-            'penalty': "This is a late payment fee. Pay your bills on time to avoid this charge in the future.",
-            'surcharge': "An additional charge, often applied during peak usage times or for excess consumption.",
-            'reconnection': "A fee charged for reconnecting your service after disconnection, usually due to non-payment."
-        }
-        
-        desc_lower = charge_description.lower()
-        for key, explanation in explanations.items():
-            if key in desc_lower:
-                return explanation
-        
-        return f"This charge of Rs. {amount:,.2f} is for: {charge_description}. Contact your service provider for specific details."
\ No newline at end of file
+        return self._translate(self.fallback.explain_charge(charge_description, amount), language)
\ No newline at end of file
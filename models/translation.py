@@ -0,0 +1,255 @@
+"""
+Translation of explanations into Sinhala and Tamil.
+
+Explanations are generated in English and translated segment by segment
+(one Markdown line, bold span or sentence at a time). Numbers are replaced
+by placeholders before lookup, so "Rs. 1,250.00" and "Rs. 980.40" lines
+share one entry. Segments are served from the translation memory (an
+in-process LRU in front of SQLite); only novel segments are sent to the
+local translation model, in one batch per explanation.
+"""
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+import logging
+
+from config import LANGUAGES, TRANSLATION_MODEL, TRANSLATION_MEMORY_DB, TRANSLATION_CACHE_SIZE
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SOURCE_LANGUAGE = 'en'
+
+_LINE_RE = re.compile(r'^(\s*(?:#{1,6}\s+|[-*]\s+|\d+\.\s+)?)(.*?)(\s*)$')
+# Sentence breaks, but not after "Rs." / "No." or before a number
+_SENTENCE_RE = re.compile(r'(?<=[.!?])(?<!Rs\.)(?<!No\.)(\s+)(?=[A-Z])')
+_NUMBER_RE = re.compile(r'\d[\d,]*(?:\.\d+)?')
+_PLACEHOLDER_RE = re.compile(r'\{(\d+)\}')
+_LETTER_RE = re.compile(r'[^\W\d_]')
+
+# A segment to translate: (source with {n} placeholders, the numbers)
+Segment = Tuple[str, Tuple[str, ...]]
+
+
+def split_segments(text: str) -> List[Union[str, Segment]]:
+    """
+    Split Markdown text into literal pieces and translatable segments
+    
+    Returns:
+        Pieces in order: str pieces are kept as-is (Markdown markers,
+        whitespace, numbers), tuples are segments to translate
+    """
+    pieces: List[Union[str, Segment]] = []
+    for line_number, line in enumerate(text.split('\n')):
+        if line_number:
+            pieces.append('\n')
+        prefix, body, suffix = _LINE_RE.match(line).groups()
+        pieces.append(prefix)
+        for span_number, span in enumerate(body.split('**')):
+            if span_number:
+                pieces.append('**')
+            for chunk in _SENTENCE_RE.split(span):
+                stripped = chunk.strip()
+                if not _LETTER_RE.search(stripped):
+                    pieces.append(chunk)
+                    continue
+                start = chunk.index(stripped)
+                if '{' in stripped or '}' in stripped:
+                    # Literal braces would clash with placeholders; keep numbers inline
+                    numbers, source = (), stripped
+                else:
+                    numbers = tuple(_NUMBER_RE.findall(stripped))
+                    counter = iter(range(len(numbers)))
+                    source = _NUMBER_RE.sub(lambda m: f"{{{next(counter)}}}", stripped)
+                pieces.extend([chunk[:start], (source, numbers), chunk[start + len(stripped):]])
+        pieces.append(suffix)
+    return [piece for piece in pieces if piece != '']
+
+
+def fill_placeholders(template: str, numbers: Tuple[str, ...]) -> str:
+    if not numbers:
+        return template
+    return _PLACEHOLDER_RE.sub(lambda m: numbers[int(m.group(1))], template)
+
+
+def _placeholders_intact(source: str, target: str) -> bool:
+    return sorted(_PLACEHOLDER_RE.findall(source)) == sorted(_PLACEHOLDER_RE.findall(target))
+
+
+class TranslationMemory:
+    """Segment translations by language: an LRU cache in front of SQLite"""
+    
+    def __init__(self, path: Optional[Path] = TRANSLATION_MEMORY_DB,
+                 cache_size: int = TRANSLATION_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._cache: Dict[str, OrderedDict] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        
+        self._conn = None
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(path), check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS segments (
+                    language TEXT,
+                    source TEXT,
+                    target TEXT,
+                    origin TEXT,
+                    PRIMARY KEY (language, source)
+                )
+            """)
+    
+    def _remember(self, language: str, source: str, target: str):
+        cache = self._cache.setdefault(language, OrderedDict())
+        cache[source] = target
+        cache.move_to_end(source)
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+    
+    def get_many(self, language: str, sources: Iterable[str]) -> Dict[str, str]:
+        """Known translations of the given segments"""
+        found = {}
+        unique = set(sources)
+        with self._lock:
+            cache = self._cache.setdefault(language, OrderedDict())
+            missing = []
+            for source in unique:
+                if source in cache:
+                    cache.move_to_end(source)
+                    found[source] = cache[source]
+                else:
+                    missing.append(source)
+            
+            if missing and self._conn is not None:
+                for i in range(0, len(missing), 500):
+                    batch = missing[i:i + 500]
+                    rows = self._conn.execute(
+                        f"SELECT source, target FROM segments WHERE language = ? "
+                        f"AND source IN ({','.join('?' * len(batch))})", [language] + batch
+                    ).fetchall()
+                    for source, target in rows:
+                        found[source] = target
+                        self._remember(language, source, target)
+            
+            self.hits += len(found)
+            self.misses += len(unique) - len(found)
+        return found
+    
+    def put_many(self, language: str, translations: Dict[str, str], origin: str = 'model'):
+        """
+        Store segment translations
+        
+        Args:
+            language: Target language code
+            translations: Source segment -> translated segment
+            origin: Where they came from (model name, or 'reviewed' for
+                human-checked entries, which are never overwritten by the model)
+        """
+        with self._lock:
+            for source, target in translations.items():
+                self._remember(language, source, target)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT INTO segments (language, source, target, origin) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT (language, source) DO UPDATE SET target = excluded.target, "
+                        "origin = excluded.origin WHERE segments.origin != 'reviewed' "
+                        "OR excluded.origin = 'reviewed'",
+                        [(language, source, target, origin) for source, target in translations.items()]
+                    )
+    
+    def __len__(self) -> int:
+        if self._conn is None:
+            return sum(len(cache) for cache in self._cache.values())
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+
+
+class Translator:
+    """Translate English explanations through the translation memory"""
+    
+    def __init__(self, memory: Optional[TranslationMemory] = None,
+                 model_name: str = TRANSLATION_MODEL, load_model: bool = True):
+        self.memory = memory if memory is not None else TranslationMemory()
+        self.model_name = model_name
+        self.load_model = load_model
+        self._pipeline = None
+        self._lock = threading.Lock()
+    
+    def _get_pipeline(self):
+        """Load the translation model on first use (False if unavailable)"""
+        with self._lock:
+            if self._pipeline is None:
+                if not self.load_model:
+                    self._pipeline = False
+                    return self._pipeline
+                try:
+                    from transformers import pipeline
+                    
+                    logger.info(f"Loading translation model: {self.model_name}")
+                    self._pipeline = pipeline('translation', model=self.model_name)
+                except Exception as e:
+                    logger.error(f"Error loading translation model: {str(e)}")
+                    self._pipeline = False
+            return self._pipeline
+    
+    def _translate_segments(self, sources: List[str], language: str) -> Dict[str, str]:
+        """Run novel segments through the model, in one batch"""
+        model = self._get_pipeline()
+        if not model:
+            return {}
+        try:
+            outputs = model(sources, src_lang=LANGUAGES[SOURCE_LANGUAGE][1],
+                            tgt_lang=LANGUAGES[language][1], max_length=400)
+        except Exception as e:
+            logger.error(f"Error translating to {language}: {str(e)}")
+            return {}
+        
+        translated = {}
+        for source, output in zip(sources, outputs):
+            target = output['translation_text'].strip()
+            if _placeholders_intact(source, target):
+                translated[source] = target
+            else:
+                logger.info(f"Dropped translation with mangled placeholders: {source!r}")
+        return translated
+    
+    def translate(self, text: str, language: str) -> str:
+        """
+        Translate English Markdown text
+        
+        Segments without a translation (model unavailable, or output that
+        lost its number placeholders) are left in English.
+        
+        Args:
+            text: English text
+            language: Target language code (see config.LANGUAGES)
+        
+        Returns:
+            Translated text
+        """
+        if language == SOURCE_LANGUAGE:
+            return text
+        if language not in LANGUAGES:
+            raise ValueError(f"Unsupported language '{language}'; expected one of {', '.join(LANGUAGES)}")
+        
+        pieces = split_segments(text)
+        sources = [piece[0] for piece in pieces if isinstance(piece, tuple)]
+        known = self.memory.get_many(language, sources)
+        
+        novel = list(dict.fromkeys(source for source in sources if source not in known))
+        if novel:
+            translated = self._translate_segments(novel, language)
+            if translated:
+                self.memory.put_many(language, translated, origin=self.model_name)
+                known.update(translated)
+        
+        return "".join(
+            fill_placeholders(known.get(piece[0], piece[0]), piece[1]) if isinstance(piece, tuple) else piece
+            for piece in pieces
+        )
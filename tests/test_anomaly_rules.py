@@ -0,0 +1,88 @@
+import json
+import os
+
+import pytest
+
+from config import ANOMALY_RULES
+from utils.anomaly_rules import CompiledPlan, RuleEngine
+from utils.bulk_anomalies import BillBatch
+
+BILL = {
+    'total_amount': 60000.0,
+    'summary': {'Taxes': 7800.0, 'Usage Charges': 52000.0},
+    'line_items': [{'description': 'Late Fee', 'amount': 200.0, 'category': 'Additional Charges'}]
+}
+
+
+@pytest.fixture
+def rules_file(tmp_path):
+    return tmp_path / 'anomaly_rules.json'
+
+
+def engine_for(path):
+    # check_interval=0 so every plan access looks at the file
+    return RuleEngine(path=path, check_interval=0)
+
+
+def write(path, content):
+    """Rewrite the rules file, moving its mtime forward so the engine notices"""
+    mtime = path.stat().st_mtime
+    path.write_text(content)
+    os.utime(path, (mtime + 1, mtime + 1))
+
+
+@pytest.mark.parametrize('content', [
+    '{"type": "x"}',
+    '[1]',
+    '["high_total"]',
+    '[{"type": "x", "kind": "line_item_match", "keywords": [1]}]',
+    '[{"type": "x", "kind": "compare", "metric": "nope", "op": ">", "value": 1}]',
+    '[{"type": "x", "kind": "compare", "metric": "total", "op": "!=", "value": 1}]',
+    '[{"kind": "compare"}]',
+    'not json',
+])
+def test_invalid_reload_keeps_previous_plan(rules_file, content):
+    rules_file.write_text(json.dumps(ANOMALY_RULES))
+    engine = engine_for(rules_file)
+    previous = engine.plan
+    expected = engine.evaluate(BILL)
+    assert expected
+    
+    write(rules_file, content)
+    assert engine.reload() is False
+    assert engine.plan is previous
+    assert engine.evaluate(BILL) == expected
+
+
+def test_invalid_file_at_startup_falls_back_to_config(rules_file):
+    rules_file.write_text('[1]')
+    engine = engine_for(rules_file)
+    assert engine.plan.version == CompiledPlan(ANOMALY_RULES).version
+
+
+def test_valid_reload_installs_new_plan(rules_file):
+    rules_file.write_text(json.dumps(ANOMALY_RULES))
+    engine = engine_for(rules_file)
+    
+    write(rules_file, json.dumps([{
+        'type': 'big_tax', 'kind': 'compare', 'metric': 'category:Taxes', 'op': '>', 'value': 5000,
+        'message': 'Taxes of Rs. {value:,.2f}'
+    }]))
+    assert [anomaly['type'] for anomaly in engine.evaluate(BILL)] == ['big_tax']
+
+
+def test_compiled_batch_matches_scalar_for_custom_rules():
+    plan = CompiledPlan([
+        {'type': 'big_tax', 'kind': 'compare', 'metric': 'category:Taxes', 'op': '>=', 'value': 150,
+         'message': 'Taxes of Rs. {value:,.2f} on Rs. {total:,.2f}'},
+        {'type': 'odd_total', 'kind': 'outside_range', 'metric': 'total', 'min': 100, 'max': 50000,
+         'bill_types': ['water']},
+        {'type': 'fee', 'kind': 'line_item_match', 'keywords': ['fee'], 'providers': ['NWSDB'],
+         'message': '{description}: Rs. {amount:,.2f} ({tax_rate:.1f}% tax)'},
+    ])
+    bills = [BILL, {}, {'total_amount': 150.0, 'summary': {'Taxes': 150.0}, 'line_items': []}, BILL]
+    structured = [{'bill_type': 'water', 'provider': 'NWSDB'}, None,
+                  {'bill_type': 'water'}, {'bill_type': 'electricity', 'provider': 'CEB'}]
+    expected = [plan.evaluate(charges, None, data) for charges, data in zip(bills, structured)]
+    assert plan.evaluate_batch(BillBatch(bills, None, structured)) == expected
+    assert [len(anomalies) for anomalies in expected] == [3, 0, 1, 1]
@@ -0,0 +1,170 @@
+import struct
+
+import pytest
+
+from utils.archive import ArchiveError, BillArchive, BillArchiveWriter, compact
+
+
+def make_bill(n: int, items: int = 3):
+    line_items = [
+        {'description': f"Charge {i % 2}", 'amount': 100.0 * (i + 1) + n, 'category': 'Usage Charges'}
+        for i in range(items)
+    ] + [{'description': 'VAT 15%', 'amount': 15.5, 'category': 'Taxes'}]
+    parsed = {
+        'text': f"Bill {n}\nTotal Rs. 1,000.00 ශ්‍රී",
+        'page_text': [f"Bill {n}", "Total Rs. 1,000.00 ශ්‍රී"],
+        'tables': [[['Description', 'Amount'], ['VAT', '15.50']]],
+        'metadata': {'num_pages': 2},
+        'structured_data': {'provider': 'CEB', 'bill_type': 'electricity', 'dates': ['01/02/2025'],
+                            'account_numbers': [f"12-{n:07d}"], 'amounts': [1000.0]}
+    }
+    grouped = {}
+    for item in line_items:
+        grouped.setdefault(item['category'], []).append(item)
+    charges = {
+        'total_amount': 1000.0 + n,
+        'categories': grouped,
+        'line_items': line_items,
+        'taxes': [],
+        'summary': {category: sum(item['amount'] for item in items) for category, items in grouped.items()}
+    }
+    return parsed, charges
+
+
+def write(path, bills):
+    with BillArchiveWriter(path) as writer:
+        for bill_id, (parsed, charges) in bills.items():
+            writer.add(bill_id, parsed, charges)
+
+
+def assert_round_trip(archive, bills):
+    assert set(archive) == set(bills)
+    for bill_id, (parsed, charges) in bills.items():
+        assert archive.get(bill_id) == {'parsed': parsed, 'charges': charges}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path / 'bills.bbar'
+
+
+def test_write_and_read(path):
+    bills = {f"bill-{n}": make_bill(n) for n in range(5)}
+    write(path, bills)
+    with BillArchive(path) as archive:
+        assert_round_trip(archive, bills)
+
+
+def test_missing_total_and_pages(path):
+    parsed, charges = make_bill(1)
+    del parsed['page_text']
+    parsed['structured_data']['provider'] = None
+    charges['total_amount'] = None
+    write(path, {'a': (parsed, charges)})
+    with BillArchive(path) as archive:
+        bill = archive.get('a')
+        assert 'page_text' not in bill['parsed']
+        assert bill['parsed']['structured_data']['provider'] is None
+        assert bill['charges']['total_amount'] is None
+
+
+def test_append_and_readd(path):
+    first = {f"bill-{n}": make_bill(n) for n in range(3)}
+    write(path, first)
+    second = {'bill-3': make_bill(3), 'bill-1': make_bill(11, items=5)}
+    write(path, second)
+    
+    with BillArchive(path) as archive:
+        assert_round_trip(archive, {**first, **second})
+    
+    size = path.stat().st_size
+    compact(path)
+    assert path.stat().st_size < size
+    with BillArchive(path) as archive:
+        assert_round_trip(archive, {**first, **second})
+
+
+def test_interrupted_append_keeps_archived_bills(path):
+    first = {f"bill-{n}": make_bill(n) for n in range(3)}
+    write(path, first)
+    
+    # Writer dies before close(): records written, no new footer
+    writer = BillArchiveWriter(path)
+    writer.add('lost', *make_bill(99))
+    writer._file.close()
+    
+    with BillArchive(path) as archive:
+        assert_round_trip(archive, first)
+    
+    # The next append drops the partial records and carries on
+    write(path, {'bill-3': make_bill(3)})
+    with BillArchive(path) as archive:
+        assert_round_trip(archive, {**first, 'bill-3': make_bill(3)})
+
+
+def test_archive_without_a_footer_reads_as_empty(path):
+    # First write died before close(): no trailer anywhere in the file
+    write(path, {'a': make_bill(1)})
+    path.write_bytes(path.read_bytes()[:-10])
+    with BillArchive(path) as archive:
+        assert len(archive) == 0 and archive.strings == []
+    
+    # The writer truncates it back to the header before appending
+    write(path, {'b': make_bill(2)})
+    with BillArchive(path) as archive:
+        assert_round_trip(archive, {'b': make_bill(2)})
+        assert archive.end == path.stat().st_size
+
+
+def test_header_only_archive_reads_as_empty(path):
+    writer = BillArchiveWriter(path)
+    writer._file.close()
+    with BillArchive(path) as archive:
+        assert len(archive) == 0
+
+
+def test_compact_ignores_a_stale_tmp_file(path):
+    bills = {f"bill-{n}": make_bill(n) for n in range(3)}
+    write(path, bills)
+    tmp = path.with_suffix(path.suffix + '.tmp')
+    write(tmp, {'stale': make_bill(9)})
+    
+    compact(path)
+    assert not tmp.exists()
+    with BillArchive(path) as archive:
+        assert_round_trip(archive, bills)
+
+
+def test_columns_and_string_offsets_are_little_endian(path):
+    parsed, charges = make_bill(1)
+    write(path, {'a': (parsed, charges)})
+    data = path.read_bytes()
+    strings_offset, string_count, *_ = struct.unpack_from('<QIQQ4s', data, len(data) - 32)
+    ends = struct.unpack_from(f"<{string_count}I", data, strings_offset)
+    with BillArchive(path) as archive:
+        assert list(ends) == [sum(len(value.encode('utf-8')) for value in archive.strings[:i + 1])
+                              for i in range(string_count)]
+        offset, _ = archive.index['a']
+    
+    record = struct.Struct('<IIIiIId')
+    count, text_length, aux_length, *_ = record.unpack_from(data, offset)
+    columns = offset + record.size + text_length + aux_length
+    columns += -columns % 8
+    amounts = struct.unpack_from(f"<{count}d", data, columns)
+    assert list(amounts) == [item['amount'] for item in charges['line_items']]
+
+
+def test_not_an_archive(path):
+    path.write_bytes(b'%PDF-1.4' + b'\0' * 64)
+    with pytest.raises(ArchiveError):
+        BillArchive(path)
+
+
+def test_columns_outlive_close(path):
+    parsed, charges = make_bill(1)
+    write(path, {'a': (parsed, charges)})
+    with BillArchive(path) as archive:
+        columns = archive.line_item_columns('a')
+        descriptions = [archive.string(i) for i in columns['description']]
+    assert columns['amount'].tolist() == [item['amount'] for item in charges['line_items']]
+    assert descriptions == [item['description'] for item in charges['line_items']]
@@ -0,0 +1,109 @@
+import random
+
+import pytest
+
+from benchmarks.corpus import PROVIDERS, build_bill
+from utils.anomaly_rules import RuleEngine
+from utils.bulk_anomalies import BillBatch, scan_batch, scan_bills
+from utils.text_analyzer import TextAnalyzer
+
+
+def bill_text(bill):
+    return "\n\n".join("\n".join(text for _, text in lines) for lines in bill['pages'])
+
+
+@pytest.fixture(scope='module')
+def engine():
+    # Config rules only, independent of any data/anomaly_rules.json
+    return RuleEngine(path=None)
+
+
+@pytest.fixture(scope='module')
+def analyzer(engine):
+    return TextAnalyzer(rule_engine=engine)
+
+
+@pytest.fixture(scope='module')
+def portfolio(analyzer):
+    """Generated bills with structured data and a mix of history shapes"""
+    rng = random.Random(7)
+    providers = sorted(PROVIDERS)
+    bills, structured, histories = [], [], []
+    for i in range(120):
+        provider = providers[i % len(providers)]
+        bill = build_bill(provider, pages=1, line_items=rng.randint(2, 12), seed=i)
+        expected = bill['expected']
+        charges = analyzer.analyze_charges(bill_text(bill), {'amounts': []})
+        bills.append(charges)
+        structured.append({
+            'provider': provider,
+            'bill_type': 'electricity' if provider in ('CEB', 'LECO') else provider.lower(),
+            'dates': [expected['period_start']],
+            # Some bills without a units reading
+            'units_consumed': None if i % 5 == 0 else float(expected['units'])
+        })
+        total = charges['total_amount']
+        histories.append([
+            None,                                          # no history argument
+            [],                                            # empty history
+            [{'total_amount': 0}],                         # zero average
+            [{'total_amount': total / 3}] * 3,             # spike
+            [{'total_amount': total}, {'total_amount': total * 1.1}]
+        ][i % 5])
+    return bills, histories, structured
+
+
+def per_bill(analyzer, bills, histories, structured):
+    return [analyzer.detect_anomalies(charges, history, data)
+            for charges, history, data in zip(bills, histories, structured)]
+
+
+def test_bulk_matches_per_bill(analyzer, engine, portfolio):
+    bills, histories, structured = portfolio
+    expected = per_bill(analyzer, bills, histories, structured)
+    
+    assert scan_bills(bills, histories, structured, engine) == expected
+    assert analyzer.detect_anomalies_bulk(bills, histories, structured) == expected
+    # The portfolio should actually exercise the rules
+    assert {anomaly['type'] for anomalies in expected for anomaly in anomalies} >= {
+        'penalty_charge', 'usage_spike', 'tariff_mismatch'
+    }
+
+
+def test_bulk_matches_per_bill_without_context(analyzer, engine, portfolio):
+    bills, _, _ = portfolio
+    expected = [analyzer.detect_anomalies(charges) for charges in bills]
+    assert scan_bills(bills, engine=engine) == expected
+
+
+def test_edge_cases(analyzer, engine):
+    bills = [
+        {},                                                      # nothing extracted
+        {'total_amount': 0, 'summary': {}, 'line_items': []},    # zero total
+        {'total_amount': 100000.0, 'summary': {'Taxes': 0.0}, 'line_items': []},
+        {'total_amount': 1000.0, 'summary': {'Taxes': 1000.0}, 'line_items': []},  # all tax
+        {'total_amount': 1150.0, 'summary': {'Taxes': 150.0, 'Usage Charges': 1000.0},
+         'line_items': [{'description': 'Late Fee', 'amount': 150.0, 'category': 'Additional Charges'}]},
+    ]
+    histories = [[], [{'total_amount': 0}], None, [{'total_amount': 500}], [{'total_amount': 0}] * 2]
+    structured = [
+        None,
+        {'units_consumed': float('nan')},
+        {'provider': 'CEB', 'units_consumed': 0},
+        {'provider': 'CEB', 'units_consumed': 100.0, 'dates': ['not a date']},
+        {'provider': 'LECO', 'units_consumed': 120.0, 'dates': ['01/03/2025']},
+    ]
+    expected = per_bill(analyzer, bills, histories, structured)
+    assert scan_batch(BillBatch(bills, histories, structured), engine) == expected
+
+
+def test_zero_history_average_never_fires(analyzer, engine):
+    charges = {'total_amount': 500.0, 'summary': {}, 'line_items': []}
+    history = [{'total_amount': 0}]
+    batch = BillBatch([charges], [history])
+    assert batch.history_avg[0] == 0
+    assert scan_batch(batch, engine) == [analyzer.detect_anomalies(charges, history)] == [[]]
+
+
+def test_empty_batch(engine):
+    assert scan_bills([], engine=engine) == []
@@ -0,0 +1,21 @@
+import pytest
+
+from benchmarks.corpus import PROVIDERS, build_bill
+from benchmarks.run import bill_text
+from utils.text_analyzer import TextAnalyzer
+
+# Header fields that end in a number but are not charges
+HEADER_FIELDS = ('Account No', 'Billing Period', 'Units Consumed', 'Total Amount Due',
+                 'Please pay before')
+
+
+@pytest.mark.parametrize('provider', sorted(PROVIDERS))
+@pytest.mark.parametrize('pages', [1, 3])
+def test_only_charge_lines_are_extracted(provider, pages):
+    bill = build_bill(provider, pages=pages)
+    result = TextAnalyzer().extract_line_items(bill_text(bill), {})
+    
+    charges = [item for item in result['line_items']
+               if not item['description'].startswith(HEADER_FIELDS)]
+    assert len(charges) == bill['expected']['line_items']
+    assert sum(item['amount'] for item in charges) == pytest.approx(bill['expected']['total_amount'])
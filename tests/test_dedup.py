@@ -0,0 +1,74 @@
+import io
+
+import pytest
+
+from benchmarks.corpus import build_bill, generate_bill, render_pdf
+from utils.dedup import DedupIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = DedupIndex(tmp_path / 'dedup.sqlite')
+    yield index
+    index.close()
+
+
+def store(index, pdf_bytes):
+    result = index.check(io.BytesIO(pdf_bytes))
+    index.add(result['bill_id'], result['signature'])
+    return result
+
+
+def test_text_without_digits_never_matches(index):
+    index.add('stored', index.signature('Telecom invoice', {}))
+    signature = index.signature('', {})
+    assert signature == {'simhash': None, 'keys': []}
+    assert index.find_similar(signature['simhash'], signature['keys']) is None
+
+
+def test_rescan_of_known_layout_matches(index):
+    original = generate_bill('CEB', seed=1)
+    first = store(index, original)
+    assert first['duplicate_of'] is None and first['signature']['simhash'] is not None
+    
+    rescan = index.check(io.BytesIO(original + b'\n%rescan\n'))
+    assert rescan['duplicate_of'] == first['bill_id']
+    assert rescan['match'] in ('key_fields', 'simhash')
+
+
+def test_probe_uses_the_detected_providers_layout(index):
+    store(index, generate_bill('CEB', seed=1))
+    other = index.check(io.BytesIO(generate_bill('LECO', seed=1)))
+    assert other['signature']['simhash'] is not None
+    assert other['duplicate_of'] is None
+
+
+def test_unknown_layout_matches_on_file_hash_only(index):
+    first = store(index, generate_bill('Dialog', seed=1))
+    assert first['signature']['simhash'] is None
+    assert store(index, generate_bill('Dialog', seed=2))['duplicate_of'] is None
+    assert index.check(io.BytesIO(generate_bill('Dialog', seed=1)))['match'] == 'exact'
+
+
+def test_next_month_of_the_same_account_is_not_a_duplicate(index):
+    # Flat-rate customer: same account and total, different billing period
+    this_month = build_bill('CEB', seed=1)
+    next_month = build_bill('CEB', seed=2)
+    replacements = {
+        next_month['expected']['account_number']: this_month['expected']['account_number'],
+        f"{next_month['expected']['total_amount']:,.2f}": f"{this_month['expected']['total_amount']:,.2f}"
+    }
+    for page in next_month['pages']:
+        for row, (top, text) in enumerate(page):
+            for old, new in replacements.items():
+                text = text.replace(old, new)
+            page[row] = (top, text)
+    
+    first = store(index, render_pdf(this_month))
+    second = index.check(io.BytesIO(render_pdf(next_month)))
+    assert second['signature']['keys']
+    assert second['duplicate_of'] is None, second
+    
+    # The same bill rescanned still matches on its key fields
+    rescan = index.check(io.BytesIO(render_pdf(this_month) + b'\n%rescan\n'))
+    assert rescan['duplicate_of'] == first['bill_id']
@@ -0,0 +1,147 @@
+import itertools
+
+import pytest
+
+from models.fallback import FallbackRenderer
+
+
+def legacy_explanation(bill_data):
+    """The string-concatenating fallback explanation FallbackRenderer replaced"""
+    bill_type = bill_data.get('structured_data', {}).get('bill_type', 'utility').title()
+    total = bill_data.get('charges', {}).get('total_amount', 0)
+    summary = bill_data.get('charges', {}).get('summary', {})
+    
+    explanation = f"""## Your {bill_type} Bill Explained
+
+**Total Amount Due: Rs. {total:,.2f}**
+
+### What You're Paying For:
+
+"""
+    
+    for category, amount in summary.items():
+        percentage = (amount / total * 100) if total > 0 else 0
+        explanation += f"""
+**{category}**: Rs. {amount:,.2f} ({percentage:.1f}% of total)
+"""
+        
+        if 'usage' in category.lower() or 'consumption' in category.lower():
+            explanation += "- This is based on your actual usage/consumption during the billing period.\n"
+        elif 'fixed' in category.lower():
+            explanation += "- This is a standard monthly charge that stays the same regardless of usage.\n"
+        elif 'tax' in category.lower():
+            explanation += "- Government taxes (typically VAT at 15% in Sri Lanka).\n"
+        elif 'additional' in category.lower():
+            explanation += "- Extra charges such as surcharges, penalties, or special fees.\n"
+    
+    explanation += """
+### Understanding Your Bill:
+
+Your bill consists of different types of charges:
+- **Fixed charges**: Standard monthly fees
+- **Usage charges**: Based on how much you consumed
+- **Taxes**: Government-mandated taxes (VAT, NBT, etc.)
+- **Other charges**: Any additional fees or penalties
+
+### Tips to Save:
+"""
+    
+    if bill_type.lower() == 'electricity':
+        explanation += """
+- Use energy-efficient appliances
+- Avoid usage during peak hours (6:30 PM - 10:30 PM)
+- Switch off appliances when not in use
+- Consider LED bulbs instead of regular bulbs
+"""
+    elif 'telecom' in bill_type.lower() or 'mobile' in bill_type.lower():
+        explanation += """
+- Check if a package plan suits your usage better
+- Monitor data usage to avoid excess charges
+- Consider family plans if multiple users
+- Use Wi-Fi when available to save mobile data
+"""
+    else:
+        explanation += """
+- Pay on time to avoid penalty charges
+- Monitor your usage regularly
+- Contact the provider if you notice unusual charges
+- Keep track of historical bills to spot trends
+"""
+    
+    return explanation
+
+
+def legacy_charge_explanation(charge_description, amount):
+    explanations = {
+        'fixed': "This is a standard monthly charge that you pay regardless of how much you use. It covers maintenance and service costs.",
+        'usage': "This charge is based on how much electricity/water/data you actually used during this billing period.",
+        'vat': f"Value Added Tax (VAT) is a government tax currently at 15% in Sri Lanka. This adds Rs. {amount:,.2f} to your bill.",
+        'nbt': "Nation Building Tax (NBT) is a government tax used for development projects in Sri Lanka.",
+        'penalty': "This is a late payment fee. Pay your bills on time to avoid this charge in the future.",
+        'surcharge': "An additional charge, often applied during peak usage times or for excess consumption.",
+        'reconnection': "A fee charged for reconnecting your service after disconnection, usually due to non-payment."
+    }
+    desc_lower = charge_description.lower()
+    for key, explanation in explanations.items():
+        if key in desc_lower:
+            return explanation
+    return f"This charge of Rs. {amount:,.2f} is for: {charge_description}. Contact your service provider for specific details."
+
+
+BILL_TYPES = ['electricity', 'Electricity', 'ELECTRICITY', 'electricity prepaid', 'water', 'telecom',
+              'mobile', 'Mobile Broadband', 'hospital', 'internet', 'utility', '']
+
+# Every category note branch, a category matching two notes (first wins), and none
+SUMMARIES = [
+    {},
+    {'Usage Charges': 5200.0, 'Fixed Charges': 400.0, 'Taxes': 840.0, 'Additional Charges': 250.0},
+    {'Water Consumption': 1234.5, 'Fixed Usage Fee': 100.0, 'Tax On Fixed': 15.0,
+     'Other': 12.25, 'Discounts': -300.0},
+]
+
+
+@pytest.fixture(scope='module')
+def renderer():
+    return FallbackRenderer()
+
+
+@pytest.mark.parametrize('bill_type, summary, total', list(itertools.product(
+    BILL_TYPES, SUMMARIES, [6690.0, 1_234_567.891, 0, -50.0])))
+def test_render_matches_legacy_output(renderer, bill_type, summary, total):
+    bill = {'structured_data': {'bill_type': bill_type},
+            'charges': {'total_amount': total, 'summary': summary}}
+    # Twice: the second render comes from the compiled-template caches
+    assert renderer.render(bill) == legacy_explanation(bill)
+    assert renderer.render(bill) == legacy_explanation(bill)
+
+
+@pytest.mark.parametrize('bill', [
+    {},
+    {'structured_data': {}, 'charges': {'summary': {'Usage Charges': 10.0}}},
+    {'structured_data': {'bill_type': 'water'}, 'charges': {'total_amount': 10.0}},
+])
+def test_render_matches_legacy_output_for_missing_fields(renderer, bill):
+    assert renderer.render(bill) == legacy_explanation(bill)
+
+
+def test_missing_bill_type_renders_as_utility(renderer):
+    bill = {'structured_data': {'bill_type': None}, 'charges': {'total_amount': 10.0, 'summary': {}}}
+    expected = legacy_explanation({'structured_data': {'bill_type': 'utility'}, 'charges': bill['charges']})
+    assert renderer.render(bill) == expected
+
+
+def test_warmed_renderer_matches_legacy_output():
+    renderer = FallbackRenderer(cache_size=2)
+    renderer.warm(['electricity', 'water', 'telecom'])
+    for bill_type in BILL_TYPES:
+        bill = {'structured_data': {'bill_type': bill_type},
+                'charges': {'total_amount': 6690.0, 'summary': SUMMARIES[1]}}
+        assert renderer.render(bill) == legacy_explanation(bill)
+
+
+@pytest.mark.parametrize('description', [
+    'Fixed Charge', 'Energy Charge - Usage', 'VAT 15%', 'NBT', 'Late Payment Penalty', 'Surcharge',
+    'Reconnection Charge', 'Fixed Usage Fee', 'Fuel Adjustment Charge', ''
+])
+def test_explain_charge_matches_legacy_output(description):
+    assert FallbackRenderer.explain_charge(description, 1234.5) == legacy_charge_explanation(description, 1234.5)
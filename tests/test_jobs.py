@@ -0,0 +1,146 @@
+import threading
+import time
+
+import pytest
+
+from benchmarks.corpus import generate_bill
+from utils.anomaly_rules import RuleEngine
+from utils.jobs import CANCELLED, DONE, FAILED, QUEUED, JobManager
+from utils.pdf_parser import PDFParser
+from utils.pipeline import ArtefactStore
+from utils.text_analyzer import TextAnalyzer
+
+BILL = generate_bill('CEB', seed=4)
+OTHER_BILL = generate_bill('LECO', seed=4)
+
+
+class GatedParser(PDFParser):
+    """Waits for the gate before parsing, and fails while failures are queued"""
+    
+    def __init__(self, gate, failures, calls):
+        super().__init__()
+        self.gate = gate
+        self.failures = failures
+        self.calls = calls
+    
+    def parse_pdf(self, pdf_file, *args, **kwargs):
+        self.calls.append(1)
+        assert self.gate.wait(10)
+        if self.failures:
+            raise RuntimeError(self.failures.pop())
+        return super().parse_pdf(pdf_file, *args, **kwargs)
+
+
+class FakeExplainer:
+    def explain_bill(self, bill_data, language='en'):
+        return f"{language}: Rs. {bill_data['charges']['total_amount']:,.2f}"
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def gate():
+    gate = threading.Event()
+    gate.set()
+    yield gate
+    gate.set()
+
+
+@pytest.fixture
+def failures():
+    return []
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+@pytest.fixture
+def manager(tmp_path, gate, failures, calls):
+    manager = JobManager(
+        max_workers=1,
+        parser_factory=lambda: GatedParser(gate, failures, calls),
+        analyzer_factory=lambda: TextAnalyzer(rule_engine=RuleEngine(path=None)),
+        explainer_factory=FakeExplainer,
+        store=ArtefactStore(tmp_path)
+    )
+    yield manager
+    manager.shutdown()
+
+
+def test_rerun_attaches_to_the_running_job(manager, gate):
+    gate.clear()
+    job = manager.submit(BILL)
+    assert manager.submit(BILL) is job
+    gate.set()
+    wait_for(lambda: job.finished)
+    assert job.status == DONE and job.analysis is not None
+
+
+def test_failed_job_is_only_restarted_on_retry(manager, failures, calls):
+    failures.append('unreadable PDF')
+    job = manager.submit(BILL)
+    wait_for(lambda: job.finished)
+    assert (job.status, job.error) == (FAILED, 'unreadable PDF')
+    
+    # Reruns see the failure instead of restarting the job
+    assert manager.submit(BILL) is job
+    time.sleep(0.2)
+    assert job.status == FAILED and len(calls) == 1
+    
+    retried = manager.submit(BILL, retry=True)
+    assert retried is not job
+    wait_for(lambda: retried.finished)
+    assert retried.status == DONE and len(calls) == 2
+
+
+def test_cancelled_job_is_only_restarted_on_retry(manager, gate):
+    gate.clear()
+    job = manager.submit(BILL)
+    manager.cancel(job.key)
+    assert job.status == CANCELLED
+    assert manager.submit(BILL) is job
+    
+    gate.set()
+    retried = manager.submit(BILL, retry=True)
+    wait_for(lambda: retried.finished)
+    assert retried.status == DONE and job.status == CANCELLED
+
+
+def test_retry_keeps_finished_jobs(manager):
+    job = manager.submit(BILL)
+    wait_for(lambda: job.finished)
+    assert manager.submit(BILL, retry=True) is job
+
+
+def test_cancelling_a_finished_job_keeps_its_results(manager):
+    job = manager.submit(BILL)
+    wait_for(lambda: job.finished)
+    
+    manager.cancel(job.key)
+    assert job.status == DONE and not job.cancelled
+    assert manager.request_explanation(job.key, 'en')
+    wait_for(lambda: 'en' in job.explanations)
+    assert job.explanations['en'].startswith('en: Rs. ')
+
+
+def test_explanations_do_not_wait_for_parses(manager, gate):
+    done = manager.submit(BILL)
+    wait_for(lambda: done.finished)
+    
+    # Occupy the only parse worker
+    gate.clear()
+    busy = manager.submit(OTHER_BILL)
+    wait_for(lambda: busy.status != QUEUED)
+    
+    assert manager.request_explanation(done.key, 'si')
+    wait_for(lambda: 'si' in done.explanations, timeout=5)
+    assert not busy.finished
+    gate.set()
+    wait_for(lambda: busy.finished)
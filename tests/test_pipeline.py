@@ -0,0 +1,65 @@
+import io
+
+import pytest
+
+from benchmarks.corpus import generate_bill
+from utils import pipeline as pipeline_module
+from utils.anomaly_rules import RuleEngine
+from utils.pipeline import ArtefactStore, BillPipeline
+from utils.tariffs import TariffEngine
+from utils.text_analyzer import TextAnalyzer
+
+PDF = generate_bill('CEB', seed=5)
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    return BillPipeline(analyzer=TextAnalyzer(rule_engine=RuleEngine(path=None)),
+                        store=ArtefactStore(tmp_path))
+
+
+def test_first_run_computes_every_stage(pipeline):
+    result = pipeline.process(io.BytesIO(PDF))
+    assert result['recomputed'] == ['parse', 'line_items', 'categorize', 'anomalies']
+    assert result['charges']['line_items']
+
+
+def test_unchanged_bill_recomputes_nothing(pipeline):
+    first = pipeline.process(io.BytesIO(PDF))
+    
+    again = pipeline.process(io.BytesIO(PDF))
+    assert again['recomputed'] == []
+    assert again['charges'] == first['charges']
+    assert pipeline.process(bill_id=first['bill_id'])['recomputed'] == []
+
+
+def test_keyword_change_reruns_categorize_and_anomalies_only(pipeline):
+    first = pipeline.process(io.BytesIO(PDF))
+    pipeline.analyzer.charge_keywords['usage_charges'].append('fuel adjustment')
+    
+    result = pipeline.process(bill_id=first['bill_id'])
+    assert result['recomputed'] == ['categorize', 'anomalies']
+    categories = {item['description']: item['category'] for item in result['charges']['line_items']}
+    assert categories['Fuel Adjustment Charge'] == 'Usage Charges'
+
+
+def test_tariff_change_reruns_anomalies_only(pipeline, monkeypatch):
+    bill_id = pipeline.process(io.BytesIO(PDF))['bill_id']
+    monkeypatch.setattr(pipeline_module, 'get_tariff_engine', lambda: TariffEngine({}))
+    
+    assert pipeline.process(bill_id=bill_id)['recomputed'] == ['anomalies']
+
+
+def test_stale_parse_without_pdf_raises(pipeline, monkeypatch):
+    bill_id = pipeline.process(io.BytesIO(PDF))['bill_id']
+    monkeypatch.setattr(pipeline_module.PDFParser, 'VERSION', 'next')
+    
+    with pytest.raises(ValueError, match='the PDF is required'):
+        pipeline.process(bill_id=bill_id)
+    assert pipeline.reprocess_all() == {}
+    assert pipeline.process(io.BytesIO(PDF))['recomputed'] == ['parse', 'line_items', 'categorize', 'anomalies']
+
+
+def test_missing_bill_without_pdf_raises(pipeline):
+    with pytest.raises(ValueError):
+        pipeline.process(bill_id='0' * 64)
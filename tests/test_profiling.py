@@ -0,0 +1,21 @@
+import io
+
+from benchmarks.corpus import generate_bill
+from utils import profiling
+from utils.anomaly_rules import RuleEngine
+from utils.pipeline import ArtefactStore, BillPipeline
+from utils.text_analyzer import TextAnalyzer
+
+
+def test_stages_of_one_bill_share_a_profile_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_ENABLED', True)
+    monkeypatch.setattr(profiling, 'PROFILE_DIR', tmp_path / 'profiles')
+    pipeline = BillPipeline(analyzer=TextAnalyzer(rule_engine=RuleEngine(path=None)),
+                            store=ArtefactStore(tmp_path / 'artefacts'))
+    
+    result = pipeline.process(io.BytesIO(generate_bill('CEB', seed=3)))
+    
+    bill_dirs = list((tmp_path / 'profiles').iterdir())
+    assert [path.name for path in bill_dirs] == [result['bill_id']]
+    stages = {path.stem for path in bill_dirs[0].glob('*.json')}
+    assert {'parse_pdf', 'extract_line_items', 'categorize_line_items'} <= stages
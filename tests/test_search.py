@@ -0,0 +1,95 @@
+import pytest
+
+from utils.search import BillSearchIndex, fts_query
+
+
+def bill(provider, date, items, account='12-3456789'):
+    charges = {
+        'total_amount': sum(amount for _, amount, _ in items),
+        'line_items': [{'description': description, 'amount': amount, 'category': category}
+                       for description, amount, category in items]
+    }
+    structured = {'provider': provider, 'bill_type': 'electricity', 'dates': [date],
+                  'account_numbers': [account]}
+    text = "\n".join(f"{description} {amount:,.2f}" for description, amount, _ in items)
+    return text, charges, structured
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = BillSearchIndex(tmp_path / 'search.sqlite', semantic=False)
+    index.add_bill('leco-2025-03', *bill('LECO', '15/03/2025', [
+        ('Reconnection Fee', 3000.0, 'Additional Charges'),
+        ('Energy Charge - Usage', 5200.0, 'Usage Charges')
+    ]))
+    index.add_bill('leco-2024-11', *bill('LECO', '15/11/2024', [
+        ('Reconnection Fee', 2500.0, 'Additional Charges')
+    ]))
+    index.add_bill('ceb-2025-02', *bill('CEB', '2025-02-10', [
+        ('Reconnection Charges', 2800.0, 'Additional Charges'),
+        ('Fixed Charge', 400.0, 'Fixed Charges')
+    ]))
+    yield index
+    index.close()
+
+
+def bill_ids(results):
+    return sorted(result['bill_id'] for result in results)
+
+
+def test_fts_query_quotes_words_as_prefixes():
+    assert fts_query('reconnection fees!') == '"reconnection"* "fees"*'
+    assert fts_query('  ') == ''
+
+
+def test_stemmed_match(index):
+    results = index.search('reconnection fees')
+    assert bill_ids(results) == ['leco-2024-11', 'leco-2025-03']
+    assert {result['description'] for result in results} == {'Reconnection Fee'}
+    # Every word must match, but any form of it
+    assert bill_ids(index.search('reconnecting charge')) == ['ceb-2025-02']
+    assert index.search('') == []
+
+
+def test_provider_and_date_filters(index):
+    assert bill_ids(index.search('reconnection', provider='CEB')) == ['ceb-2025-02']
+    assert bill_ids(index.search('reconnection', provider='LECO', date_from='2025-01-01',
+                                 date_to='2025-12-31')) == ['leco-2025-03']
+    # Date bounds are inclusive
+    assert bill_ids(index.search('reconnection', date_to='2025-02-10')) == ['ceb-2025-02', 'leco-2024-11']
+    assert index.search('reconnection', provider='Dialog') == []
+    assert bill_ids(index.search('charge', category='Fixed Charges')) == ['ceb-2025-02']
+
+
+def test_results_carry_bill_metadata(index):
+    [result] = index.search('reconnection', date_from='2025-03-01')
+    assert result == {'bill_id': 'leco-2025-03', 'description': 'Reconnection Fee',
+                      'category': 'Additional Charges', 'amount': 3000.0, 'provider': 'LECO',
+                      'bill_type': 'electricity', 'bill_date': '2025-03-15'}
+
+
+def test_reindexing_replaces_rows(index):
+    index.add_bill('leco-2025-03', *bill('LECO', '15/04/2025', [
+        ('Reconnection Fee', 3100.0, 'Additional Charges'),
+        ('Late Payment Surcharge', 150.0, 'Additional Charges')
+    ]))
+    
+    assert len(index) == 3
+    [result] = index.search('reconnection fee', date_from='2025-03-01')
+    assert (result['amount'], result['bill_date']) == (3100.0, '2025-04-15')
+    assert index.search('energy usage') == []
+    assert bill_ids(index.search('surcharge')) == ['leco-2025-03']
+    assert bill_ids(index.search_bills('reconnection', provider='LECO')) == ['leco-2024-11', 'leco-2025-03']
+
+
+def test_remove_bill(index):
+    index.remove_bill('ceb-2025-02')
+    assert not index.contains('ceb-2025-02')
+    assert index.search('fixed') == []
+    assert index.search_bills('fixed') == []
+
+
+def test_search_bills_snippet(index):
+    [result] = index.search_bills('fixed charge')
+    assert result['bill_id'] == 'ceb-2025-02'
+    assert '[Fixed]' in result['snippet'] and '[Charge]' in result['snippet']
@@ -0,0 +1,94 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from config import TARIFF_TOLERANCE_PCT
+from utils.anomaly_rules import RuleEngine
+from utils.tariffs import TariffEngine
+
+ON = date(2025, 1, 1)
+
+
+@pytest.fixture(scope='module')
+def engine():
+    # Config tariffs: CEB domestic, July 2024
+    return TariffEngine()
+
+
+@pytest.mark.parametrize('units, energy, fixed', [
+    (0, 0.0, 100.0),
+    (30, 180.0, 100.0),      # top of the first low-use slab
+    (31, 189.0, 250.0),
+    (60, 450.0, 250.0),      # 60 units still bills under the low-use regime
+    (61, 678.0, 400.0),      # 61 units re-prices all 60 at the higher regime
+    (90, 1200.0, 400.0),
+    (91, 1230.0, 1000.0),
+    (120, 2100.0, 1000.0),
+    (180, 5100.0, 1500.0),
+    (181, 5175.0, 2100.0),
+    (300, 14100.0, 2100.0),
+])
+def test_slab_edges_and_regime_switch(engine, units, energy, fixed):
+    assert engine.expected_charge('CEB', units, ON) == pytest.approx((energy, fixed))
+
+
+def test_vectorized_matches_scalar(engine):
+    rng = np.random.default_rng(11)
+    units = np.concatenate((rng.uniform(0, 400, 500), [0, 30, 60, 60.5, 61, 90, 120, 180, 1000]))
+    providers = ['CEB', 'LECO'] * (len(units) // 2) + ['CEB'] * (len(units) % 2)
+    dates = [ON] * len(units)
+    
+    energy, fixed = engine.expected_charges(providers, units, dates)
+    for index, value in enumerate(units):
+        assert (energy[index], fixed[index]) == pytest.approx(
+            engine.expected_charge(providers[index], value, ON))
+
+
+def test_vectorized_leaves_unknown_bills_nan(engine):
+    energy, fixed = engine.expected_charges(
+        ['CEB', 'NWSDB', 'CEB', 'CEB'], np.array([100, 100, np.nan, 100]),
+        [ON, ON, ON, date(2020, 1, 1)])
+    assert energy[0] == pytest.approx(1500.0)
+    assert np.isnan(energy[1:]).all() and np.isnan(fixed[1:]).all()
+
+
+def test_revision_selected_by_bill_date():
+    def revision(effective_from, rate):
+        return {'effective_from': effective_from,
+                'regimes': [{'max_units': None, 'slabs': [[None, rate]], 'fixed': [0]}]}
+    
+    engine = TariffEngine({'CEB': [revision('2025-01-01', 20.0), revision('2024-01-01', 10.0)]})
+    assert engine.expected_charge('CEB', 10, date(2023, 12, 31)) is None
+    assert engine.expected_charge('CEB', 10, date(2024, 1, 1)) == (100.0, 0.0)
+    assert engine.expected_charge('CEB', 10, date(2024, 12, 31)) == (100.0, 0.0)
+    assert engine.expected_charge('CEB', 10, date(2025, 1, 1)) == (200.0, 0.0)
+    # Undated bills use the latest revision
+    assert engine.expected_charge('CEB', 10, None) == (200.0, 0.0)
+    assert engine.expected_charge('Dialog', 10, None) is None
+
+
+def mismatches(usage_charge, dates=('01/09/2025',), provider='CEB'):
+    charges = {'total_amount': usage_charge, 'line_items': [],
+               'summary': {'Usage Charges': usage_charge}}
+    structured = {'provider': provider, 'units_consumed': 100, 'dates': list(dates)}
+    anomalies = RuleEngine(path=None).evaluate(charges, [], structured)
+    return [anomaly for anomaly in anomalies if anomaly['type'] == 'tariff_mismatch']
+
+
+def test_tariff_mismatch_around_tolerance():
+    # 100 units: 60 x 11 + 30 x 18 + 10 x 30
+    expected = 1500.0
+    margin = expected * TARIFF_TOLERANCE_PCT / 100
+    
+    assert not mismatches(expected)
+    assert not mismatches(expected + margin - 1)
+    assert not mismatches(expected - margin + 1)
+    assert mismatches(expected + margin + 1)
+    assert mismatches(expected - margin - 1)
+
+
+def test_tariff_mismatch_needs_a_tariff_in_force():
+    assert not mismatches(3000.0, dates=['01/01/2024'])
+    assert not mismatches(3000.0, provider='NWSDB')
+    assert mismatches(3000.0)
@@ -0,0 +1,131 @@
+import pytest
+
+from models.fallback import FallbackRenderer
+from models.translation import TranslationMemory, Translator, fill_placeholders, split_segments
+
+EXPLANATION = FallbackRenderer().render({
+    'structured_data': {'bill_type': 'electricity'},
+    'charges': {'total_amount': 6690.0, 'summary': {'Usage Charges': 5200.0, 'Taxes': 840.0}}
+})
+
+
+class FakePipeline:
+    """Stands in for the transformers translation pipeline"""
+    
+    def __init__(self, mangle: str = None):
+        self.calls = []
+        # Source segment whose placeholders the "model" drops
+        self.mangle = mangle
+    
+    def __call__(self, sources, src_lang, tgt_lang, max_length):
+        self.calls.append(list(sources))
+        outputs = []
+        for source in sources:
+            target = source.replace('{0}', '') if source == self.mangle else source
+            outputs.append({'translation_text': f"[{tgt_lang}] {target}"})
+        return outputs
+
+
+def translator_with(pipeline, memory=None):
+    translator = Translator(memory=TranslationMemory(path=None) if memory is None else memory)
+    translator._pipeline = pipeline
+    return translator
+
+
+def segments(pieces):
+    return [piece for piece in pieces if isinstance(piece, tuple)]
+
+
+def test_split_segments_round_trips_the_fallback_explanation():
+    pieces = split_segments(EXPLANATION)
+    restored = "".join(fill_placeholders(*piece) if isinstance(piece, tuple) else piece for piece in pieces)
+    assert restored == EXPLANATION
+    
+    sources = [source for source, _ in segments(pieces)]
+    assert 'Your Electricity Bill Explained' in sources
+    assert "What You're Paying For:" in sources
+    # Markdown markers and blank lines stay literal
+    literals = [piece for piece in pieces if isinstance(piece, str)]
+    assert {'## ', '### ', '- ', '**', '\n'} <= set(literals)
+    assert not any('**' in source or source.startswith(('#', '- ')) for source in sources)
+
+
+def test_amounts_and_percentages_are_masked():
+    pieces = split_segments(EXPLANATION)
+    assert ('Total Amount Due: Rs. {0}', ('6,690.00',)) in segments(pieces)
+    assert (': Rs. {0} ({1}% of total)', ('5,200.00', '77.7')) in segments(pieces)
+    assert ('Government taxes (typically VAT at {0}% in Sri Lanka).', ('15',)) in segments(pieces)
+
+
+def test_sentences_split_but_not_after_rs():
+    pieces = split_segments("Pay Rs. 1,250.00 by Friday. Late fees apply!")
+    assert segments(pieces) == [('Pay Rs. {0} by Friday.', ('1,250.00',)), ('Late fees apply!', ())]
+
+
+def test_literal_braces_keep_numbers_inline():
+    assert segments(split_segments("Code {A1} costs 5")) == [('Code {A1} costs 5', ())]
+
+
+def test_translation_restores_markers_and_numbers():
+    translated = translator_with(FakePipeline()).translate(EXPLANATION, 'si')
+    assert "**[sin_Sinh] Total Amount Due: Rs. 6,690.00**" in translated
+    assert "**[sin_Sinh] Usage Charges**[sin_Sinh] : Rs. 5,200.00 (77.7% of total)" in translated
+    assert translated.startswith("## [sin_Sinh] Your Electricity Bill Explained\n\n")
+    assert translated.count('**') == EXPLANATION.count('**')
+
+
+def test_second_translation_is_served_from_memory():
+    model = FakePipeline()
+    translator = translator_with(model)
+    first = translator.translate(EXPLANATION, 'si')
+    assert len(model.calls) == 1
+    # One model batch, each distinct segment once
+    assert len(model.calls[0]) == len(set(model.calls[0]))
+    
+    assert translator.translate(EXPLANATION, 'si') == first
+    assert len(model.calls) == 1
+    assert translator.memory.hits == len(model.calls[0])
+    
+    # Different amounts share the masked segments
+    other = FallbackRenderer().render({
+        'structured_data': {'bill_type': 'electricity'},
+        'charges': {'total_amount': 980.4, 'summary': {'Usage Charges': 700.0, 'Taxes': 128.0}}
+    })
+    assert "Rs. 980.40" in translator.translate(other, 'si')
+    assert len(model.calls) == 1
+    
+    # Other languages have their own entries
+    translator.translate(EXPLANATION, 'ta')
+    assert len(model.calls) == 2
+
+
+def test_memory_persists_across_translators(tmp_path):
+    model = FakePipeline()
+    translator_with(model, TranslationMemory(tmp_path / 'tm.sqlite')).translate(EXPLANATION, 'si')
+    
+    fresh = FakePipeline()
+    translator_with(fresh, TranslationMemory(tmp_path / 'tm.sqlite')).translate(EXPLANATION, 'si')
+    assert fresh.calls == []
+
+
+def test_mangled_placeholders_are_left_in_english():
+    model = FakePipeline(mangle='Total Amount Due: Rs. {0}')
+    translator = translator_with(model)
+    translated = translator.translate(EXPLANATION, 'si')
+    assert "**Total Amount Due: Rs. 6,690.00**" in translated
+    # Not remembered, so the next call asks the model again
+    translator.translate(EXPLANATION, 'si')
+    assert model.calls[1] == ['Total Amount Due: Rs. {0}']
+
+
+def test_without_a_model_text_is_returned_unchanged():
+    translator = Translator(memory=TranslationMemory(path=None), load_model=False)
+    assert translator.translate(EXPLANATION, 'si') == EXPLANATION
+    assert len(translator.memory) == 0
+
+
+def test_english_and_unknown_languages():
+    translator = translator_with(FakePipeline())
+    assert translator.translate(EXPLANATION, 'en') == EXPLANATION
+    with pytest.raises(ValueError):
+        translator.translate(EXPLANATION, 'fr')
@@ -1,5 +1,16 @@
-from .pdf_parser import PDFParser
+from .pdf_parser import PDFParser, ParseCancelled
 from .text_analyzer import TextAnalyzer
 from .visualization import Visualizer
+from .ocr_pool import OCRWorkerPool, get_ocr_pool
+from .rollups import RollupEngine
+from .tariffs import TariffEngine
+from .pipeline import BillPipeline, ArtefactStore
+from .dedup import DedupIndex
+from .search import BillSearchIndex
+from .archive import BillArchive, BillArchiveWriter
+from .jobs import JobManager, BillJob
 
-__all__ = ['PDFParser', 'TextAnalyzer', 'Visualizer']
\ No newline at end of file
+__all__ = ['PDFParser', 'ParseCancelled', 'TextAnalyzer', 'Visualizer', 'OCRWorkerPool', 'get_ocr_pool',
+           'RollupEngine', 'TariffEngine', 'BillPipeline', 'ArtefactStore',
+           'DedupIndex', 'BillSearchIndex', 'BillArchive', 'BillArchiveWriter',
+           'JobManager', 'BillJob']
\ No newline at end of file
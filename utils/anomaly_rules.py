@@ -0,0 +1,383 @@
+import hashlib
+import json
+import math
+import operator
+import re
+import threading
+import time
+from pathlib import Path
+from string import Formatter
+from typing import Dict, List, Optional
+import logging
+
+import numpy as np
+
+from .rollups import bill_date
+from .tariffs import get_tariff_engine
+from config import ANOMALY_RULES, ANOMALY_RULES_FILE, ANOMALY_RULES_CHECK_INTERVAL
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le
+}
+
+NAN = float('nan')
+
+
+def _nan_divide(a, b):
+    return a / b if b else NAN
+
+
+# Shared intermediates: name -> (dependencies, scalar fn, vector fn).
+# Scalar functions take (charges, history, structured data, values computed
+# so far); vector
+# functions take (BillBatch, columns computed so far). A plan computes each
+# metric its rules need exactly once, in this order.
+METRICS = {
+    'total': (
+        (),
+        lambda charges, history, structured, m: float(charges.get('total_amount', 0) or 0),
+        lambda batch, m: batch.totals
+    ),
+    'taxes': (
+        (),
+        lambda charges, history, structured, m: float(charges.get('summary', {}).get('Taxes', 0)),
+        lambda batch, m: batch.taxes
+    ),
+    'other_charges': (
+        ('total', 'taxes'),
+        lambda charges, history, structured, m: m['total'] - m['taxes'],
+        lambda batch, m: m['total'] - m['taxes']
+    ),
+    'tax_rate': (
+        ('taxes', 'other_charges'),
+        lambda charges, history, structured, m: (
+            m['taxes'] / m['other_charges'] * 100
+            if m['taxes'] > 0 and m['other_charges'] > 0 else NAN
+        ),
+        lambda batch, m: np.divide(
+            m['taxes'] * 100, m['other_charges'],
+            out=np.full(batch.size, np.nan),
+            where=(m['taxes'] > 0) & (m['other_charges'] > 0)
+        )
+    ),
+    'history_avg': (
+        (),
+        lambda charges, history, structured, m: (
+            sum(bill.get('total_amount', 0) for bill in history) / len(history)
+            if history else NAN
+        ),
+        lambda batch, m: batch.history_avg
+    ),
+    'history_ratio': (
+        ('total', 'history_avg'),
+        lambda charges, history, structured, m: _nan_divide(m['total'], m['history_avg']),
+        lambda batch, m: np.divide(m['total'], m['history_avg'],
+                                   out=np.full(batch.size, np.nan),
+                                   where=m['history_avg'] > 0)
+    ),
+    'increase_pct': (
+        ('total', 'history_avg'),
+        lambda charges, history, structured, m: _nan_divide(m['total'] - m['history_avg'], m['history_avg']) * 100,
+        lambda batch, m: np.divide((m['total'] - m['history_avg']) * 100, m['history_avg'],
+                                   out=np.full(batch.size, np.nan),
+                                   where=m['history_avg'] > 0)
+    ),
+    'units': (
+        (),
+        lambda charges, history, structured, m: float(structured.get('units_consumed') or NAN),
+        lambda batch, m: batch.units
+    ),
+    'usage_charge': (
+        (),
+        lambda charges, history, structured, m: float(charges.get('summary', {}).get('Usage Charges', 0)),
+        lambda batch, m: batch.category_totals('Usage Charges')
+    ),
+    'expected_usage_charge': (
+        ('units',),
+        lambda charges, history, structured, m: _expected_usage_charge(structured, m['units']),
+        lambda batch, m: get_tariff_engine().expected_charges(batch.providers, m['units'], batch.bill_dates)[0]
+    ),
+    'tariff_deviation': (
+        ('usage_charge', 'expected_usage_charge'),
+        lambda charges, history, structured, m: (
+            (m['usage_charge'] - m['expected_usage_charge']) / m['expected_usage_charge'] * 100
+            if m['usage_charge'] > 0 and m['expected_usage_charge'] > 0 else NAN
+        ),
+        lambda batch, m: np.divide((m['usage_charge'] - m['expected_usage_charge']) * 100,
+                                   m['expected_usage_charge'],
+                                   out=np.full(batch.size, np.nan),
+                                   where=(m['usage_charge'] > 0) & (m['expected_usage_charge'] > 0))
+    )
+}
+
+
+def _expected_usage_charge(structured: Dict, units: float) -> float:
+    if math.isnan(units):
+        return NAN
+    expected = get_tariff_engine().expected_charge(
+        structured.get('provider'), units, bill_date(structured.get('dates'))
+    )
+    return expected[0] if expected else NAN
+
+LINE_ITEM_FIELDS = {'description', 'amount', 'category'}
+# Message placeholders that aren't metrics: line item fields, plus {value},
+# the value of the rule's own metric (needed for category:<name> metrics)
+TEMPLATE_FIELDS = LINE_ITEM_FIELDS | {'value'}
+
+
+def _metric(name: str):
+    """Look up a metric, including the category:<name> family"""
+    if name in METRICS:
+        return METRICS[name]
+    if name.startswith('category:'):
+        category = name.split(':', 1)[1]
+        return (
+            (),
+            lambda charges, history, structured, m: float(charges.get('summary', {}).get(category, 0)),
+            lambda batch, m: batch.category_totals(category)
+        )
+    raise ValueError(f"Unknown anomaly metric '{name}'")
+
+
+class _CompiledRule:
+    """One validated rule with its condition resolved to a function"""
+    
+    def __init__(self, spec: Dict):
+        self.spec = spec
+        self.type = spec.get('type') or spec.get('id')
+        self.kind = spec.get('kind')
+        if not self.type:
+            raise ValueError(f"Anomaly rule needs a 'type': {spec}")
+        
+        self.bill_types = set(spec['bill_types']) if spec.get('bill_types') else None
+        self.providers = set(spec['providers']) if spec.get('providers') else None
+        self.message = spec.get('message', self.type)
+        self.severity = spec.get('severity', 'info')
+        self.suggestion = spec.get('suggestion', '')
+        
+        fields = {field.split('.')[0].split('[')[0]
+                  for _, field, _, _ in Formatter().parse(self.message + self.suggestion) if field}
+        self.metrics = set(fields - TEMPLATE_FIELDS)
+        
+        if self.kind == 'compare':
+            self.metric = spec['metric']
+            if spec.get('op') not in OPERATORS:
+                raise ValueError(f"Rule '{self.type}' has unsupported op {spec.get('op')!r}")
+            op, value = OPERATORS[spec['op']], float(spec['value'])
+            self.test = lambda x: op(x, value)
+            self.metrics.add(self.metric)
+        elif self.kind == 'outside_range':
+            self.metric = spec['metric']
+            low, high = float(spec['min']), float(spec['max'])
+            self.test = lambda x: (x < low) | (x > high)
+            self.metrics.add(self.metric)
+        elif self.kind == 'line_item_match':
+            keywords = [keyword.lower() for keyword in spec['keywords']]
+            self.pattern = re.compile('|'.join(re.escape(keyword) for keyword in keywords))
+        else:
+            raise ValueError(f"Rule '{self.type}' has unknown kind {self.kind!r}")
+        
+        for metric in self.metrics:
+            _metric(metric)
+    
+    def applies_to(self, bill_type: Optional[str], provider: Optional[str]) -> bool:
+        if self.bill_types is not None and bill_type not in self.bill_types:
+            return False
+        if self.providers is not None and provider not in self.providers:
+            return False
+        return True
+    
+    def anomaly(self, values: Dict) -> Dict:
+        if self.kind != 'line_item_match':
+            values = {**values, 'value': values[self.metric]}
+        return {
+            'type': self.type,
+            'severity': self.severity,
+            'message': self.message.format(**values),
+            'suggestion': self.suggestion.format(**values)
+        }
+
+
+class CompiledPlan:
+    """Rules compiled into a single evaluation plan with shared metrics"""
+    
+    def __init__(self, rules: List[Dict]):
+        self.rules = [_CompiledRule(spec) for spec in rules]
+        self.version = hashlib.sha256(
+            json.dumps(rules, sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()[:16]
+        
+        # Every metric any rule needs, dependencies first, each computed once
+        self.metrics: List[str] = []
+        needed = set()
+        for rule in self.rules:
+            needed |= rule.metrics
+        
+        def visit(name: str):
+            if name in self.metrics:
+                return
+            for dependency in _metric(name)[0]:
+                visit(dependency)
+            self.metrics.append(name)
+        
+        for name in sorted(needed, key=lambda n: list(METRICS).index(n) if n in METRICS else len(METRICS)):
+            visit(name)
+        self._functions = {name: _metric(name) for name in self.metrics}
+    
+    def evaluate(self, charges: Dict, historical_data: Optional[List[Dict]] = None,
+                 structured_data: Optional[Dict] = None) -> List[Dict]:
+        """Run every rule against one bill"""
+        structured_data = structured_data or {}
+        values = {}
+        for name in self.metrics:
+            values[name] = self._functions[name][1](charges, historical_data, structured_data, values)
+        
+        bill_type = structured_data.get('bill_type')
+        provider = structured_data.get('provider')
+        anomalies = []
+        for rule in self.rules:
+            if not rule.applies_to(bill_type, provider):
+                continue
+            if rule.kind == 'line_item_match':
+                for item in charges.get('line_items', []):
+                    if rule.pattern.search(item['description'].lower()):
+                        anomalies.append(rule.anomaly({**values, **item}))
+            elif rule.test(values[rule.metric]):
+                anomalies.append(rule.anomaly(values))
+        return anomalies
+    
+    def evaluate_batch(self, batch) -> List[List[Dict]]:
+        """
+        Run every rule over a BillBatch with array operations
+        
+        Returns:
+            One anomaly list per bill, identical to evaluate()
+        """
+        columns = {}
+        for name in self.metrics:
+            columns[name] = self._functions[name][2](batch, columns)
+        
+        results: List[List[Dict]] = [[] for _ in range(batch.size)]
+        for rule in self.rules:
+            scope = np.ones(batch.size, dtype=bool)
+            if rule.bill_types is not None:
+                scope &= np.isin(batch.bill_types, list(rule.bill_types))
+            if rule.providers is not None:
+                scope &= np.isin(batch.providers, list(rule.providers))
+            
+            if rule.kind == 'line_item_match':
+                if not len(batch.items):
+                    continue
+                # Keyword scan once per unique description, then broadcast
+                matches = np.fromiter(
+                    (rule.pattern.search(description.lower()) is not None
+                     for description in batch.descriptions),
+                    dtype=bool, count=len(batch.descriptions)
+                )
+                item_bills = batch.items['bill'].to_numpy()
+                flagged = np.flatnonzero(matches[batch.items['code'].to_numpy()] & scope[item_bills])
+                codes = batch.items['code'].to_numpy()
+                amounts = batch.items['amount'].to_numpy()
+                for row in flagged:
+                    bill = item_bills[row]
+                    values = {name: float(columns[name][bill]) for name in rule.metrics}
+                    values['description'] = batch.descriptions[codes[row]]
+                    values['amount'] = float(amounts[row])
+                    results[bill].append(rule.anomaly(values))
+                continue
+            
+            with np.errstate(invalid='ignore'):
+                mask = rule.test(columns[rule.metric]) & scope
+            for bill in np.flatnonzero(mask):
+                values = {name: float(columns[name][bill]) for name in rule.metrics}
+                results[bill].append(rule.anomaly(values))
+        
+        return results
+
+
+class RuleEngine:
+    """Compiled anomaly rules, hot-reloaded from a JSON file when it changes"""
+    
+    def __init__(self, rules: Optional[List[Dict]] = None,
+                 path: Optional[Path] = ANOMALY_RULES_FILE,
+                 check_interval: float = ANOMALY_RULES_CHECK_INTERVAL):
+        self.default_rules = rules if rules is not None else ANOMALY_RULES
+        self.path = Path(path) if path else None
+        self.check_interval = check_interval
+        self._mtime = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._plan = None
+        if not self.reload(force=True):
+            # Rules file was unreadable at startup; fall back to the config rules
+            self._plan = CompiledPlan(self.default_rules)
+    
+    @property
+    def plan(self) -> CompiledPlan:
+        """The current plan, reloading the rules file first if it changed"""
+        if self.path is not None and time.monotonic() - self._last_check >= self.check_interval:
+            self.reload()
+        return self._plan
+    
+    @property
+    def version(self) -> str:
+        return self.plan.version
+    
+    def reload(self, force: bool = False) -> bool:
+        """
+        Recompile if the rules file changed (or appeared/disappeared)
+        
+        Returns:
+            True if a new plan was installed
+        """
+        with self._lock:
+            self._last_check = time.monotonic()
+            try:
+                mtime = self.path.stat().st_mtime if self.path else None
+            except FileNotFoundError:
+                mtime = None
+            if mtime == self._mtime and not force:
+                return False
+            
+            try:
+                rules = json.loads(self.path.read_text()) if mtime is not None else self.default_rules
+                if not isinstance(rules, list) or not all(isinstance(rule, dict) for rule in rules):
+                    raise ValueError("expected a JSON list of rule objects")
+                plan = CompiledPlan(rules)
+            except Exception as e:
+                # Keep serving the previous plan rather than dropping all rules
+                logger.error(f"Invalid anomaly rules in {self.path}: {type(e).__name__}: {str(e)}")
+                self._mtime = mtime
+                return False
+            
+            self._plan = plan
+            self._mtime = mtime
+            source = self.path if mtime is not None else 'config.ANOMALY_RULES'
+            logger.info(f"Loaded {len(plan.rules)} anomaly rules from {source} (version {plan.version})")
+            return True
+    
+    def evaluate(self, charges: Dict, historical_data: Optional[List[Dict]] = None,
+                 structured_data: Optional[Dict] = None) -> List[Dict]:
+        return self.plan.evaluate(charges, historical_data, structured_data)
+    
+    def evaluate_batch(self, batch) -> List[List[Dict]]:
+        return self.plan.evaluate_batch(batch)
+
+
+_shared_engine = None
+_shared_engine_lock = threading.Lock()
+
+
+def get_rule_engine() -> RuleEngine:
+    """Return the process-wide rule engine"""
+    global _shared_engine
+    with _shared_engine_lock:
+        if _shared_engine is None:
+            _shared_engine = RuleEngine()
+        return _shared_engine
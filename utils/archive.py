@@ -0,0 +1,377 @@
+"""
+Compact binary archive of parsed and analyzed bills.
+
+One file holds many bills (parse_pdf output + analyze_charges output):
+
+    header   b'BBAR' + format version
+    records  one per bill, appended:
+               fixed header (item count, block sizes, interned provider /
+               bill type, total), then
+               text block     zlib: text and per-page texts, concatenated
+               aux block      zlib JSON: tables, metadata, structured data
+               line items     columnar, 8-byte aligned: float64 amounts,
+                              uint32 description ids, uint32 category ids
+    strings  interned string table: uint32 end offsets + UTF-8 bytes
+    index    zlib JSON: bill id -> (offset, length)
+    trailer  string table offset and count, index offset and length, b'BBAR'
+
+All integers and floats are little-endian, whatever the host byte order.
+
+Descriptions, categories, providers and bill types are interned into one
+string table, so repeated line items cost 8 bytes of ids each. Readers
+memory-map the file and decode only the requested bill and the strings it
+uses; line-item columns are read without copying.
+
+Appending writes new records after the existing footer, then a new footer
+and trailer; the old footer is left in place as dead space. Readers use
+the last complete trailer, so an append that dies before close() leaves
+the previously archived bills readable; a file whose first write died
+before close() (no complete trailer at all) reads as an empty archive. Re-adding a bill id points the
+index at the new record; compact() drops stale records and footers.
+"""
+import json
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+import logging
+
+from config import ARCHIVE_FILE, ARCHIVE_COMPRESSION_LEVEL
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAGIC = b'BBAR'
+FORMAT_VERSION = 1
+_HEADER = struct.Struct('<4sI')
+_TRAILER = struct.Struct('<QIQQ4s')
+# items, text block, aux block, pages (-1: none), provider id, bill type id, total
+_RECORD = struct.Struct('<IIIiIId')
+_NONE = 0xFFFFFFFF
+_PARSED_KEYS = ('text', 'page_text', 'structured_data')
+# Columns and string offsets are stored little-endian; big-endian hosts swap
+# them on write and read (reads are then copies rather than views)
+_LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+class ArchiveError(Exception):
+    """Raised for files that are not valid bill archives"""
+
+
+def _pad(length: int) -> int:
+    return -length % 8
+
+
+def _to_le(values: array) -> bytes:
+    """Array contents in the archive's (little-endian) byte order"""
+    if not _LITTLE_ENDIAN:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_le(view: memoryview, typecode: str) -> memoryview:
+    """Typed view of little-endian archive bytes (a swapped copy on big-endian hosts)"""
+    if _LITTLE_ENDIAN:
+        return view.cast(typecode)
+    values = array(typecode, view.tobytes())
+    values.byteswap()
+    return memoryview(values)
+
+
+class BillArchiveWriter:
+    """Append bills to an archive file (use as a context manager, or call close())"""
+    
+    def __init__(self, path: Path = ARCHIVE_FILE, level: int = ARCHIVE_COMPRESSION_LEVEL):
+        self.path = Path(path)
+        self.level = level
+        # Insertion-ordered: the keys are the string table
+        self._string_ids: Dict[str, int] = {}
+        self.index: Dict[str, Tuple[int, int]] = {}
+        
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists() and self.path.stat().st_size > 0:
+            # Append: keep the current footer until a new one is written after
+            # the new records
+            with BillArchive(self.path) as existing:
+                self._string_ids = {value: i for i, value in enumerate(existing.strings)}
+                self.index = dict(existing.index)
+                end = existing.end
+            self._file = open(self.path, 'r+b')
+            if end < self.path.stat().st_size:
+                logger.warning(f"Dropping an incomplete append from {self.path}")
+                self._file.truncate(end)
+            self._file.seek(end)
+        else:
+            self._file = open(self.path, 'wb')
+            self._file.write(_HEADER.pack(MAGIC, FORMAT_VERSION))
+    
+    def _intern(self, value: Optional[str]) -> int:
+        if value is None:
+            return _NONE
+        return self._string_ids.setdefault(value, len(self._string_ids))
+    
+    def add(self, bill_id: str, parsed: Dict, charges: Dict):
+        """
+        Append one bill
+        
+        Args:
+            bill_id: Stable bill id (file hash)
+            parsed: Output of PDFParser.parse_pdf
+            charges: Output of TextAnalyzer.analyze_charges
+        """
+        structured_data = dict(parsed.get('structured_data') or {})
+        provider = self._intern(structured_data.pop('provider', None))
+        bill_type = self._intern(structured_data.pop('bill_type', None))
+        
+        page_text = parsed.get('page_text')
+        texts = [parsed.get('text', '')] + list(page_text or [])
+        text_block = zlib.compress("".join(texts).encode('utf-8'), self.level)
+        aux = {key: value for key, value in parsed.items() if key not in _PARSED_KEYS}
+        aux['structured_data'] = structured_data
+        aux['text_lengths'] = [len(text) for text in texts]
+        if charges.get('taxes'):
+            aux['taxes'] = charges['taxes']
+        aux_block = zlib.compress(json.dumps(aux, default=str).encode('utf-8'), self.level)
+        
+        items = charges.get('line_items', [])
+        intern = self._string_ids.setdefault
+        amounts = array('d', [item['amount'] for item in items])
+        descriptions = array('I', [intern(item['description'], len(self._string_ids)) for item in items])
+        categories = array('I', [intern(item['category'], len(self._string_ids)) for item in items])
+        total = charges.get('total_amount')
+        
+        offset = self._file.tell()
+        head = _RECORD.pack(len(items), len(text_block), len(aux_block),
+                            -1 if page_text is None else len(page_text), provider, bill_type,
+                            float('nan') if total is None else total)
+        blocks = head + text_block + aux_block
+        self._file.write(blocks + b'\0' * _pad(offset + len(blocks)))
+        self._file.write(_to_le(amounts))
+        self._file.write(_to_le(descriptions))
+        self._file.write(_to_le(categories))
+        self.index[bill_id] = (offset, self._file.tell() - offset)
+    
+    def close(self):
+        if self._file.closed:
+            return
+        encoded = [value.encode('utf-8') for value in self._string_ids]
+        ends, end = array('I'), 0
+        for value in encoded:
+            end += len(value)
+            ends.append(end)
+        strings_offset = self._file.tell()
+        self._file.write(_to_le(ends))
+        self._file.write(b''.join(encoded))
+        
+        index = zlib.compress(json.dumps(self.index).encode('utf-8'), self.level)
+        index_offset = self._file.tell()
+        self._file.write(index)
+        self._file.write(_TRAILER.pack(strings_offset, len(encoded), index_offset, len(index), MAGIC))
+        self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BillArchive:
+    """Memory-mapped, random-access reader for bill archives"""
+    
+    def __init__(self, path: Path = ARCHIVE_FILE):
+        self.path = Path(path)
+        self._file = open(self.path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        
+        if len(self._map) < _HEADER.size:
+            raise ArchiveError(f"{self.path} is not a bill archive")
+        magic, version = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ArchiveError(f"{self.path} is not a bill archive")
+        if version != FORMAT_VERSION:
+            raise ArchiveError(f"{self.path} has unsupported archive version {version}")
+        
+        self.end, self.footer_offset, self.string_count, index = self._find_footer()
+        if self.end == _HEADER.size < len(self._map):
+            logger.warning(f"{self.path} has no complete footer; reading it as an empty archive")
+        elif self.end < len(self._map):
+            logger.warning(f"{self.path} ends with an incomplete append; reading the last complete footer")
+        self._string_ends = _from_le(self._view[self.footer_offset:self.footer_offset + 4 * self.string_count], 'I')
+        self._string_data = self.footer_offset + 4 * self.string_count
+        self._string_cache: Dict[int, str] = {}
+        self.index: Dict[str, Tuple[int, int]] = {bill_id: tuple(entry) for bill_id, entry in index.items()}
+    
+    def _find_footer(self) -> Tuple[int, int, int, Dict]:
+        """
+        Locate the last complete trailer, scanning back past any partial append
+        
+        Returns:
+            (end of the trailer, string table offset, string count, index);
+            the end of the header and an empty index if there is no trailer
+        """
+        end = len(self._map)
+        while True:
+            if self._map[end - 4:end] == MAGIC:
+                footer = self._read_footer(end)
+                if footer is not None:
+                    return (end,) + footer
+            found = self._map.rfind(MAGIC, _HEADER.size, end - 1)
+            if found < 0:
+                return _HEADER.size, _HEADER.size, 0, {}
+            end = found + len(MAGIC)
+    
+    def _read_footer(self, end: int) -> Optional[Tuple[int, int, Dict]]:
+        """The footer whose trailer ends at `end`, or None if that isn't a valid trailer"""
+        trailer_start = end - _TRAILER.size
+        if trailer_start < _HEADER.size:
+            return None
+        strings_offset, string_count, index_offset, index_length, _ = _TRAILER.unpack_from(self._map, trailer_start)
+        if not (_HEADER.size <= strings_offset and strings_offset + 4 * string_count <= index_offset
+                and index_offset + index_length == trailer_start):
+            return None
+        try:
+            index = json.loads(zlib.decompress(self._map[index_offset:trailer_start]))
+        except (zlib.error, ValueError):
+            return None
+        return strings_offset, string_count, index
+    
+    def string(self, string_id: int) -> Optional[str]:
+        """Decode one interned string (None for the missing-value id)"""
+        if string_id == _NONE:
+            return None
+        value = self._string_cache.get(string_id)
+        if value is None:
+            start = self._string_ends[string_id - 1] if string_id else 0
+            value = self._string_cache[string_id] = str(
+                self._map[self._string_data + start:self._string_data + self._string_ends[string_id]], 'utf-8'
+            )
+        return value
+    
+    @property
+    def strings(self) -> List[str]:
+        """The whole interned string table"""
+        return [self.string(i) for i in range(self.string_count)]
+    
+    def __contains__(self, bill_id: str) -> bool:
+        return bill_id in self.index
+    
+    def __len__(self) -> int:
+        return len(self.index)
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.index)
+    
+    def _record(self, bill_id: str):
+        offset, _ = self.index[bill_id]
+        head = _RECORD.unpack_from(self._map, offset)
+        return offset + _RECORD.size, head
+    
+    def _columns(self, start: int, count: int):
+        start += _pad(start)
+        amounts = _from_le(self._view[start:start + 8 * count], 'd')
+        start += 8 * count
+        descriptions = _from_le(self._view[start:start + 4 * count], 'I')
+        start += 4 * count
+        categories = _from_le(self._view[start:start + 4 * count], 'I')
+        return amounts, descriptions, categories
+    
+    def line_item_columns(self, bill_id: str) -> Dict[str, memoryview]:
+        """
+        Zero-copy line-item columns of a bill (copies on big-endian hosts)
+        
+        The views stay valid after close(): the mapping itself is released
+        once the last of them is (copy with .tolist() or bytes() to keep the
+        values without holding the mapping open).
+        
+        Returns:
+            'amount' (float64), 'description' and 'category' (string ids,
+            see string()) as memoryviews over the mapped file
+        """
+        start, (count, text_length, aux_length, *_rest) = self._record(bill_id)
+        amounts, descriptions, categories = self._columns(start + text_length + aux_length, count)
+        return {'amount': amounts, 'description': descriptions, 'category': categories}
+    
+    def get(self, bill_id: str) -> Dict:
+        """
+        Decode one bill
+        
+        Returns:
+            {'parsed': parse_pdf output, 'charges': analyze_charges output}
+        """
+        start, (count, text_length, aux_length, pages, provider, bill_type, total) = self._record(bill_id)
+        
+        joined = zlib.decompress(self._map[start:start + text_length]).decode('utf-8')
+        start += text_length
+        aux = json.loads(zlib.decompress(self._map[start:start + aux_length]))
+        start += aux_length
+        
+        texts, position = [], 0
+        for length in aux.pop('text_lengths'):
+            texts.append(joined[position:position + length])
+            position += length
+        
+        structured_data = aux.pop('structured_data')
+        structured_data['provider'] = self.string(provider)
+        structured_data['bill_type'] = self.string(bill_type)
+        taxes = aux.pop('taxes', [])
+        parsed = {'text': texts[0], **aux, 'structured_data': structured_data}
+        if pages >= 0:
+            parsed['page_text'] = texts[1:]
+        
+        amounts, descriptions, categories = self._columns(start, count)
+        strings = self._string_cache
+        for string_id in {*descriptions, *categories}.difference(strings):
+            self.string(string_id)
+        line_items = [
+            {'description': strings[d], 'amount': a, 'category': strings[c]}
+            for a, d, c in zip(amounts, descriptions, categories)
+        ]
+        grouped: Dict[str, List[Dict]] = {}
+        for item in line_items:
+            grouped.setdefault(item['category'], []).append(item)
+        
+        charges = {
+            'total_amount': None if total != total else total,
+            'categories': grouped,
+            'line_items': line_items,
+            'taxes': taxes,
+            'summary': {category: sum(item['amount'] for item in items)
+                        for category, items in grouped.items()}
+        }
+        return {'parsed': parsed, 'charges': charges}
+    
+    def close(self):
+        self._string_ends.release()
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            # Views from line_item_columns() are still alive; they keep the
+            # mapping open until they are released
+            pass
+        self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+def compact(path: Path = ARCHIVE_FILE):
+    """Rewrite an archive without records superseded by re-added bill ids or the footers of earlier appends"""
+    path = Path(path)
+    tmp = path.with_suffix(path.suffix + '.tmp')
+    # A leftover from an interrupted compact() would otherwise be appended to
+    tmp.unlink(missing_ok=True)
+    with BillArchive(path) as archive, BillArchiveWriter(tmp) as writer:
+        for bill_id in archive:
+            bill = archive.get(bill_id)
+            writer.add(bill_id, bill['parsed'], bill['charges'])
+    tmp.replace(path)
@@ -0,0 +1,95 @@
+from typing import Dict, List, Optional, Sequence
+import logging
+
+import numpy as np
+import pandas as pd
+
+from .anomaly_rules import get_rule_engine
+from .instrumentation import instrumentation
+from .rollups import bill_date
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class BillBatch:
+    """Columnar view of many analysed bills (output of analyze_charges)"""
+    
+    def __init__(self, bills: Sequence[Dict],
+                 historical_data: Optional[Sequence[Optional[List[Dict]]]] = None,
+                 structured_data: Optional[Sequence[Optional[Dict]]] = None):
+        self.size = len(bills)
+        self.summaries = [bill.get('summary', {}) for bill in bills]
+        self._category_cache: Dict[str, np.ndarray] = {}
+        self.totals = np.fromiter((bill.get('total_amount', 0) or 0 for bill in bills),
+                                  dtype=np.float64, count=self.size)
+        self.taxes = self.category_totals('Taxes')
+        
+        # Line items flattened into parallel columns keyed by bill index
+        item_bill, descriptions, amounts = [], [], []
+        for index, bill in enumerate(bills):
+            for item in bill.get('line_items', []):
+                item_bill.append(index)
+                descriptions.append(item['description'])
+                amounts.append(item['amount'])
+        # Descriptions repeat heavily across a portfolio, so they are stored
+        # as codes into a table of unique strings and text rules run once
+        # per unique description
+        codes, self.descriptions = pd.factorize(pd.Series(descriptions, dtype=object))
+        self.items = pd.DataFrame({
+            'bill': np.asarray(item_bill, dtype=np.int64),
+            'code': codes,
+            'amount': np.asarray(amounts, dtype=np.float64)
+        })
+        
+        # Historical average per bill (NaN when there is no history)
+        self.history_avg = np.full(self.size, np.nan)
+        for index, history in enumerate(historical_data or []):
+            if history:
+                self.history_avg[index] = (
+                    sum(bill.get('total_amount', 0) for bill in history) / len(history)
+                )
+        
+        # Bill type / provider per bill, for rules scoped to them
+        structured_data = list(structured_data or [])
+        structured_data += [None] * (self.size - len(structured_data))
+        self.bill_types = np.array([(data or {}).get('bill_type') for data in structured_data], dtype=object)
+        self.providers = np.array([(data or {}).get('provider') for data in structured_data], dtype=object)
+        self.bill_dates = [bill_date((data or {}).get('dates')) for data in structured_data]
+        self.units = np.array([(data or {}).get('units_consumed') or np.nan for data in structured_data],
+                              dtype=np.float64)
+    
+    def category_totals(self, category: str) -> np.ndarray:
+        """Per-bill total of one charge category (0 where absent)"""
+        if category not in self._category_cache:
+            self._category_cache[category] = np.fromiter(
+                (summary.get(category, 0) for summary in self.summaries),
+                dtype=np.float64, count=self.size
+            )
+        return self._category_cache[category]
+
+
+def scan_batch(batch: BillBatch, engine=None) -> List[List[Dict]]:
+    """
+    Evaluate the anomaly rules over a whole batch at once
+    
+    Args:
+        batch: Columnar bills
+        engine: RuleEngine to use (defaults to the shared one)
+    
+    Returns:
+        One anomaly list per bill, identical to TextAnalyzer.detect_anomalies
+    """
+    if engine is None:
+        engine = get_rule_engine()
+    
+    with instrumentation.span('bulk_anomalies', bills=batch.size):
+        return engine.evaluate_batch(batch)
+
+
+def scan_bills(bills: Sequence[Dict],
+               historical_data: Optional[Sequence[Optional[List[Dict]]]] = None,
+               structured_data: Optional[Sequence[Optional[Dict]]] = None,
+               engine=None) -> List[List[Dict]]:
+    """Convenience wrapper: build a BillBatch and scan it"""
+    return scan_batch(BillBatch(bills, historical_data, structured_data), engine)
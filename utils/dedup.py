@@ -0,0 +1,304 @@
+"""
+Duplicate and near-duplicate bill detection.
+
+Every upload is checked before full parsing, OCR or LLM work:
+
+1. exact match on the SHA-256 of the file bytes
+2. a probe parse of the header band (to detect the provider) and then
+   that provider's key-field regions only (account number, billing period,
+   total - see config.DEDUP_PROBE_REGIONS), which OCRs a few small bands
+   instead of whole pages on scanned bills
+3. exact match on the key fields (account + billing dates + total); a
+   rescan where OCR misread one of them is left to the SimHash
+4. a 64-bit SimHash of the probe text's variable tokens (the ones with
+   digits; labels are the same on every bill of a provider), looked up by
+   banding: the signature
+   is split into DEDUP_MAX_DISTANCE + 1 bands, so any signature within that
+   Hamming distance shares at least one band exactly. Bands are indexed in
+   SQLite, so a lookup only scans the few signatures in matching buckets.
+
+Steps 3 and 4 are skipped when the probe reads too little variable text
+(unknown layout, blank or unreadable bands): such a bill is indexed and
+matched by its file hash only, since an empty SimHash would match any
+other empty one.
+"""
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+from config import DEDUP_DB, DEDUP_MAX_DISTANCE, DEDUP_PROBE_REGIONS, DEDUP_HEADER_REGION, DEDUP_MIN_SHINGLES
+from .profiling import file_hash
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SIMHASH_BITS = 64
+_MASK = (1 << SIMHASH_BITS) - 1
+_TOKEN_RE = re.compile(r'[a-z0-9./-]+')
+
+
+def _to_signed(value: int) -> int:
+    """SQLite integers are signed 64-bit"""
+    return value - (1 << SIMHASH_BITS) if value >= 1 << (SIMHASH_BITS - 1) else value
+
+
+def _to_unsigned(value: int) -> int:
+    return value & _MASK
+
+
+def shingles(text: str, size: int = 3) -> List[str]:
+    """Character n-grams over the tokens of a bill that contain digits"""
+    tokens = [token for token in _TOKEN_RE.findall(text.lower()) if any(c.isdigit() for c in token)]
+    content = " ".join(tokens)
+    if len(content) < size:
+        return [content] if content else []
+    return [content[i:i + size] for i in range(len(content) - size + 1)]
+
+
+def simhash(features: Iterable[str]) -> int:
+    """
+    64-bit SimHash of a bag of features
+    
+    Similar inputs give signatures with a small Hamming distance.
+    """
+    weights = [0] * SIMHASH_BITS
+    for feature in features:
+        h = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    
+    signature = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            signature |= 1 << bit
+    return signature
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def key_field_hashes(structured_data: Dict) -> List[str]:
+    """
+    Hash of the bill's key fields: account + billing dates + total
+    
+    All three are required. Account + total alone matches every month of a
+    flat-rate customer, and dates + total matches different customers on
+    the same flat rate; a misread field falls back to SimHash matching.
+    """
+    accounts = [a for a in structured_data.get('account_numbers', []) if any(c.isdigit() for c in a)]
+    amounts = structured_data.get('amounts') or []
+    dates = structured_data.get('dates') or []
+    if not (accounts and amounts and dates):
+        return []
+    
+    key = f"{accounts[0].upper()}|{','.join(sorted(set(dates)))}|{max(amounts):.2f}"
+    return [hashlib.sha256(key.encode('utf-8')).hexdigest()]
+
+
+class DedupIndex:
+    """SQLite-backed index of stored bills by file hash, key fields and SimHash bands"""
+    
+    def __init__(self, path: Path = DEDUP_DB, max_distance: int = DEDUP_MAX_DISTANCE,
+                 probe_regions: Optional[Dict[str, Dict[str, Dict]]] = None,
+                 header_region: Optional[Dict[str, Dict]] = None,
+                 min_shingles: int = DEDUP_MIN_SHINGLES):
+        self.path = Path(path)
+        self.max_distance = max_distance
+        # provider -> key-field regions
+        self.probe_regions = probe_regions or DEDUP_PROBE_REGIONS
+        self.header_region = header_region or DEDUP_HEADER_REGION
+        self.min_shingles = min_shingles
+        self.bands = max_distance + 1
+        self.band_bits = -(-SIMHASH_BITS // self.bands)
+        self._lock = threading.Lock()
+        
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS bills (
+                bill_id TEXT PRIMARY KEY,
+                simhash INTEGER,
+                added REAL
+            );
+            CREATE TABLE IF NOT EXISTS keys (
+                key TEXT,
+                bill_id TEXT
+            );
+            CREATE INDEX IF NOT EXISTS keys_lookup ON keys (key);
+            CREATE INDEX IF NOT EXISTS keys_bill ON keys (bill_id);
+            CREATE TABLE IF NOT EXISTS bands (
+                band INTEGER,
+                value INTEGER,
+                bill_id TEXT
+            );
+            CREATE INDEX IF NOT EXISTS bands_lookup ON bands (band, value);
+            CREATE INDEX IF NOT EXISTS bands_bill ON bands (bill_id);
+        """)
+    
+    def _bands(self, signature: int) -> List[Tuple[int, int]]:
+        mask = (1 << self.band_bits) - 1
+        return [(band, signature >> (band * self.band_bits) & mask) for band in range(self.bands)]
+    
+    def signature(self, text: str, structured_data: Dict) -> Dict:
+        """
+        SimHash and key-field hashes of a bill's (probe) text
+        
+        Returns:
+            {'simhash', 'keys'}; simhash is None and keys empty when the text
+            has fewer than min_shingles shingles (exact file-hash matching only)
+        """
+        features = shingles(text)
+        if len(features) < self.min_shingles:
+            return {'simhash': None, 'keys': []}
+        return {
+            'simhash': simhash(features),
+            'keys': key_field_hashes(structured_data)
+        }
+    
+    def probe(self, pdf_file, parser=None) -> Dict:
+        """
+        Detect the provider from the header band, then parse only that
+        provider's key-field regions and compute the bill's signature
+        
+        Args:
+            pdf_file: Uploaded PDF file object
+            parser: PDFParser to use (a new one by default)
+        """
+        if parser is None:
+            from .pdf_parser import PDFParser
+            parser = PDFParser()
+        
+        def parse(regions: Dict[str, Dict]) -> Dict:
+            if hasattr(pdf_file, 'seek'):
+                pdf_file.seek(0)
+            parsed = parser.parse_pdf(pdf_file, regions=regions)
+            if hasattr(pdf_file, 'seek'):
+                pdf_file.seek(0)
+            return parsed
+        
+        provider = parse(self.header_region)['structured_data'].get('provider')
+        regions = self.probe_regions.get(provider)
+        if not regions:
+            logger.info(f"No probe layout for provider {provider!r}; matching on file hash only")
+            return {'simhash': None, 'keys': []}
+        parsed = parse(regions)
+        return self.signature(parsed['text'], parsed['structured_data'])
+    
+    def contains(self, bill_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM bills WHERE bill_id = ?", (bill_id,)).fetchone()
+        return row is not None
+    
+    def find_similar(self, simhash_value: Optional[int], keys: Iterable[str] = ()) -> Optional[Dict]:
+        """
+        Closest stored bill sharing the key fields or within max_distance bits
+        
+        Returns:
+            {'bill_id', 'match': 'key_fields' | 'simhash', 'distance'} or None
+        """
+        with self._lock:
+            for key in keys:
+                row = self._conn.execute(
+                    "SELECT bills.bill_id, bills.simhash FROM keys "
+                    "JOIN bills ON bills.bill_id = keys.bill_id WHERE keys.key = ? LIMIT 1", (key,)
+                ).fetchone()
+                if row:
+                    distance = (hamming(simhash_value, _to_unsigned(row[1]))
+                                if simhash_value is not None and row[1] is not None else None)
+                    return {'bill_id': row[0], 'match': 'key_fields', 'distance': distance}
+            
+            if simhash_value is None:
+                return None
+            clauses = " OR ".join("(b.band = ? AND b.value = ?)" for _ in range(self.bands))
+            params = [v for pair in self._bands(simhash_value) for v in pair]
+            candidates = self._conn.execute(
+                f"SELECT DISTINCT bills.bill_id, bills.simhash FROM bands b "
+                f"JOIN bills ON bills.bill_id = b.bill_id WHERE {clauses}", params
+            ).fetchall()
+        
+        best = None
+        for bill_id, stored in candidates:
+            distance = hamming(simhash_value, _to_unsigned(stored))
+            if distance <= self.max_distance and (best is None or distance < best['distance']):
+                best = {'bill_id': bill_id, 'match': 'simhash', 'distance': distance}
+        return best
+    
+    def check(self, pdf_file, parser=None) -> Dict:
+        """
+        Check an upload against the index before any full parse/OCR/LLM work
+        
+        Args:
+            pdf_file: Uploaded PDF file object
+            parser: PDFParser used for the probe parse
+        
+        Returns:
+            Dictionary with the upload's bill_id, 'duplicate_of' (None if
+            new), the match kind and distance, and its signature (pass it to
+            add() once the bill is stored)
+        """
+        bill_id = file_hash(pdf_file)
+        result = {'bill_id': bill_id, 'duplicate_of': None, 'match': None, 'distance': None,
+                  'signature': None}
+        
+        if self.contains(bill_id):
+            result.update(duplicate_of=bill_id, match='exact', distance=0)
+            return result
+        
+        signature = self.probe(pdf_file, parser)
+        result['signature'] = signature
+        if signature['simhash'] is None:
+            return result
+        similar = self.find_similar(signature['simhash'], signature['keys'])
+        if similar:
+            result.update(duplicate_of=similar['bill_id'], match=similar['match'],
+                          distance=similar['distance'])
+            logger.info(f"Bill {bill_id[:12]} is a near-duplicate of {similar['bill_id'][:12]} "
+                        f"({similar['match']}, distance {similar['distance']})")
+        return result
+    
+    def add(self, bill_id: str, signature: Dict):
+        """Index a stored bill under its file hash and signature (file hash only if it has no SimHash)"""
+        self.add_many([(bill_id, signature)])
+    
+    def add_many(self, entries: Iterable[Tuple[str, Dict]]):
+        """Index many bills in one transaction"""
+        now = time.time()
+        with self._lock, self._conn:
+            for bill_id, signature in entries:
+                self._conn.execute("DELETE FROM bands WHERE bill_id = ?", (bill_id,))
+                self._conn.execute("DELETE FROM keys WHERE bill_id = ?", (bill_id,))
+                value = signature.get('simhash')
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO bills (bill_id, simhash, added) VALUES (?, ?, ?)",
+                    (bill_id, _to_signed(value) if value is not None else None, now)
+                )
+                if value is None:
+                    continue
+                self._conn.executemany(
+                    "INSERT INTO keys (key, bill_id) VALUES (?, ?)",
+                    [(key, bill_id) for key in signature.get('keys', [])]
+                )
+                self._conn.executemany(
+                    "INSERT INTO bands (band, value, bill_id) VALUES (?, ?, ?)",
+                    [(band, band_value, bill_id) for band, band_value in self._bands(value)]
+                )
+    
+    def remove(self, bill_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM bands WHERE bill_id = ?", (bill_id,))
+            self._conn.execute("DELETE FROM keys WHERE bill_id = ?", (bill_id,))
+            self._conn.execute("DELETE FROM bills WHERE bill_id = ?", (bill_id,))
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM bills").fetchone()[0]
+    
+    def close(self):
+        self._conn.close()
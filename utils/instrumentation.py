@@ -0,0 +1,263 @@
+import json
+import threading
+import time
+from contextvars import ContextVar
+from collections import defaultdict
+from functools import wraps
+from pathlib import Path
+from typing import Dict, List, Optional
+import logging
+
+from config import INSTRUMENTATION_ENABLED, INSTRUMENTATION_EXPORTERS, INSTRUMENTATION_PROMETHEUS_FILE
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_current_span: ContextVar[Optional['Span']] = ContextVar('billbuster_span', default=None)
+
+
+class Span:
+    """A timed, nestable section of the pipeline"""
+    
+    __slots__ = ('name', 'attrs', 'start', 'duration_ms', 'children', '_instrumentation', '_token')
+    
+    def __init__(self, instrumentation: 'Instrumentation', name: str, attrs: Dict):
+        self.name = name
+        self.attrs = attrs
+        self.start = 0.0
+        self.duration_ms = 0.0
+        self.children: List['Span'] = []
+        self._instrumentation = instrumentation
+        self._token = None
+    
+    def __enter__(self) -> 'Span':
+        self._token = _current_span.set(self)
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ms = (time.perf_counter() - self.start) * 1000
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        _current_span.reset(self._token)
+        self._instrumentation._finish(self, _current_span.get())
+        return False
+    
+    def set(self, **attrs):
+        """Attach attributes (page number, counts, ...) to the span"""
+        self.attrs.update(attrs)
+    
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'duration_ms': round(self.duration_ms, 3),
+            'attrs': self.attrs,
+            'children': [child.to_dict() for child in self.children]
+        }
+
+
+class _NullSpan:
+    """Shared no-op span returned while instrumentation is disabled"""
+    
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        return False
+    
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class InMemoryExporter:
+    """Keep finished span trees in memory (tests, benchmarks, debugging)"""
+    
+    def __init__(self, max_spans: int = 1000):
+        self.max_spans = max_spans
+        self.spans: List[Dict] = []
+        self.counters: Dict[str, float] = {}
+    
+    def export_span(self, span: Span):
+        self.spans.append(span.to_dict())
+        if len(self.spans) > self.max_spans:
+            del self.spans[0]
+    
+    def export_counters(self, counters: Dict[str, float]):
+        self.counters = dict(counters)
+    
+    def durations(self, name: str) -> List[float]:
+        """All recorded durations (ms) for spans with this name, at any depth"""
+        found = []
+        stack = list(self.spans)
+        while stack:
+            span = stack.pop()
+            if span['name'] == name:
+                found.append(span['duration_ms'])
+            stack.extend(span['children'])
+        return found
+
+
+class JSONLogExporter:
+    """Log each finished span tree as one JSON line"""
+    
+    def __init__(self, log: logging.Logger = None):
+        self.log = log or logger
+    
+    def export_span(self, span: Span):
+        self.log.info(json.dumps({'span': span.to_dict()}))
+    
+    def export_counters(self, counters: Dict[str, float]):
+        self.log.info(json.dumps({'counters': counters}))
+
+
+class PrometheusExporter:
+    """Aggregate spans and counters into Prometheus text exposition format"""
+    
+    def __init__(self, prefix: str = 'billbuster', path: Optional[Path] = None):
+        self.prefix = prefix
+        self.path = Path(path) if path else None
+        self.span_count: Dict[str, int] = defaultdict(int)
+        self.span_sum_ms: Dict[str, float] = defaultdict(float)
+        self.counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+    
+    def export_span(self, span: Span):
+        with self._lock:
+            stack = [span]
+            while stack:
+                current = stack.pop()
+                self.span_count[current.name] += 1
+                self.span_sum_ms[current.name] += current.duration_ms
+                stack.extend(current.children)
+    
+    def export_counters(self, counters: Dict[str, float]):
+        with self._lock:
+            self.counters = dict(counters)
+        if self.path:
+            # Write-then-rename so a scraper never reads a half-written file
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(self.path.name + '.tmp')
+            tmp_path.write_text(self.render())
+            tmp_path.replace(self.path)
+    
+    def render(self) -> str:
+        """Return the current metrics as Prometheus text format"""
+        lines = [
+            f"# HELP {self.prefix}_span_seconds Time spent in pipeline stages",
+            f"# TYPE {self.prefix}_span_seconds summary"
+        ]
+        with self._lock:
+            for name in sorted(self.span_count):
+                lines.append(f'{self.prefix}_span_seconds_count{{span="{name}"}} {self.span_count[name]}')
+                lines.append(f'{self.prefix}_span_seconds_sum{{span="{name}"}} {self.span_sum_ms[name] / 1000:.6f}')
+            for name in sorted(self.counters):
+                metric = f"{self.prefix}_{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric} {self.counters[name]}")
+        return "\n".join(lines) + "\n"
+
+
+class Instrumentation:
+    """Timing spans and counters with pluggable exporters"""
+    
+    def __init__(self, enabled: bool = False, exporters: Optional[List] = None):
+        self.enabled = enabled
+        self.exporters = list(exporters or [])
+        self.counters: Dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+    
+    def span(self, name: str, **attrs):
+        """
+        Time a block of code, nested under the currently open span
+        
+        Args:
+            name: Stage name (parse, page, ocr, table, regex, ...)
+            **attrs: Extra attributes recorded with the span
+        
+        Returns:
+            Context manager; a shared no-op when instrumentation is disabled
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return Span(self, name, attrs)
+    
+    def record(self, name: str, duration_ms: float, **attrs):
+        """Attach an already-measured span (e.g. OCR timed on a worker thread)"""
+        if not self.enabled:
+            return
+        span = Span(self, name, attrs)
+        span.duration_ms = duration_ms
+        self._finish(span, _current_span.get())
+    
+    def incr(self, name: str, value: float = 1):
+        """Increment a counter (pages, ocr_pages, line_items, cache_hits, ...)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] += value
+    
+    def timed(self, name: str):
+        """Decorator form of span()"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with Span(self, name, {}):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+    
+    def add_exporter(self, exporter):
+        self.exporters.append(exporter)
+    
+    def flush(self):
+        """Push the current counter values to all exporters"""
+        with self._lock:
+            counters = dict(self.counters)
+        for exporter in self.exporters:
+            try:
+                exporter.export_counters(counters)
+            except Exception as e:
+                logger.error(f"Exporter {type(exporter).__name__} failed: {str(e)}")
+    
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+    
+    def _finish(self, span: Span, parent: Optional[Span]):
+        if parent is not None:
+            parent.children.append(span)
+            return
+        for exporter in self.exporters:
+            try:
+                exporter.export_span(span)
+            except Exception as e:
+                logger.error(f"Exporter {type(exporter).__name__} failed: {str(e)}")
+        # A finished root span is one whole request: publish the counters with it
+        self.flush()
+
+
+EXPORTERS = {
+    'memory': InMemoryExporter,
+    'json': JSONLogExporter,
+    'prometheus': PrometheusExporter
+}
+
+
+def _build_exporter(name: str):
+    if name == 'prometheus':
+        return PrometheusExporter(path=INSTRUMENTATION_PROMETHEUS_FILE)
+    return EXPORTERS[name]()
+
+
+instrumentation = Instrumentation(
+    enabled=INSTRUMENTATION_ENABLED,
+    exporters=[_build_exporter(name.strip()) for name in INSTRUMENTATION_EXPORTERS
+               if name.strip() in EXPORTERS] if INSTRUMENTATION_ENABLED else []
+)
@@ -0,0 +1,280 @@
+"""
+Background processing of uploaded bills.
+
+The Streamlit script thread only submits work and renders whatever a job
+has produced so far; parsing, analysis and explanations run on a worker
+pool. Each bill goes through BillPipeline, so uploads share its artefact
+store and (when configured) the duplicate and search indexes. Jobs are
+keyed by the file's hash, so a rerun of the script attaches to the
+existing job instead of starting over; failed and cancelled jobs are only
+restarted on an explicit retry. Cancelling a job stops parsing at the next
+page and drops results that arrive late; finished jobs can't be cancelled.
+Explanations run on a separate pool, so they never wait behind parses.
+"""
+import io
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+import logging
+
+from config import JOB_WORKERS, JOB_HISTORY, EXPLANATION_WORKERS, PROFILE_ENABLED
+from .dedup import DedupIndex
+from .pdf_parser import PDFParser, ParseCancelled
+from .pipeline import ArtefactStore, BillPipeline
+from .profiling import file_hash, profile_bill
+from .rollups import RollupEngine
+from .search import BillSearchIndex
+from .text_analyzer import TextAnalyzer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Job states, in order
+QUEUED = 'queued'
+PARSING = 'parsing'
+ANALYZING = 'analyzing'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+class BillJob:
+    """State and partial results of one uploaded bill"""
+    
+    def __init__(self, key: str, name: str = ""):
+        self.key = key
+        self.name = name
+        self.status = QUEUED
+        self.error: Optional[str] = None
+        self.pages_done = 0
+        self.pages_total = 0
+        self.parsed: Optional[Dict] = None
+        self.analysis: Optional[Dict] = None
+        # language -> explanation; pending languages are being generated
+        self.explanations: Dict[str, str] = {}
+        self.explanation_errors: Dict[str, str] = {}
+        self.pending_explanations = set()
+        self.cancel_event = threading.Event()
+        self.started = time.time()
+        self._lock = threading.Lock()
+    
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+    
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED, CANCELLED)
+    
+    @property
+    def progress(self) -> float:
+        """Fraction of parse + analysis done"""
+        if self.status in (DONE, ANALYZING):
+            return 1.0 if self.status == DONE else 0.9
+        if not self.pages_total:
+            return 0.0
+        return 0.9 * self.pages_done / self.pages_total
+    
+    def update(self, **fields) -> bool:
+        """
+        Set fields (status, results) unless the job was cancelled
+        
+        Returns:
+            False if the job was cancelled and nothing was changed
+        """
+        with self._lock:
+            if self.cancelled:
+                return False
+            for name, value in fields.items():
+                setattr(self, name, value)
+            return True
+    
+    def cancel(self) -> bool:
+        """
+        Stop a queued or running job; finished jobs keep their results
+        
+        Returns:
+            True if the job was cancelled
+        """
+        with self._lock:
+            if self.finished:
+                return False
+            self.cancel_event.set()
+            self.status = CANCELLED
+            return True
+
+
+class JobManager:
+    """
+    Runs bill jobs on a shared worker pool
+    
+    Bills are processed by a BillPipeline per job (parsers and analyzers are
+    not shared between threads) over a shared artefact store and optional
+    DedupIndex / BillSearchIndex. With a RollupEngine, every finished bill
+    is ingested into the portfolio rollups, which are saved to their file
+    after each bill and on shutdown.
+    """
+    
+    def __init__(self, max_workers: int = JOB_WORKERS, history: int = JOB_HISTORY,
+                 parser_factory: Callable[[], PDFParser] = PDFParser,
+                 analyzer_factory: Optional[Callable[[], TextAnalyzer]] = None,
+                 explainer_factory: Optional[Callable] = None,
+                 rollups: Optional[RollupEngine] = None,
+                 store: Optional[ArtefactStore] = None,
+                 dedup: Optional[DedupIndex] = None,
+                 search: Optional[BillSearchIndex] = None):
+        self.history = history
+        self.parser_factory = parser_factory
+        self.analyzer_factory = analyzer_factory or (lambda: TextAnalyzer(rollups=rollups))
+        self.rollups = rollups
+        self.store = store or ArtefactStore()
+        self.dedup = dedup
+        self.search = search
+        self.explainer_factory = explainer_factory
+        self._explainer = None
+        self._explainer_lock = threading.Lock()
+        self._jobs: Dict[str, BillJob] = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bill-job')
+        self._explain_executor = ThreadPoolExecutor(max_workers=EXPLANATION_WORKERS,
+                                                    thread_name_prefix='bill-explain')
+    
+    def submit(self, file_bytes: bytes, name: str = "", retry: bool = False) -> BillJob:
+        """
+        Start processing a bill, or return the existing job for it
+        
+        Args:
+            file_bytes: Contents of the uploaded PDF
+            name: Original file name, for display
+            retry: Restart the job if it failed or was cancelled (otherwise
+                it is returned as is, so its error stays visible)
+        
+        Returns:
+            The job for this file
+        """
+        key = file_hash(file_bytes)
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and not (retry and job.status in (FAILED, CANCELLED)):
+                self._jobs.move_to_end(key)
+                return job
+            
+            job = self._jobs[key] = BillJob(key, name)
+            self._prune()
+        self._executor.submit(self._run, job, file_bytes)
+        return job
+    
+    def get(self, key: str) -> Optional[BillJob]:
+        with self._lock:
+            return self._jobs.get(key)
+    
+    def cancel(self, key: str):
+        """Cancel an unfinished job; work already in flight is discarded when it finishes"""
+        job = self.get(key)
+        if job is not None and job.cancel():
+            logger.info(f"Cancelled job {key[:12]}")
+    
+    def _prune(self):
+        """Forget the oldest finished jobs beyond the history limit"""
+        finished = [key for key, job in self._jobs.items() if job.finished]
+        for key in finished[:max(0, len(self._jobs) - self.history)]:
+            del self._jobs[key]
+    
+    @staticmethod
+    def _profile(job: BillJob):
+        """With BILLBUSTER_PROFILE=1, file every stage of the job under its file hash"""
+        return profile_bill(bill_id=job.key) if PROFILE_ENABLED else nullcontext()
+    
+    def _run(self, job: BillJob, file_bytes: bytes):
+        if job.cancelled:
+            return
+        with self._profile(job):
+            self._process(job, file_bytes)
+    
+    def _pipeline(self) -> BillPipeline:
+        return BillPipeline(parser=self.parser_factory(), analyzer=self.analyzer_factory(),
+                            store=self.store, dedup=self.dedup, search=self.search)
+    
+    def _process(self, job: BillJob, file_bytes: bytes):
+        try:
+            if not job.update(status=PARSING):
+                return
+            
+            def on_page(done: int, total: int):
+                job.pages_done, job.pages_total = done, total
+                if done == total:
+                    job.update(status=ANALYZING)
+            
+            result = self._pipeline().process(io.BytesIO(file_bytes), progress=on_page,
+                                              cancel=job.cancel_event)
+            if result['duplicate_of']:
+                logger.info(f"Job {job.key[:12]} reused stored bill {result['duplicate_of'][:12]}")
+            analysis = {key: result[key] for key in ('charges', 'anomalies', 'insights')}
+            if job.update(parsed=result['parsed'], analysis=analysis, status=DONE):
+                self._save_rollups()
+        except ParseCancelled:
+            job.cancel()
+        except Exception as e:
+            logger.error(f"Job {job.key[:12]} failed: {str(e)}")
+            job.update(error=str(e), status=FAILED)
+    
+    def _save_rollups(self):
+        if self.rollups is None:
+            return
+        try:
+            self.rollups.flush()
+        except Exception as e:
+            logger.error(f"Could not save rollups: {str(e)}")
+    
+    def _get_explainer(self):
+        """Create the (slow to load) explainer on a worker thread, once"""
+        with self._explainer_lock:
+            if self._explainer is None:
+                self._explainer = self.explainer_factory()
+            return self._explainer
+    
+    def request_explanation(self, key: str, language: str = 'en') -> bool:
+        """
+        Generate the job's explanation in a language, in the background
+        
+        Returns:
+            True if the explanation is ready or being generated
+        """
+        job = self.get(key)
+        if job is None or job.analysis is None or job.cancelled or self.explainer_factory is None:
+            return False
+        with self._lock:
+            if language in job.explanations or language in job.pending_explanations:
+                return True
+            job.pending_explanations.add(language)
+            job.explanation_errors.pop(language, None)
+        self._explain_executor.submit(self._explain, job, language)
+        return True
+    
+    def _explain(self, job: BillJob, language: str):
+        try:
+            if job.cancelled:
+                return
+            bill_data = {
+                'charges': job.analysis['charges'],
+                'structured_data': job.parsed['structured_data']
+            }
+            with self._profile(job):
+                explanation = self._get_explainer().explain_bill(bill_data, language)
+            job.update(explanations={**job.explanations, language: explanation})
+        except Exception as e:
+            logger.error(f"Explanation for job {job.key[:12]} failed: {str(e)}")
+            job.explanation_errors[language] = str(e)
+        finally:
+            job.pending_explanations.discard(language)
+    
+    def shutdown(self):
+        with self._lock:
+            for job in self._jobs.values():
+                job.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._explain_executor.shutdown(wait=False, cancel_futures=True)
+        self._save_rollups()
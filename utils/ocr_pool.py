@@ -0,0 +1,165 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+import logging
+
+import pytesseract
+
+try:
+    # In-process Tesseract API: no subprocess or temp file per page
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+from config import OCR_WORKERS, OCR_QUEUE_DEPTH, OCR_TIMEOUT, OCR_LANG
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class OCRQueueFull(Exception):
+    """Raised when a non-blocking submit finds the OCR queue full"""
+
+
+class OCRWorkerPool:
+    """Persistent pool of OCR workers shared across parses"""
+    
+    def __init__(self, max_workers: int = OCR_WORKERS,
+                 max_queue_depth: int = OCR_QUEUE_DEPTH,
+                 lang: str = OCR_LANG):
+        self.max_workers = max_workers
+        self.max_queue_depth = max(max_queue_depth, max_workers)
+        self.lang = lang
+        self.backend = 'tesserocr' if tesserocr is not None else 'pytesseract'
+        self.metrics = deque(maxlen=10000)  # Most recent per-page timings
+        
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='ocr-worker')
+        self._slots = threading.BoundedSemaphore(self.max_queue_depth)
+        self._local = threading.local()
+        self._apis = []
+        self._lock = threading.Lock()
+        self._pending = 0
+        logger.info(f"OCR pool started: {max_workers} workers, backend={self.backend}")
+    
+    @property
+    def queue_depth(self) -> int:
+        """Number of pages currently queued or being recognised"""
+        return self._pending
+    
+    def submit(self, image, page_num: Optional[int] = None,
+               block: bool = True, timeout: Optional[float] = None) -> Future:
+        """
+        Queue a page image for OCR
+        
+        Args:
+            image: PIL image of the page (or region)
+            page_num: Page number, recorded in the timing metrics
+            block: Wait for a free queue slot instead of raising
+            timeout: Max seconds to wait for a slot when blocking
+        
+        Returns:
+            Future resolving to the recognised text
+        """
+        if not self._slots.acquire(blocking=block, timeout=timeout if block else None):
+            raise OCRQueueFull(f"OCR queue full ({self.max_queue_depth} pages)")
+        
+        with self._lock:
+            self._pending += 1
+        
+        timing = {'page': page_num, 'queue_ms': None, 'ocr_ms': None}
+        try:
+            future = self._executor.submit(self._recognise, image, timing, time.perf_counter())
+        except Exception:
+            self._release()
+            raise
+        # Filled in by the worker; lets callers report their own pages' timings
+        future.timing = timing
+        future.add_done_callback(lambda _: self._release())
+        return future
+    
+    async def ocr(self, image, page_num: Optional[int] = None) -> str:
+        """Async wrapper around submit() for use from event loops"""
+        loop = asyncio.get_running_loop()
+        # Wait for a queue slot off the event loop so back-pressure doesn't stall it
+        future = await loop.run_in_executor(None, self.submit, image, page_num)
+        return await asyncio.wrap_future(future)
+    
+    def ocr_sync(self, image, page_num: Optional[int] = None,
+                 timeout: float = OCR_TIMEOUT) -> str:
+        """Submit a page and wait for its text"""
+        return self.submit(image, page_num).result(timeout=timeout)
+    
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+    
+    def _get_api(self):
+        """Return this worker thread's long-lived Tesseract API handle"""
+        api = getattr(self._local, 'api', None)
+        if api is None:
+            api = tesserocr.PyTessBaseAPI(lang=self.lang)
+            self._local.api = api
+            with self._lock:
+                self._apis.append(api)
+        return api
+    
+    def _recognise(self, image, timing: Dict, queued_at: float) -> str:
+        """Run OCR on one image inside a worker thread"""
+        started = time.perf_counter()
+        if tesserocr is not None:
+            api = self._get_api()
+            api.SetImage(image)
+            text = api.GetUTF8Text()
+        else:
+            text = pytesseract.image_to_string(image, lang=self.lang)
+        finished = time.perf_counter()
+        
+        timing['queue_ms'] = (started - queued_at) * 1000
+        timing['ocr_ms'] = (finished - started) * 1000
+        with self._lock:
+            self.metrics.append(timing)
+        return text
+    
+    def stats(self) -> Dict:
+        """Summarise per-page OCR timings recorded so far"""
+        with self._lock:
+            ocr_times = sorted(m['ocr_ms'] for m in self.metrics)
+            queue_times = [m['queue_ms'] for m in self.metrics]
+        
+        if not ocr_times:
+            return {'pages': 0, 'backend': self.backend}
+        
+        return {
+            'pages': len(ocr_times),
+            'backend': self.backend,
+            'mean_ocr_ms': sum(ocr_times) / len(ocr_times),
+            'p95_ocr_ms': ocr_times[min(len(ocr_times) - 1, int(len(ocr_times) * 0.95))],
+            'max_ocr_ms': ocr_times[-1],
+            'mean_queue_ms': sum(queue_times) / len(queue_times)
+        }
+    
+    def shutdown(self, wait: bool = True):
+        """Stop the workers and release Tesseract handles"""
+        self._executor.shutdown(wait=wait)
+        with self._lock:
+            for api in self._apis:
+                api.End()
+            self._apis.clear()
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_ocr_pool() -> OCRWorkerPool:
+    """Return the process-wide OCR pool, starting it on first use"""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = OCRWorkerPool()
+        return _shared_pool
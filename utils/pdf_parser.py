@@ -1,92 +1,282 @@
 import pdfplumber
-import pytesseract
 from PIL import Image
 import io
 import re
-from typing import Dict, List, Optional
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+from collections import defaultdict
 import logging
 
+from config import OCR_RESOLUTION, OCR_TIMEOUT
+from .ocr_pool import OCRWorkerPool, get_ocr_pool
+from .instrumentation import instrumentation
+from .profiling import profiled, file_hash
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+class ParseCancelled(Exception):
+    """Raised when a parse is cancelled through its cancel event"""
+
+
 class PDFParser:
     """Parse PDF bills and extract text content"""
     
-    def __init__(self):
+    # Bump when extraction output changes, so stored artefacts are re-parsed
+    VERSION = 1
+    
+    def __init__(self, ocr_pool: Optional[OCRWorkerPool] = None):
         self.text_content = ""
         self.tables = []
         self.metadata = {}
+        self.ocr_pool = ocr_pool
     
-    def parse_pdf(self, pdf_file) -> Dict:
+    @profiled('parse_pdf', key=lambda self, pdf_file, *args, **kwargs: file_hash(pdf_file))
+    def parse_pdf(self, pdf_file, regions: Optional[Dict[str, Dict]] = None,
+                  progress: Optional[Callable[[int, int], None]] = None,
+                  cancel: Optional[threading.Event] = None) -> Dict:
         """
         Parse PDF file and extract text and tables
         
         Args:
             pdf_file: Uploaded PDF file object
+            regions: Optional field regions (see config.BILL_REGIONS). When
+                given, only those regions are extracted/OCR'd instead of
+                every full page.
+            progress: Called as progress(pages_done, total_pages) whenever
+                a page's text is available (scanned pages once OCR'd)
+            cancel: When set, parsing stops at the next page and raises
+                ParseCancelled
             
         Returns:
             Dictionary with extracted text, tables, and metadata
         """
         try:
-            with pdfplumber.open(pdf_file) as pdf:
+            with instrumentation.span('parse', regions=bool(regions)), \
+                    pdfplumber.open(pdf_file) as pdf:
                 # Extract metadata
                 self.metadata = {
                     'num_pages': len(pdf.pages),
                     'metadata': pdf.metadata
                 }
+                instrumentation.incr('pages', len(pdf.pages))
+                
+                if regions:
+                    return self._parse_regions(pdf, regions)
                 
-                all_text = []
+                page_text = []
+                ocr_jobs = {}
                 all_tables = []
+                total_pages = len(pdf.pages)
                 
                 # Process each page
                 for page_num, page in enumerate(pdf.pages, 1):
-                    # Extract text
-                    text = page.extract_text()
-                    if text:
-                        all_text.append(text)
-                    else:
-                        # If no text, try OCR
-                        logger.info(f"No text found on page {page_num}, attempting OCR...")
-                        text = self._ocr_page(page)
-                        if text:
-                            all_text.append(text)
-                    
-                    # Extract tables
-                    tables = page.extract_tables()
-                    if tables:
-                        all_tables.extend(tables)
+                    self._check_cancelled(cancel, ocr_jobs)
+                    with instrumentation.span('page', page=page_num):
+                        # Extract text
+                        text = page.extract_text()
+                        page_text.append(text)
+                        if not text:
+                            # If no text, queue OCR and keep extracting other pages
+                            logger.info(f"No text found on page {page_num}, queueing OCR...")
+                            future = self._submit_ocr(page, page_num)
+                            if future is not None:
+                                ocr_jobs[page_num - 1] = future
+                        
+                        # Extract tables
+                        with instrumentation.span('table'):
+                            tables = page.extract_tables()
+                        if tables:
+                            all_tables.extend(tables)
+                    if progress is not None and text:
+                        progress(page_num - len(ocr_jobs), total_pages)
+                
+                # Collect OCR results in page order
+                for done, (index, future) in enumerate(ocr_jobs.items(), 1):
+                    self._check_cancelled(cancel, ocr_jobs)
+                    page_text[index] = self._collect_ocr(future, index + 1)
+                    if progress is not None:
+                        progress(total_pages - len(ocr_jobs) + done, total_pages)
+                if ocr_jobs:
+                    self.metadata['ocr_pages'] = [future.timing for future in ocr_jobs.values()]
                 
-                self.text_content = "\n\n".join(all_text)
+                self.text_content = "\n\n".join(text for text in page_text if text)
                 self.tables = all_tables
                 
                 # Extract structured data
-                structured_data = self._extract_structured_data()
+                with instrumentation.span('regex'):
+                    structured_data = self._extract_structured_data()
                 
                 return {
                     'text': self.text_content,
                     'tables': self.tables,
                     'metadata': self.metadata,
-                    'structured_data': structured_data
+                    'structured_data': structured_data,
+                    'page_text': [text or "" for text in page_text]
                 }
                 
+        except ParseCancelled:
+            logger.info("PDF parsing cancelled")
+            raise
         except Exception as e:
             logger.error(f"Error parsing PDF: {str(e)}")
             raise
     
-    def _ocr_page(self, page) -> str:
-        """Perform OCR on a page image"""
-        try:
-            # Convert page to image
-            img = page.to_image(resolution=300)
-            pil_img = img.original
+    @staticmethod
+    def _check_cancelled(cancel: Optional[threading.Event], ocr_jobs: Dict[int, Future]):
+        """Raise ParseCancelled (dropping queued OCR) once cancel is set"""
+        if cancel is not None and cancel.is_set():
+            for future in ocr_jobs.values():
+                future.cancel()
+            raise ParseCancelled()
+    
+    def _parse_regions(self, pdf, regions: Dict[str, Dict]) -> Dict:
+        """Extract only the given page regions (crop-based mode)"""
+        region_text = {}
+        all_tables = []
+        
+        for name, spec in regions.items():
+            page_num = spec.get('page', 1)
+            if page_num > len(pdf.pages):
+                logger.info(f"Region '{name}' is on page {page_num}, bill has {len(pdf.pages)} pages")
+                continue
             
-            # Perform OCR
-            text = pytesseract.image_to_string(pil_img)
-            return text
+            page = pdf.pages[page_num - 1]
+            cropped = page.crop(self._region_bbox(page, spec['bbox']))
+            
+            text = cropped.extract_text()
+            if not text:
+                logger.info(f"No text found in region '{name}', attempting OCR...")
+                text = self._ocr_page(cropped)
+            region_text[name] = text or ""
+            
+            if spec.get('tables'):
+                with instrumentation.span('table', region=name):
+                    tables = cropped.extract_tables()
+                if tables:
+                    all_tables.extend(tables)
+        
+        self.text_content = "\n\n".join(text for text in region_text.values() if text)
+        self.tables = all_tables
+        
+        with instrumentation.span('regex'):
+            structured_data = self._extract_structured_data()
+        
+        return {
+            'text': self.text_content,
+            'tables': self.tables,
+            'metadata': self.metadata,
+            'structured_data': structured_data,
+            'regions': region_text
+        }
+    
+    @staticmethod
+    def _region_bbox(page, bbox: Tuple[float, float, float, float]) -> Tuple[float, float, float, float]:
+        """Convert a fractional (x0, top, x1, bottom) box to page coordinates"""
+        x0, top, x1, bottom = bbox
+        return (
+            page.bbox[0] + x0 * page.width,
+            page.bbox[1] + top * page.height,
+            page.bbox[0] + x1 * page.width,
+            page.bbox[1] + bottom * page.height
+        )
+    
+    def learn_regions(self, pdf_file, anchors: Optional[Dict[str, List[str]]] = None,
+                      padding: float = 0.02) -> Dict[str, Dict]:
+        """
+        Learn field regions from a sample bill with a text layer
+        
+        Each region is the band of the first page containing its anchor
+        label. The charges table region runs from its anchor down to the
+        total line.
+        
+        Args:
+            pdf_file: Sample PDF of the layout to learn
+            anchors: Region name -> label words (defaults to config.REGION_ANCHORS)
+            padding: Vertical padding added around each band, as a page fraction
+            
+        Returns:
+            Regions in the same format as config.BILL_REGIONS
+        """
+        if anchors is None:
+            from config import REGION_ANCHORS
+            anchors = REGION_ANCHORS
+        
+        regions = {}
+        with pdfplumber.open(pdf_file) as pdf:
+            page = pdf.pages[0]
+            words = page.extract_words()
+            
+            # Group words into lines so multi-word labels can be matched
+            lines = defaultdict(list)
+            for word in words:
+                lines[round(word['top'])].append(word)
+            
+            bands = {}
+            for name, labels in anchors.items():
+                for top in sorted(lines):
+                    line_words = lines[top]
+                    line_text = " ".join(w['text'] for w in line_words).lower()
+                    if any(label in line_text for label in labels):
+                        bands[name] = (
+                            min(w['top'] for w in line_words),
+                            max(w['bottom'] for w in line_words)
+                        )
+                        break
+            
+            for name, (top, bottom) in bands.items():
+                if name == 'charges_table' and 'total' in bands:
+                    bottom = max(bottom, bands['total'][0])
+                regions[name] = {
+                    'bbox': (
+                        0.0,
+                        max(0.0, (top - page.bbox[1]) / page.height - padding),
+                        1.0,
+                        min(1.0, (bottom - page.bbox[1]) / page.height + padding)
+                    ),
+                    'page': 1
+                }
+                if name == 'charges_table':
+                    regions[name]['tables'] = True
+        
+        return regions
+    
+    def _get_ocr_pool(self) -> OCRWorkerPool:
+        """Return the OCR pool, defaulting to the shared process-wide one"""
+        if self.ocr_pool is None:
+            self.ocr_pool = get_ocr_pool()
+        return self.ocr_pool
+    
+    def _submit_ocr(self, page, page_num: Optional[int] = None) -> Optional[Future]:
+        """Render a page (or cropped region) and queue it on the OCR pool"""
+        try:
+            # Rendering stays on this thread; pdfplumber pages aren't shared
+            img = page.to_image(resolution=OCR_RESOLUTION)
+            instrumentation.incr('ocr_pages')
+            return self._get_ocr_pool().submit(img.original, page_num)
         except Exception as e:
             logger.error(f"OCR failed: {str(e)}")
+            return None
+    
+    def _collect_ocr(self, future: Future, page_num: Optional[int] = None) -> str:
+        """Wait for a queued OCR job"""
+        try:
+            text = future.result(timeout=OCR_TIMEOUT)
+            instrumentation.record('ocr', future.timing['ocr_ms'], page=page_num,
+                                   queue_ms=future.timing['queue_ms'])
+            return text
+        except Exception as e:
+            logger.error(f"OCR failed on page {page_num}: {str(e)}")
+            return ""
+    
+    def _ocr_page(self, page) -> str:
+        """Perform OCR on a page image"""
+        future = self._submit_ocr(page)
+        if future is None:
             return ""
+        return self._collect_ocr(future)
     
     def _extract_structured_data(self) -> Dict:
         """Extract structured data like amounts, dates, account numbers"""
@@ -94,7 +284,9 @@ class PDFParser:
             'amounts': [],
             'dates': [],
             'account_numbers': [],
-            'bill_type': None
+            'bill_type': None,
+            'provider': None,
+            'units_consumed': None
         }
         
         # Extract amounts (LKR)
@@ -134,6 +326,17 @@ class PDFParser:
             matches = re.findall(pattern, self.text_content, re.IGNORECASE)
             data['account_numbers'].extend(matches)
         
+        # Extract units consumed (kWh / m3), used for tariff checks
+        units_match = re.search(
+            r'Units\s*(?:Consumed|Used)?\s*:?\s*([0-9,]+(?:\.\d+)?)\s*(?:kWh|units|m3)?',
+            self.text_content, re.IGNORECASE
+        )
+        if units_match:
+            try:
+                data['units_consumed'] = float(units_match.group(1).replace(',', ''))
+            except ValueError:
+                pass
+        
         # Detect bill type
         from config import BILL_TYPES
         text_lower = self.text_content.lower()
@@ -143,4 +346,12 @@ class PDFParser:
                 data['bill_type'] = bill_type
                 break
         
+        # Detect provider
+        from config import PROVIDERS
+        for provider, names in PROVIDERS.items():
+            if any(re.search(rf'\b{re.escape(name)}\b', self.text_content, re.IGNORECASE)
+                   for name in names):
+                data['provider'] = provider
+                break
+        
         return data
\ No newline at end of file
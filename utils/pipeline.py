@@ -0,0 +1,234 @@
+import hashlib
+import json
+from pathlib import Path
+import threading
+from typing import Callable, Dict, Iterator, List, Optional
+import logging
+
+from config import ARTEFACT_DIR
+from .dedup import DedupIndex
+from .pdf_parser import PDFParser
+from .profiling import file_hash
+from .search import BillSearchIndex
+from .tariffs import get_tariff_engine
+from .text_analyzer import TextAnalyzer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STAGES = ('parse', 'line_items', 'categorize', 'anomalies')
+
+
+class ArtefactStore:
+    """Per-bill stage outputs on disk, each tagged with the fingerprint that produced it"""
+    
+    def __init__(self, root: Path = ARTEFACT_DIR):
+        self.root = Path(root)
+    
+    def _path(self, bill_id: str, stage: str) -> Path:
+        return self.root / bill_id / f"{stage}.json"
+    
+    def load(self, bill_id: str, stage: str) -> Optional[Dict]:
+        path = self._path(bill_id, stage)
+        try:
+            return json.loads(path.read_text())
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            logger.error(f"Corrupt artefact {path}: {str(e)}")
+            return None
+    
+    def save(self, bill_id: str, stage: str, fingerprint: str, version: str, output):
+        path = self._path(bill_id, stage)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp')
+        tmp.write_text(json.dumps({
+            'stage': stage,
+            'version': version,
+            'fingerprint': fingerprint,
+            'output': output
+        }, default=str))
+        tmp.replace(path)
+    
+    def bill_ids(self) -> Iterator[str]:
+        if not self.root.is_dir():
+            return iter(())
+        return (path.name for path in sorted(self.root.iterdir()) if path.is_dir())
+
+
+class BillPipeline:
+    """
+    Parse -> line items -> categorize -> anomalies, with persisted artefacts
+    
+    Each stage's fingerprint hashes its own version with its input's
+    fingerprint. A stage is recomputed only when that fingerprint differs
+    from the stored one, so changing the categorization keywords re-runs
+    categorize and anomalies from stored line items without touching the PDF.
+    
+    With a DedupIndex, uploads that duplicate an already stored bill (same
+    file, or a rescan with the same key fields / close SimHash) are served
+    from that bill's artefacts without parsing or OCR. With a
+    BillSearchIndex, bills are (re-)indexed whenever their text or
+    categories change.
+    """
+    
+    def __init__(self, parser: Optional[PDFParser] = None,
+                 analyzer: Optional[TextAnalyzer] = None,
+                 store: Optional[ArtefactStore] = None,
+                 dedup: Optional[DedupIndex] = None,
+                 search: Optional[BillSearchIndex] = None):
+        self.parser = parser or PDFParser()
+        self.analyzer = analyzer or TextAnalyzer()
+        self.store = store or ArtefactStore()
+        self.dedup = dedup
+        self.search = search
+    
+    def stage_versions(self) -> Dict[str, str]:
+        """Current version of the code/rules behind each stage"""
+        return {
+            'parse': f"parser-{PDFParser.VERSION}",
+            'line_items': f"extract-{TextAnalyzer.EXTRACTION_VERSION}",
+            'categorize': f"keywords-{self.analyzer.rules_version}",
+            'anomalies': f"rules-{self.analyzer.rule_engine.version}-tariffs-{get_tariff_engine().version}"
+        }
+    
+    @staticmethod
+    def _fingerprint(stage: str, version: str, upstream: str) -> str:
+        return hashlib.sha256(f"{stage}|{version}|{upstream}".encode('utf-8')).hexdigest()[:16]
+    
+    def _run_stage(self, bill_id: str, stage: str, upstream: str,
+                   compute: Callable[[], object], recomputed: List[str]):
+        version = self.stage_versions()[stage]
+        fingerprint = self._fingerprint(stage, version, upstream)
+        stored = self.store.load(bill_id, stage)
+        if stored is not None and stored.get('fingerprint') == fingerprint:
+            return stored['output'], fingerprint
+        
+        output = compute()
+        self.store.save(bill_id, stage, fingerprint, version, output)
+        recomputed.append(stage)
+        return output, fingerprint
+    
+    def process(self, pdf_file=None, bill_id: Optional[str] = None,
+                historical_data: Optional[List[Dict]] = None,
+                progress: Optional[Callable[[int, int], None]] = None,
+                cancel: Optional[threading.Event] = None) -> Dict:
+        """
+        Run (or refresh) every stage for one bill
+        
+        Args:
+            pdf_file: The bill PDF; only needed if the parse stage must run
+            bill_id: Stored bill id (file hash); computed from pdf_file if omitted
+            historical_data: Previous bills, for the anomaly stage. Stored
+                with the bill; when omitted, the history from the bill's
+                last run is reused (pass [] for no history)
+            progress: Passed to PDFParser.parse_pdf when the bill is parsed
+            cancel: Passed to PDFParser.parse_pdf; setting it stops the
+                parse with ParseCancelled
+        
+        Returns:
+            Dictionary with parsed data, charges, anomalies, insights, the
+            list of stages that had to be recomputed and, for duplicate
+            uploads, 'duplicate_of' (the stored bill id that was reused)
+        """
+        if bill_id is None and pdf_file is None:
+            raise ValueError("process() needs a pdf_file or a stored bill_id")
+        
+        dedup = None
+        if self.dedup is not None and pdf_file is not None:
+            dedup = self.dedup.check(pdf_file, self.parser)
+            bill_id = dedup['bill_id']
+            original = dedup['duplicate_of']
+            if original and original != bill_id and self.store.load(original, 'parse') is not None:
+                try:
+                    result = self.process(bill_id=original, historical_data=historical_data)
+                except ValueError as e:
+                    # Original can't be refreshed without its PDF; parse this upload instead
+                    logger.info(f"Not reusing bill {original[:12]}: {str(e)}")
+                else:
+                    result['duplicate_of'] = original
+                    result['dedup'] = {key: dedup[key] for key in ('bill_id', 'match', 'distance')}
+                    return result
+        
+        if bill_id is None:
+            bill_id = file_hash(pdf_file)
+        recomputed: List[str] = []
+        
+        def parse():
+            if pdf_file is None:
+                raise ValueError(f"Parse artefact for bill {bill_id[:12]} is missing or stale; "
+                                 "the PDF is required")
+            if hasattr(pdf_file, 'seek'):
+                pdf_file.seek(0)
+            return self.parser.parse_pdf(pdf_file, progress=progress, cancel=cancel)
+        
+        parsed, parse_fp = self._run_stage(bill_id, 'parse', bill_id, parse, recomputed)
+        structured_data = parsed['structured_data']
+        
+        extracted, items_fp = self._run_stage(
+            bill_id, 'line_items', parse_fp,
+            lambda: self.analyzer.extract_line_items(parsed['text'], structured_data, bill_id),
+            recomputed
+        )
+        
+        charges, charges_fp = self._run_stage(
+            bill_id, 'categorize', items_fp,
+            lambda: self.analyzer.categorize_line_items(extracted, structured_data, bill_id),
+            recomputed
+        )
+        
+        if self.search is not None and ('categorize' in recomputed or not self.search.contains(bill_id)):
+            self.search.add_bill(bill_id, parsed['text'], charges, structured_data)
+        
+        historical_data, history_fp = self._history(bill_id, historical_data)
+        anomalies, _ = self._run_stage(
+            bill_id, 'anomalies', f"{charges_fp}|{history_fp}",
+            lambda: self.analyzer.detect_anomalies(charges, historical_data, structured_data),
+            recomputed
+        )
+        
+        if recomputed:
+            logger.info(f"Bill {bill_id[:12]}: recomputed {', '.join(recomputed)}")
+        if dedup is not None and dedup['signature'] is not None:
+            self.dedup.add(bill_id, dedup['signature'])
+        
+        return {
+            'bill_id': bill_id,
+            'parsed': parsed,
+            'charges': charges,
+            'anomalies': anomalies,
+            'insights': self.analyzer.generate_insights(charges, structured_data.get('bill_type')),
+            'recomputed': recomputed,
+            'duplicate_of': None
+        }
+    
+    def _history(self, bill_id: str, historical_data: Optional[List[Dict]]):
+        """The anomaly stage's history input and its fingerprint, persisted with the bill"""
+        stored = self.store.load(bill_id, 'history')
+        if historical_data is None:
+            if stored is not None:
+                return stored['output'], stored['fingerprint']
+            historical_data = []
+        
+        history_fp = hashlib.sha256(
+            json.dumps(historical_data, sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()[:16]
+        if stored is None or stored['fingerprint'] != history_fp:
+            self.store.save(bill_id, 'history', history_fp, 'history', historical_data)
+        return historical_data, history_fp
+    
+    def reprocess_all(self) -> Dict[str, List[str]]:
+        """
+        Refresh every stored bill from its artefacts (e.g. after a keyword change),
+        re-running anomalies against each bill's stored history
+        
+        Returns:
+            Bill id -> stages recomputed (bills needing a re-parse are skipped)
+        """
+        refreshed = {}
+        for bill_id in self.store.bill_ids():
+            try:
+                refreshed[bill_id] = self.process(bill_id=bill_id)['recomputed']
+            except ValueError as e:
+                logger.error(str(e))
+        return refreshed
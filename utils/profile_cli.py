@@ -0,0 +1,36 @@
+"""
+Summarise profiles captured by utils.profiling.
+
+Usage:
+    python -m utils.profile_cli list
+    python -m utils.profile_cli summarize <bill hash> [--top 20] [--stage parse_pdf]
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.profiling import list_profiles, summarize
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='List profiled bills')
+    summary = commands.add_parser('summarize', help='Show hot functions and allocation sites')
+    summary.add_argument('bill_id', help='Bill hash (a unique prefix is enough)')
+    summary.add_argument('--top', type=int, default=15)
+    summary.add_argument('--stage', help='Only this stage (parse_pdf, analyze_charges, explain_bill)')
+    args = arg_parser.parse_args()
+    
+    if args.command == 'list':
+        list_profiles()
+    else:
+        summarize(args.bill_id, args.top, args.stage)
+
+
+if __name__ == '__main__':
+    main()
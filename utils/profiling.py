@@ -0,0 +1,237 @@
+"""
+Opt-in per-bill profiling.
+
+Profiling is enabled for every request with BILLBUSTER_PROFILE=1, or for a
+single bill with the profile_bill() context manager. Each profiled stage
+(parse_pdf, analyze_charges - or extract_line_items and
+categorize_line_items when BillPipeline runs them separately - and
+explain_bill) writes a cProfile stats file and a tracemalloc snapshot to
+PROFILE_DIR/<bill hash>/. Stages are keyed by the
+bill's file hash: background jobs run each bill inside profile_bill(), and
+direct callers pass bill_id (analyze_charges, categorize_line_items) or
+bill_data['bill_id'] (explain_bill).
+
+Summarise captured profiles with:
+    python -m utils.profile_cli list
+    python -m utils.profile_cli summarize <bill hash> [--top 20] [--stage parse_pdf]
+"""
+import cProfile
+import hashlib
+import json
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from pathlib import Path
+from typing import Callable, Optional
+import logging
+
+from config import PROFILE_ENABLED, PROFILE_DIR
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_session_bill: ContextVar[Optional[str]] = ContextVar('billbuster_profile_bill', default=None)
+_active_stage: ContextVar[Optional[str]] = ContextVar('billbuster_profile_stage', default=None)
+
+# tracemalloc is process-wide: profiled calls overlapping on worker threads
+# share one trace, which is stopped by the last of them to finish
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_owned = False
+
+
+def file_hash(pdf_file) -> str:
+    """
+    SHA-256 of a bill's bytes
+    
+    Args:
+        pdf_file: Path, bytes or a seekable file object (position is restored)
+    """
+    if isinstance(pdf_file, (bytes, bytearray)):
+        return hashlib.sha256(pdf_file).hexdigest()
+    if isinstance(pdf_file, (str, Path)):
+        return hashlib.sha256(Path(pdf_file).read_bytes()).hexdigest()
+    
+    position = pdf_file.tell()
+    pdf_file.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: pdf_file.read(1 << 20), b''):
+        digest.update(chunk)
+    pdf_file.seek(position)
+    return digest.hexdigest()
+
+
+def _content_hash(value) -> str:
+    payload = json.dumps(value, sort_keys=True, default=str) if not isinstance(value, str) else value
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+@contextmanager
+def profile_bill(pdf_file=None, bill_id: Optional[str] = None):
+    """
+    Profile every stage run for one bill inside this block
+    
+    Args:
+        pdf_file: The uploaded bill; its hash names the artefact directory
+        bill_id: Use this id instead of hashing pdf_file
+    """
+    token = _session_bill.set(bill_id or file_hash(pdf_file))
+    try:
+        yield _session_bill.get()
+    finally:
+        _session_bill.reset(token)
+
+
+def _acquire_tracing():
+    global _tracing_users, _tracing_owned
+    with _tracing_lock:
+        if _tracing_users == 0:
+            # Leave tracing alone if someone else started it
+            _tracing_owned = not tracemalloc.is_tracing()
+            if _tracing_owned:
+                tracemalloc.start(25)
+        _tracing_users += 1
+
+
+def _release_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_owned:
+            tracemalloc.stop()
+
+
+def profiled(stage: str, key: Optional[Callable] = None):
+    """
+    Decorator that captures cProfile and tracemalloc data for a stage
+    
+    Args:
+        stage: Artefact name (parse_pdf, analyze_charges, explain_bill)
+        key: Returns the bill id (file hash) from the call's arguments when
+            no profile_bill() session is active; if it is missing or returns
+            None, the first argument after self is hashed instead
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            bill_id = _session_bill.get()
+            # cProfile can't nest, so inner stages run under the outer capture
+            if (bill_id is None and not PROFILE_ENABLED) or _active_stage.get() is not None:
+                return func(*args, **kwargs)
+            
+            if bill_id is None:
+                try:
+                    bill_id = (key(*args, **kwargs) if key else None) or \
+                        _content_hash(args[1] if len(args) > 1 else None)
+                except Exception as e:
+                    logger.error(f"Could not key profile for {stage}: {str(e)}")
+                    return func(*args, **kwargs)
+            
+            return _run_profiled(stage, bill_id, func, args, kwargs)
+        return wrapper
+    return decorator
+
+
+def _run_profiled(stage: str, bill_id: str, func, args, kwargs):
+    """Run func under cProfile + tracemalloc; profiling errors never fail the call"""
+    try:
+        _acquire_tracing()
+    except Exception as e:
+        logger.error(f"Could not start profiling {stage}: {str(e)}")
+        return func(*args, **kwargs)
+    
+    profiler = cProfile.Profile()
+    stage_token = _active_stage.set(stage)
+    start = time.perf_counter()
+    try:
+        try:
+            profiler.enable()
+        except Exception as e:
+            logger.error(f"Could not start cProfile for {stage}: {str(e)}")
+            profiler = None
+        return func(*args, **kwargs)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        elapsed = time.perf_counter() - start
+        _active_stage.reset(stage_token)
+        try:
+            _save_profile(stage, bill_id, profiler, elapsed)
+        except Exception as e:
+            logger.error(f"Could not save profile of {stage} for bill {bill_id[:12]}: {str(e)}")
+        finally:
+            _release_tracing()
+
+
+def _save_profile(stage: str, bill_id: str, profiler: Optional[cProfile.Profile], elapsed: float):
+    out_dir = PROFILE_DIR / bill_id
+    out_dir.mkdir(parents=True, exist_ok=True)
+    snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    
+    if profiler is not None:
+        profiler.dump_stats(str(out_dir / f"{stage}.prof"))
+    snapshot.dump(str(out_dir / f"{stage}.tracemalloc"))
+    (out_dir / f"{stage}.json").write_text(json.dumps({
+        'stage': stage,
+        'bill_id': bill_id,
+        'seconds': elapsed,
+        'peak_traced_bytes': peak,
+        'captured_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }, indent=2))
+    logger.info(f"Profiled {stage} for bill {bill_id[:12]} in {elapsed:.2f}s -> {out_dir}")
+
+
+def summarize(bill_id: str, top: int = 15, stage: Optional[str] = None, out=sys.stdout):
+    """Print the hottest functions and allocation sites for a profiled bill"""
+    bill_dir = PROFILE_DIR / bill_id
+    if not bill_dir.is_dir():
+        matches = [path for path in PROFILE_DIR.glob(f"{bill_id}*") if path.is_dir()]
+        if len(matches) != 1:
+            raise SystemExit(f"No unique profile found for '{bill_id}' in {PROFILE_DIR}")
+        bill_dir = matches[0]
+    
+    for meta_path in sorted(bill_dir.glob('*.json')):
+        meta = json.loads(meta_path.read_text())
+        if stage and meta['stage'] != stage:
+            continue
+        
+        print(f"\n=== {meta['stage']} ({meta['seconds']:.3f}s, "
+              f"peak {meta['peak_traced_bytes'] / 1e6:.1f} MB traced) ===", file=out)
+        
+        prof_path = bill_dir / f"{meta['stage']}.prof"
+        if prof_path.exists():
+            print(f"\nTop {top} functions by cumulative time:", file=out)
+            stats = pstats.Stats(str(prof_path), stream=out)
+            stats.strip_dirs().sort_stats('cumulative').print_stats(top)
+        else:
+            print("\n(no cProfile data captured)", file=out)
+        
+        print(f"Top {top} allocation sites:", file=out)
+        snapshot = tracemalloc.Snapshot.load(str(bill_dir / f"{meta['stage']}.tracemalloc"))
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>')
+        ])
+        for stat in snapshot.statistics('lineno')[:top]:
+            frame = stat.traceback[0]
+            print(f"  {stat.size / 1024:10.1f} KiB {stat.count:8d} blocks  {frame.filename}:{frame.lineno}",
+                  file=out)
+
+
+def list_profiles(out=sys.stdout):
+    """Print the profiled bills and their stages"""
+    if not PROFILE_DIR.is_dir():
+        print("No profiles captured yet", file=out)
+        return
+    for bill_dir in sorted(PROFILE_DIR.iterdir(), key=lambda path: path.stat().st_mtime):
+        stages = []
+        for meta_path in sorted(bill_dir.glob('*.json')):
+            meta = json.loads(meta_path.read_text())
+            stages.append(f"{meta['stage']}={meta['seconds']:.2f}s")
+        print(f"{bill_dir.name[:16]}  {'  '.join(stages)}", file=out)
\ No newline at end of file
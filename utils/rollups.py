@@ -0,0 +1,192 @@
+import json
+import re
+import threading
+from collections import defaultdict
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+from config import ROLLUP_FILE
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = ('month', 'provider', 'bill_type', 'account', 'category')
+
+# Pre-aggregated cubes maintained on every ingest. Groupings without
+# 'category' sum bill totals; groupings with it sum category amounts.
+GROUPINGS = [
+    ('month',),
+    ('provider',),
+    ('bill_type',),
+    ('category',),
+    ('account',),
+    ('month', 'provider'),
+    ('month', 'bill_type'),
+    ('month', 'category'),
+    ('provider', 'category'),
+    ('month', 'provider', 'category')
+]
+
+
+def bill_date(dates: List[str]) -> Optional[date]:
+    """First parseable bill date (Sri Lankan bills are day-first)"""
+    for value in dates or []:
+        value = value.replace('/', '-')
+        for fmt in ('%d-%m-%Y', '%Y-%m-%d', '%d-%m-%y'):
+            try:
+                return datetime.strptime(value, fmt).date()
+            except ValueError:
+                continue
+    return None
+
+
+def billing_month(dates: List[str]) -> str:
+    """First parseable bill date as YYYY-MM"""
+    first = bill_date(dates)
+    return first.strftime('%Y-%m') if first else 'unknown'
+
+
+class RollupEngine:
+    """Incrementally maintained spend cubes for portfolio dashboards"""
+    
+    def __init__(self, path: Optional[Path] = ROLLUP_FILE, groupings: List[Tuple[str, ...]] = None):
+        self.path = Path(path) if path else None
+        self.groupings = [tuple(grouping) for grouping in (groupings or GROUPINGS)]
+        # grouping -> cell key -> [amount, bill count]
+        self.cubes: Dict[Tuple[str, ...], Dict[Tuple, List[float]]] = {
+            grouping: defaultdict(lambda: [0.0, 0]) for grouping in self.groupings
+        }
+        # bill id -> contribution, so re-ingesting a bill replaces it
+        self.bills: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        
+        if self.path and self.path.exists():
+            self.load()
+    
+    @staticmethod
+    def contribution(charges: Dict, structured_data: Dict) -> Dict:
+        """Reduce an analysed bill to the values the cubes aggregate"""
+        accounts = structured_data.get('account_numbers') or []
+        account = next((a for a in accounts if re.search(r'\d', a)), 'unknown')
+        return {
+            'month': billing_month(structured_data.get('dates')),
+            'provider': structured_data.get('provider') or 'unknown',
+            'bill_type': structured_data.get('bill_type') or 'unknown',
+            'account': account,
+            'total': float(charges.get('total_amount', 0) or 0),
+            'categories': {category: float(amount)
+                           for category, amount in charges.get('summary', {}).items()}
+        }
+    
+    def ingest(self, bill_id: str, charges: Dict, structured_data: Dict):
+        """
+        Add (or replace) one bill's contribution to every cube
+        
+        Args:
+            bill_id: Stable id for the bill (e.g. its file hash)
+            charges: Output of TextAnalyzer.analyze_charges
+            structured_data: Output of PDFParser structured data
+        """
+        contribution = self.contribution(charges, structured_data)
+        with self._lock:
+            previous = self.bills.get(bill_id)
+            if previous is not None:
+                self._apply(previous, -1)
+            self._apply(contribution, 1)
+            self.bills[bill_id] = contribution
+            self._dirty = True
+    
+    def remove(self, bill_id: str):
+        """Remove a bill's contribution"""
+        with self._lock:
+            previous = self.bills.pop(bill_id, None)
+            if previous is not None:
+                self._apply(previous, -1)
+                self._dirty = True
+    
+    def _apply(self, contribution: Dict, sign: int):
+        for grouping, cube in self.cubes.items():
+            if 'category' in grouping:
+                for category, amount in contribution['categories'].items():
+                    key = tuple(category if dim == 'category' else contribution[dim]
+                                for dim in grouping)
+                    self._add(cube, key, amount * sign, sign)
+            else:
+                key = tuple(contribution[dim] for dim in grouping)
+                self._add(cube, key, contribution['total'] * sign, sign)
+    
+    @staticmethod
+    def _add(cube: Dict, key: Tuple, amount: float, count: int):
+        cell = cube[key]
+        cell[0] += amount
+        cell[1] += count
+        if cell[1] <= 0:
+            del cube[key]
+    
+    def rollup(self, *dims: str, measure: str = 'amount',
+               filters: Optional[Dict[str, Iterable]] = None) -> Dict[Tuple, float]:
+        """
+        Read a pre-aggregated cube
+        
+        Args:
+            *dims: Dimensions to group by, e.g. ('month', 'provider')
+            measure: 'amount' (LKR) or 'bills' (bill count)
+            filters: Optional dimension -> allowed values
+        
+        Returns:
+            Cell key tuple -> measure value, sorted by key
+        """
+        grouping = tuple(dims)
+        if grouping not in self.cubes:
+            raise ValueError(f"No rollup maintained for {grouping}; available: {self.groupings}")
+        
+        index = 0 if measure == 'amount' else 1
+        allowed = {dim: set(values) for dim, values in (filters or {}).items()}
+        with self._lock:
+            cells = list(self.cubes[grouping].items())
+        
+        result = {}
+        for key, cell in sorted(cells):
+            if any(key[grouping.index(dim)] not in values
+                   for dim, values in allowed.items() if dim in grouping):
+                continue
+            result[key] = cell[index]
+        return result
+    
+    def save(self, path: Optional[Path] = None):
+        """Persist the cubes and per-bill contributions as JSON"""
+        path = Path(path or self.path)
+        with self._save_lock:
+            with self._lock:
+                payload = json.dumps({'groupings': [list(g) for g in self.groupings], 'bills': self.bills})
+                self._dirty = False
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix('.tmp')
+            tmp.write_text(payload)
+            tmp.replace(path)
+    
+    def flush(self):
+        """Save to the engine's file if bills were ingested or removed since the last save"""
+        if self.path is not None and self._dirty:
+            self.save()
+    
+    def load(self, path: Optional[Path] = None):
+        """Load saved contributions and rebuild the cubes"""
+        path = Path(path or self.path)
+        try:
+            payload = json.loads(path.read_text())
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load rollups from {path}: {str(e)}")
+            return
+        
+        with self._lock:
+            self.bills = payload.get('bills', {})
+            self.cubes = {grouping: defaultdict(lambda: [0.0, 0]) for grouping in self.groupings}
+            for contribution in self.bills.values():
+                self._apply(contribution, 1)
+            self._dirty = False
+        logger.info(f"Loaded rollups for {len(self.bills)} bills")
@@ -0,0 +1,310 @@
+"""
+Search over ingested bills.
+
+Line items and bill text go into SQLite FTS5 tables (porter-stemmed, so
+"fees" matches "Fee"), joined to a bills table for provider / type / date
+filters, e.g. reconnection fees from LECO in 2025:
+
+    index.search("reconnection fee", provider="LECO", date_from="2025-01-01",
+                 date_to="2025-12-31")
+
+Bills are re-indexed in place when ingested again. With
+SEMANTIC_SEARCH_ENABLED (and chromadb installed), line items are also
+embedded into a local chromadb collection for similarity queries.
+"""
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+from config import (SEARCH_DB, SEMANTIC_SEARCH_ENABLED, SEMANTIC_INDEX_DIR,
+                    EMBEDDING_MODEL)
+from .rollups import bill_date
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_QUERY_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+# FTS5 walks rowids in order and can stop at the limit; rank must score every match
+_ORDER = {'recent': 'f.rowid DESC', 'relevance': 'f.rank'}
+
+
+def fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query: every word must match (as a prefix)"""
+    return " ".join(f'"{token}"*' for token in _QUERY_TOKEN_RE.findall(text))
+
+
+def _date_filters(date_from: Optional[str], date_to: Optional[str]) -> Tuple[List[str], List]:
+    clauses, params = [], []
+    if date_from:
+        clauses.append("b.bill_date >= ?")
+        params.append(str(date_from))
+    if date_to:
+        clauses.append("b.bill_date <= ?")
+        params.append(str(date_to))
+    return clauses, params
+
+
+class SemanticIndex:
+    """Line-item embeddings in a local chromadb collection"""
+    
+    def __init__(self, path: Path = SEMANTIC_INDEX_DIR, model_name: str = EMBEDDING_MODEL):
+        import chromadb
+        from chromadb.utils import embedding_functions
+        
+        client = chromadb.PersistentClient(path=str(path))
+        self.collection = client.get_or_create_collection(
+            'line_items',
+            embedding_function=embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model_name)
+        )
+    
+    def add_bill(self, bill_id: str, items: List[Dict], metadata: Dict):
+        self.remove_bill(bill_id)
+        if not items:
+            return
+        self.collection.add(
+            ids=[f"{bill_id}:{i}" for i in range(len(items))],
+            documents=[f"{item['description']} ({item['category']})" for item in items],
+            metadatas=[dict(metadata, bill_id=bill_id, amount=float(item['amount'])) for item in items]
+        )
+    
+    def remove_bill(self, bill_id: str):
+        self.collection.delete(where={'bill_id': bill_id})
+    
+    def query(self, text: str, limit: int = 20, where: Optional[Dict] = None) -> List[Dict]:
+        result = self.collection.query(query_texts=[text], n_results=limit, where=where or None)
+        return [
+            dict(metadata, document=document, distance=distance)
+            for document, metadata, distance in zip(result['documents'][0], result['metadatas'][0],
+                                                    result['distances'][0])
+        ]
+
+
+class BillSearchIndex:
+    """Incrementally updated full-text index of bills and their line items"""
+    
+    def __init__(self, path: Path = SEARCH_DB, semantic: bool = SEMANTIC_SEARCH_ENABLED):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS bills (
+                bill_id TEXT PRIMARY KEY,
+                provider TEXT,
+                bill_type TEXT,
+                bill_date TEXT,
+                account TEXT,
+                total REAL
+            );
+            CREATE INDEX IF NOT EXISTS bills_filter ON bills (provider, bill_date);
+            CREATE TABLE IF NOT EXISTS line_items (
+                id INTEGER PRIMARY KEY,
+                bill_id TEXT,
+                description TEXT,
+                category TEXT,
+                amount REAL
+            );
+            CREATE INDEX IF NOT EXISTS line_items_bill ON line_items (bill_id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS line_items_fts USING fts5(
+                description, category, content='line_items', content_rowid='id',
+                tokenize='porter unicode61'
+            );
+            CREATE TRIGGER IF NOT EXISTS line_items_ai AFTER INSERT ON line_items BEGIN
+                INSERT INTO line_items_fts (rowid, description, category)
+                VALUES (new.id, new.description, new.category);
+            END;
+            CREATE TRIGGER IF NOT EXISTS line_items_ad AFTER DELETE ON line_items BEGIN
+                INSERT INTO line_items_fts (line_items_fts, rowid, description, category)
+                VALUES ('delete', old.id, old.description, old.category);
+            END;
+            CREATE TABLE IF NOT EXISTS bill_text (
+                id INTEGER PRIMARY KEY,
+                bill_id TEXT UNIQUE,
+                text TEXT
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS bill_text_fts USING fts5(
+                text, content='bill_text', content_rowid='id', tokenize='porter unicode61'
+            );
+            CREATE TRIGGER IF NOT EXISTS bill_text_ai AFTER INSERT ON bill_text BEGIN
+                INSERT INTO bill_text_fts (rowid, text) VALUES (new.id, new.text);
+            END;
+            CREATE TRIGGER IF NOT EXISTS bill_text_ad AFTER DELETE ON bill_text BEGIN
+                INSERT INTO bill_text_fts (bill_text_fts, rowid, text) VALUES ('delete', old.id, old.text);
+            END;
+        """)
+        
+        self.semantic = None
+        if semantic:
+            try:
+                self.semantic = SemanticIndex()
+            except ImportError:
+                logger.warning("chromadb is not installed; semantic search is disabled")
+    
+    def _delete(self, bill_id: str):
+        self._conn.execute("DELETE FROM line_items WHERE bill_id = ?", (bill_id,))
+        self._conn.execute("DELETE FROM bill_text WHERE bill_id = ?", (bill_id,))
+        self._conn.execute("DELETE FROM bills WHERE bill_id = ?", (bill_id,))
+    
+    def add_bill(self, bill_id: str, text: str, charges: Dict, structured_data: Dict):
+        """
+        Index (or re-index) one bill
+        
+        Args:
+            bill_id: Stable bill id (file hash)
+            text: Extracted bill text
+            charges: Categorized charges from TextAnalyzer
+            structured_data: Structured data from PDF parser
+        """
+        self.add_bills([(bill_id, text, charges, structured_data)])
+    
+    def add_bills(self, bills: Iterable[Tuple[str, str, Dict, Dict]]):
+        """Index many (bill_id, text, charges, structured_data) in one transaction"""
+        semantic_batch = []
+        with self._lock, self._conn:
+            for bill_id, text, charges, structured_data in bills:
+                self._delete(bill_id)
+                first_date = bill_date(structured_data.get('dates', []))
+                accounts = structured_data.get('account_numbers') or [None]
+                row = {
+                    'provider': structured_data.get('provider'),
+                    'bill_type': structured_data.get('bill_type'),
+                    'bill_date': first_date.isoformat() if first_date else None
+                }
+                self._conn.execute(
+                    "INSERT INTO bills (bill_id, provider, bill_type, bill_date, account, total) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (bill_id, row['provider'], row['bill_type'], row['bill_date'], accounts[0],
+                     charges.get('total_amount'))
+                )
+                self._conn.executemany(
+                    "INSERT INTO line_items (bill_id, description, category, amount) VALUES (?, ?, ?, ?)",
+                    [(bill_id, item['description'], item['category'], item['amount'])
+                     for item in charges.get('line_items', [])]
+                )
+                if text:
+                    self._conn.execute("INSERT INTO bill_text (bill_id, text) VALUES (?, ?)", (bill_id, text))
+                if self.semantic is not None:
+                    semantic_batch.append((bill_id, charges.get('line_items', []),
+                                           {key: value or '' for key, value in row.items()}))
+        
+        for bill_id, items, metadata in semantic_batch:
+            self.semantic.add_bill(bill_id, items, metadata)
+    
+    def remove_bill(self, bill_id: str):
+        with self._lock, self._conn:
+            self._delete(bill_id)
+        if self.semantic is not None:
+            self.semantic.remove_bill(bill_id)
+    
+    def search(self, query: str, provider: Optional[str] = None, bill_type: Optional[str] = None,
+               category: Optional[str] = None, date_from: Optional[str] = None,
+               date_to: Optional[str] = None, limit: int = 50, order: str = 'recent') -> List[Dict]:
+        """
+        Find line items matching a free-text query
+        
+        Args:
+            query: Words to match in line-item descriptions (all must match)
+            provider: Canonical provider name (see config.PROVIDERS)
+            bill_type: Bill type (see config.BILL_TYPES)
+            category: Charge category
+            date_from: Earliest bill date, ISO format (inclusive)
+            date_to: Latest bill date, ISO format (inclusive)
+            limit: Maximum number of results
+            order: 'recent' (most recently ingested first) or 'relevance'
+                (BM25). Relevance scores every match before applying the
+                limit, so it is much slower for common terms.
+        
+        Returns:
+            Matching line items with their bill's id, provider, type and date
+        """
+        match = fts_query(query)
+        if not match:
+            return []
+        
+        clauses = ["line_items_fts MATCH ?"]
+        params: List = [f"description : ({match})"]
+        for column, value in (('b.provider', provider), ('b.bill_type', bill_type), ('li.category', category)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        date_clauses, date_params = _date_filters(date_from, date_to)
+        clauses += date_clauses
+        params += date_params + [limit]
+        
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT li.bill_id, li.description, li.category, li.amount, "
+                "b.provider, b.bill_type, b.bill_date "
+                "FROM line_items_fts f "
+                "JOIN line_items li ON li.id = f.rowid "
+                "JOIN bills b ON b.bill_id = li.bill_id "
+                f"WHERE {' AND '.join(clauses)} ORDER BY {_ORDER[order]} LIMIT ?", params
+            ).fetchall()
+        
+        columns = ('bill_id', 'description', 'category', 'amount', 'provider', 'bill_type', 'bill_date')
+        return [dict(zip(columns, row)) for row in rows]
+    
+    def search_bills(self, query: str, provider: Optional[str] = None,
+                     date_from: Optional[str] = None, date_to: Optional[str] = None,
+                     limit: int = 20, order: str = 'recent') -> List[Dict]:
+        """
+        Find bills whose text matches a free-text query
+        
+        Returns:
+            Bills with a highlighted snippet, ordered as in search()
+        """
+        match = fts_query(query)
+        if not match:
+            return []
+        
+        clauses = ["bill_text_fts MATCH ?"]
+        params: List = [match]
+        if provider:
+            clauses.append("b.provider = ?")
+            params.append(provider)
+        date_clauses, date_params = _date_filters(date_from, date_to)
+        clauses += date_clauses
+        params += date_params + [limit]
+        
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT t.bill_id, b.provider, b.bill_type, b.bill_date, b.total, "
+                "snippet(bill_text_fts, 0, '[', ']', '...', 12) "
+                "FROM bill_text_fts f "
+                "JOIN bill_text t ON t.id = f.rowid "
+                "JOIN bills b ON b.bill_id = t.bill_id "
+                f"WHERE {' AND '.join(clauses)} ORDER BY {_ORDER[order]} LIMIT ?", params
+            ).fetchall()
+        
+        columns = ('bill_id', 'provider', 'bill_type', 'bill_date', 'total', 'snippet')
+        return [dict(zip(columns, row)) for row in rows]
+    
+    def similar(self, query: str, provider: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """
+        Semantically similar line items (needs SEMANTIC_SEARCH_ENABLED)
+        
+        Returns:
+            Line items with bill id, metadata and embedding distance
+        """
+        if self.semantic is None:
+            raise RuntimeError("Semantic search is disabled; set BILLBUSTER_SEMANTIC_SEARCH=1 "
+                               "and install chromadb")
+        return self.semantic.query(query, limit, {'provider': provider} if provider else None)
+    
+    def contains(self, bill_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM bills WHERE bill_id = ?", (bill_id,)).fetchone()
+        return row is not None
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM bills").fetchone()[0]
+    
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+
+from config import TARIFFS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class SlabTable:
+    """
+    One tariff regime precomputed for O(log slabs) lookups
+    
+    bounds[i] is the upper unit limit of slab i and cumulative[i] the energy
+    charge for consuming exactly bounds[i] units, so the charge for any
+    consumption is one bisect plus one multiply-add.
+    """
+    
+    def __init__(self, slabs: List[Tuple[Optional[float], float]], fixed: List[float]):
+        self.bounds = np.array([np.inf if upper is None else float(upper) for upper, _ in slabs])
+        self.rates = np.array([float(rate) for _, rate in slabs])
+        self.fixed = np.array([float(charge) for charge in fixed]
+                              + [float(fixed[-1] if fixed else 0)] * (len(slabs) - len(fixed)))
+        
+        widths = np.diff(np.concatenate(([0.0], self.bounds)))
+        # Cost up to the start of each slab
+        self.starts = np.concatenate(([0.0], self.bounds[:-1]))
+        self.base = np.concatenate(([0.0], np.cumsum(widths[:-1] * self.rates[:-1])))
+        self.cumulative = self.base + widths * self.rates
+        self._bounds_list = self.bounds.tolist()
+    
+    def charge(self, units: float) -> Tuple[float, float]:
+        """Energy and fixed charge for one consumption"""
+        slab = min(bisect_left(self._bounds_list, units), len(self._bounds_list) - 1)
+        energy = self.base[slab] + (units - self.starts[slab]) * self.rates[slab]
+        return float(energy), float(self.fixed[slab])
+    
+    def charges(self, units: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectorized charge() over an array of consumptions"""
+        slab = np.minimum(np.searchsorted(self.bounds, units, side='left'), len(self.bounds) - 1)
+        energy = self.base[slab] + (units - self.starts[slab]) * self.rates[slab]
+        return energy, self.fixed[slab]
+
+
+class Tariff:
+    """A tariff revision: regimes selected by total consumption"""
+    
+    def __init__(self, spec: Dict):
+        self.effective_from = date.fromisoformat(spec['effective_from'])
+        regimes = spec['regimes']
+        self.regime_limits = [np.inf if regime.get('max_units') is None else float(regime['max_units'])
+                              for regime in regimes]
+        self.tables = [SlabTable(regime['slabs'], regime.get('fixed', [])) for regime in regimes]
+    
+    def charge(self, units: float) -> Tuple[float, float]:
+        regime = min(bisect_left(self.regime_limits, units), len(self.tables) - 1)
+        return self.tables[regime].charge(units)
+    
+    def charges(self, units: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        energy = np.empty(len(units))
+        fixed = np.empty(len(units))
+        regime = np.minimum(np.searchsorted(self.regime_limits, units, side='left'), len(self.tables) - 1)
+        for index, table in enumerate(self.tables):
+            mask = regime == index
+            if mask.any():
+                energy[mask], fixed[mask] = table.charges(units[mask])
+        return energy, fixed
+
+
+class TariffEngine:
+    """Expected usage charges by provider and bill date"""
+    
+    def __init__(self, tariffs: Optional[Dict[str, List[Dict]]] = None):
+        tariffs = TARIFFS if tariffs is None else tariffs
+        # Fingerprint of the tariff tables, for incremental re-analysis
+        self.version = hashlib.sha256(
+            json.dumps(tariffs, sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()[:16]
+        # Compiled once; revisions sorted by effective date for bisect lookup
+        self.revisions: Dict[str, List[Tariff]] = {
+            provider: sorted((Tariff(spec) for spec in specs), key=lambda t: t.effective_from)
+            for provider, specs in tariffs.items()
+        }
+        self._dates = {provider: [t.effective_from for t in revisions]
+                       for provider, revisions in self.revisions.items()}
+    
+    def tariff_for(self, provider: Optional[str], on: Optional[date]) -> Optional[Tariff]:
+        """Tariff revision in force for a provider on a date (latest if date unknown)"""
+        revisions = self.revisions.get(provider)
+        if not revisions:
+            return None
+        if on is None:
+            return revisions[-1]
+        index = bisect_right(self._dates[provider], on) - 1
+        return revisions[index] if index >= 0 else None
+    
+    def expected_charge(self, provider: Optional[str], units: Optional[float],
+                        on: Optional[date] = None) -> Optional[Tuple[float, float]]:
+        """
+        Recompute a bill's charges from units consumed
+        
+        Args:
+            provider: Canonical provider (CEB, LECO, ...)
+            units: Units consumed in the billing period
+            on: Bill date, used to pick the tariff revision
+        
+        Returns:
+            (energy charge, fixed charge) in LKR, or None without a tariff
+        """
+        tariff = self.tariff_for(provider, on)
+        if tariff is None or units is None:
+            return None
+        return tariff.charge(units)
+    
+    def expected_charges(self, providers: Sequence[Optional[str]], units: np.ndarray,
+                         dates: Sequence[Optional[date]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Vectorized expected_charge() over a batch of bills
+        
+        Returns:
+            Energy and fixed charge arrays (NaN where no tariff applies)
+        """
+        units = np.asarray(units, dtype=np.float64)
+        energy = np.full(len(units), np.nan)
+        fixed = np.full(len(units), np.nan)
+        
+        # Group bills by tariff revision, then evaluate each group at once.
+        # Bills share a handful of (provider, date) pairs, so lookups are memoized.
+        groups: Dict[int, List[int]] = {}
+        tariffs: Dict[int, Tariff] = {}
+        lookups: Dict[Tuple, Optional[Tariff]] = {}
+        has_units = ~np.isnan(units)
+        for index, key in enumerate(zip(providers, dates)):
+            if not has_units[index]:
+                continue
+            if key not in lookups:
+                lookups[key] = self.tariff_for(*key)
+            tariff = lookups[key]
+            if tariff is not None:
+                groups.setdefault(id(tariff), []).append(index)
+                tariffs[id(tariff)] = tariff
+        
+        for key, indices in groups.items():
+            rows = np.asarray(indices)
+            energy[rows], fixed[rows] = tariffs[key].charges(units[rows])
+        return energy, fixed
+
+
+_shared_engine = None
+_shared_engine_lock = threading.Lock()
+
+
+def get_tariff_engine() -> TariffEngine:
+    """Return the process-wide tariff engine"""
+    global _shared_engine
+    with _shared_engine_lock:
+        if _shared_engine is None:
+            _shared_engine = TariffEngine()
+        return _shared_engine
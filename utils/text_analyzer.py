@@ -1,8 +1,15 @@
 import re
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import json
 import logging
 from collections import defaultdict
 
+from .instrumentation import instrumentation
+from .profiling import profiled
+from .rollups import RollupEngine
+from .anomaly_rules import RuleEngine, get_rule_engine
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -10,7 +17,13 @@ logger = logging.getLogger(__name__)
 class TextAnalyzer:
     """Analyze bill text to extract charges, categories, and insights"""
     
-    def __init__(self):
+    # Bump when extract_line_items output changes
+    EXTRACTION_VERSION = 1
+    
+    def __init__(self, rollups: Optional[RollupEngine] = None,
+                 rule_engine: Optional[RuleEngine] = None):
+        self.rollups = rollups
+        self.rule_engine = rule_engine or get_rule_engine()
         self.charge_keywords = {
             'fixed_charges': ['fixed charge', 'rental', 'basic charge', 'standing charge'],
             'usage_charges': ['usage', 'consumption', 'units', 'kwh', 'mb', 'gb'],
@@ -19,46 +32,71 @@ class TextAnalyzer:
             'discounts': ['discount', 'concession', 'rebate', 'waiver']
         }
     
-    def analyze_charges(self, text: str, structured_data: Dict) -> Dict:
+    @property
+    def rules_version(self) -> str:
+        """Fingerprint of the categorization keywords, for incremental re-analysis"""
+        payload = json.dumps(self.charge_keywords, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+    
+    @profiled('analyze_charges', key=lambda self, text, structured_data=None, bill_id=None: bill_id)
+    @instrumentation.timed('analyze')
+    def analyze_charges(self, text: str, structured_data: Dict,
+                        bill_id: Optional[str] = None) -> Dict:
         """
         Analyze and categorize charges from bill text
         
         Args:
             text: Extracted bill text
             structured_data: Structured data from PDF parser
+            bill_id: Stable bill id (e.g. file hash) used for portfolio
+                rollups; defaults to a hash of the text
             
         Returns:
             Dictionary with categorized charges
         """
-        charges = {
+        extracted = self.extract_line_items(text, structured_data, bill_id)
+        return self.categorize_line_items(
+            extracted,
+            structured_data,
+            bill_id or hashlib.sha256(text.encode('utf-8')).hexdigest()
+        )
+    
+    @profiled('extract_line_items',
+              key=lambda self, text, structured_data=None, bill_id=None: bill_id)
+    def extract_line_items(self, text: str, structured_data: Dict,
+                           bill_id: Optional[str] = None) -> Dict:
+        """
+        Extract raw (uncategorized) line items and the bill total from text
+        
+        Args:
+            text: Extracted bill text
+            structured_data: Structured data from PDF parser
+            bill_id: Bill file hash, used to key profiling artefacts
+            
+        Returns:
+            Dictionary with 'line_items' (description/amount) and 'total_amount'
+        """
+        extracted = {
             'total_amount': 0,
-            'categories': defaultdict(list),
-            'line_items': [],
-            'taxes': [],
-            'summary': {}
+            'line_items': []
         }
         
         # Extract line items with amounts
-        lines = text.split('\n')
-        for line in lines:
-            # Look for patterns like "Description ... Amount"
-            amount_match = re.search(r'([0-9,]+\.?\d*)\s*$', line.strip())
-            if amount_match:
-                amount = float(amount_match.group(1).replace(',', ''))
-                description = line[:amount_match.start()].strip()
-                
-                if description and len(description) > 3:
-                    item = {
-                        'description': description,
-                        'amount': amount,
-                        'category': self._categorize_charge(description)
-                    }
-                    charges['line_items'].append(item)
-                    charges['categories'][item['category']].append(item)
-        
-        # Calculate totals per category
-        for category, items in charges['categories'].items():
-            charges['summary'][category] = sum(item['amount'] for item in items)
+        with instrumentation.span('regex'):
+            lines = text.split('\n')
+            for line in lines:
+                # Look for patterns like "Description ... Amount"
+                amount_match = re.search(r'([0-9,]+\.?\d*)\s*$', line.strip())
+                if amount_match:
+                    amount = float(amount_match.group(1).replace(',', ''))
+                    description = line[:amount_match.start()].strip()
+                    
+                    if description and len(description) > 3:
+                        extracted['line_items'].append({
+                            'description': description,
+                            'amount': amount
+                        })
+        instrumentation.incr('line_items', len(extracted['line_items']))
         
         # Find total amount
         total_patterns = [
@@ -69,12 +107,55 @@ class TextAnalyzer:
         for pattern in total_patterns:
             match = re.search(pattern, text, re.IGNORECASE)
             if match:
-                charges['total_amount'] = float(match.group(1).replace(',', ''))
+                extracted['total_amount'] = float(match.group(1).replace(',', ''))
                 break
         
         # If total not found, sum all amounts
-        if charges['total_amount'] == 0 and structured_data.get('amounts'):
-            charges['total_amount'] = max(structured_data['amounts'])
+        if extracted['total_amount'] == 0 and structured_data.get('amounts'):
+            extracted['total_amount'] = max(structured_data['amounts'])
+        
+        return extracted
+    
+    @profiled('categorize_line_items',
+              key=lambda self, extracted, structured_data=None, bill_id=None: bill_id)
+    def categorize_line_items(self, extracted: Dict, structured_data: Optional[Dict] = None,
+                              bill_id: Optional[str] = None) -> Dict:
+        """
+        Categorize raw line items (output of extract_line_items)
+        
+        Args:
+            extracted: Raw line items and total
+            structured_data: Structured data from PDF parser, for rollups
+            bill_id: When given (and rollups are enabled), the bill's
+                portfolio contribution is updated
+            
+        Returns:
+            Dictionary with categorized charges
+        """
+        charges = {
+            'total_amount': extracted['total_amount'],
+            'categories': defaultdict(list),
+            'line_items': [],
+            'taxes': [],
+            'summary': {}
+        }
+        
+        with instrumentation.span('categorize', line_items=len(extracted['line_items'])):
+            for raw in extracted['line_items']:
+                item = {
+                    'description': raw['description'],
+                    'amount': raw['amount'],
+                    'category': self._categorize_charge(raw['description'])
+                }
+                charges['line_items'].append(item)
+                charges['categories'][item['category']].append(item)
+        
+        # Calculate totals per category
+        for category, items in charges['categories'].items():
+            charges['summary'][category] = sum(item['amount'] for item in items)
+        
+        if self.rollups is not None and bill_id is not None:
+            self.rollups.ingest(bill_id, charges, structured_data or {})
         
         return charges
     
@@ -88,70 +169,40 @@ class TextAnalyzer:
         
         return 'Other Charges'
     
+    @instrumentation.timed('anomalies')
     def detect_anomalies(self, current_charges: Dict, 
-                        historical_data: List[Dict] = None) -> List[Dict]:
+                        historical_data: List[Dict] = None,
+                        structured_data: Dict = None) -> List[Dict]:
         """
         Detect unusual charges or patterns
         
         Args:
             current_charges: Current bill charges
             historical_data: Previous bills data (if available)
+            structured_data: Structured data from PDF parser, used by rules
+                scoped to a bill type or provider
             
         Returns:
             List of detected anomalies
         """
-        anomalies = []
-        
-        # Check for unusually high amounts
-        if current_charges.get('total_amount', 0) > 50000:  # LKR
-            anomalies.append({
-                'type': 'high_total',
-                'severity': 'warning',
-                'message': f"Bill amount (Rs. {current_charges['total_amount']:,.2f}) is unusually high",
-                'suggestion': 'Please verify your consumption and check for any penalties or arrears'
-            })
-        
-        # Check for penalty charges
-        for item in current_charges.get('line_items', []):
-            if any(word in item['description'].lower() 
-                   for word in ['penalty', 'late fee', 'interest', 'arrears']):
-                anomalies.append({
-                    'type': 'penalty_charge',
-                    'severity': 'alert',
-                    'message': f"Penalty charge detected: {item['description']} - Rs. {item['amount']:,.2f}",
-                    'suggestion': 'Consider paying bills on time to avoid penalty charges'
-                })
-        
-        # Check VAT percentage (should be 15% in Sri Lanka)
-        taxes = current_charges.get('summary', {}).get('Taxes', 0)
-        if taxes > 0:
-            other_charges = current_charges.get('total_amount', 0) - taxes
-            if other_charges > 0:
-                vat_percentage = (taxes / other_charges) * 100
-                if vat_percentage > 18 or vat_percentage < 12:
-                    anomalies.append({
-                        'type': 'unusual_tax',
-                        'severity': 'info',
-                        'message': f"Tax percentage ({vat_percentage:.1f}%) seems unusual",
-                        'suggestion': 'Standard VAT in Sri Lanka is 15%'
-                    })
-        
-        # Compare with historical data if available
-        if historical_data:
-            avg_amount = sum(bill.get('total_amount', 0) for bill in historical_data) / len(historical_data)
-            current_amount = current_charges.get('total_amount', 0)
+        return self.rule_engine.evaluate(current_charges, historical_data, structured_data)
+    
+    def detect_anomalies_bulk(self, bills: List[Dict],
+                              historical_data: List[List[Dict]] = None,
+                              structured_data: List[Dict] = None) -> List[List[Dict]]:
+        """
+        Detect anomalies over a batch of bills in vectorized form
+        
+        Args:
+            bills: Charges of each bill (output of analyze_charges)
+            historical_data: Optional previous bills for each bill, aligned with bills
+            structured_data: Optional structured data for each bill, aligned with bills
             
-            from config import ANOMALY_THRESHOLD
-            if current_amount > avg_amount * ANOMALY_THRESHOLD:
-                increase_pct = ((current_amount - avg_amount) / avg_amount) * 100
-                anomalies.append({
-                    'type': 'usage_spike',
-                    'severity': 'warning',
-                    'message': f"Bill is {increase_pct:.1f}% higher than your average",
-                    'suggestion': 'Check for increased usage or meter reading errors'
-                })
-        
-        return anomalies
+        Returns:
+            One anomaly list per bill, same dicts as detect_anomalies
+        """
+        from .bulk_anomalies import scan_bills
+        return scan_bills(bills, historical_data, structured_data, self.rule_engine)
     
     def generate_insights(self, charges: Dict, bill_type: str = None) -> List[str]:
         """Generate helpful insights about the bill"""
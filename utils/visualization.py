@@ -1,18 +1,162 @@
 import plotly.graph_objects as go
 import plotly.express as px
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional
+from collections import OrderedDict
+from datetime import datetime
+import hashlib
+import json
+import pickle
+import threading
 import pandas as pd
 
+from config import FIGURE_CACHE_SIZE, MAX_CHART_POINTS
+from .instrumentation import instrumentation
+
+# Figures keyed on chart kind + input content, shared across Streamlit reruns.
+# Each entry holds the figure and its JSON, serialised on first request.
+_figure_cache: "OrderedDict[str, List]" = OrderedDict()
+_figure_cache_lock = threading.Lock()
+
+
+def lttb_downsample(x: List[float], y: List[float], threshold: int) -> List[int]:
+    """
+    Largest-Triangle-Three-Buckets downsampling
+    
+    Keeps the first and last points and, from each bucket in between, the
+    point forming the largest triangle with its neighbours, so peaks and
+    dips survive.
+    
+    Args:
+        x: Numeric x values (ascending)
+        y: Y values
+        threshold: Number of points to keep
+    
+    Returns:
+        Indices of the points to keep
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    
+    bucket_size = (n - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        
+        # Average of the next bucket is the third triangle vertex
+        next_start = end
+        next_end = min(int((bucket + 2) * bucket_size) + 1, n)
+        count = next_end - next_start
+        avg_x = sum(x[next_start:next_end]) / count
+        avg_y = sum(y[next_start:next_end]) / count
+        
+        best, best_area = start, -1.0
+        ax, ay = x[a], y[a]
+        for i in range(start, end):
+            area = abs((ax - avg_x) * (y[i] - ay) - (ax - x[i]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = i, area
+        selected.append(best)
+        a = best
+    
+    selected.append(n - 1)
+    return selected
+
+
+def _x_positions(dates: List) -> List[float]:
+    """
+    Numeric x positions for history dates
+    
+    Either every date is a number/ISO date (epoch seconds), or the whole
+    series falls back to row indices - never a mix of the two on one axis.
+    """
+    positions = []
+    for value in dates:
+        if isinstance(value, (int, float)):
+            positions.append(float(value))
+            continue
+        try:
+            positions.append(datetime.fromisoformat(str(value)).timestamp())
+        except (TypeError, ValueError):
+            return [float(i) for i in range(len(dates))]
+    return positions
+
 
 class Visualizer:
     """Create visualizations for bill data"""
     
     @staticmethod
-    def create_pie_chart(charges_summary: Dict) -> go.Figure:
-        """Create a pie chart of charge categories"""
-        if not charges_summary:
+    def _cache_key(kind: str, data) -> str:
+        # pickle is several times faster than json.dumps on long histories
+        try:
+            payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            payload = json.dumps(data, sort_keys=True, default=str).encode('utf-8')
+        return hashlib.sha1(kind.encode('utf-8') + payload).hexdigest()
+    
+    @classmethod
+    def _cached(cls, kind: str, data, build: Callable[[], Optional[go.Figure]]) -> List:
+        """Return the [figure, json] cache entry for this chart, building it once"""
+        key = cls._cache_key(kind, data)
+        with _figure_cache_lock:
+            entry = _figure_cache.get(key)
+            if entry is not None:
+                _figure_cache.move_to_end(key)
+                instrumentation.incr('cache_hits')
+                return entry
+        
+        entry = [build(), None]
+        with _figure_cache_lock:
+            _figure_cache[key] = entry
+            while len(_figure_cache) > FIGURE_CACHE_SIZE:
+                _figure_cache.popitem(last=False)
+        return entry
+    
+    @staticmethod
+    def clear_cache():
+        """Drop all cached figures"""
+        with _figure_cache_lock:
+            _figure_cache.clear()
+    
+    @classmethod
+    def _entry(cls, kind: str, data, max_points: int = MAX_CHART_POINTS) -> Optional[List]:
+        if kind == 'comparison':
+            if not data or len(data) < 2:
+                return None
+            return cls._cached('comparison', [data, max_points],
+                               lambda: cls._build_comparison_chart(data, max_points))
+        
+        if not data:
             return None
+        build = cls._build_pie_chart if kind == 'pie' else cls._build_bar_chart
+        return cls._cached(kind, data, lambda: build(data))
+    
+    @classmethod
+    def chart_json(cls, kind: str, data) -> Optional[str]:
+        """
+        Pre-serialised plotly JSON for a chart, cached with the figure
         
+        Args:
+            kind: 'pie', 'bar' or 'comparison'
+            data: The charges summary (pie/bar) or history (comparison)
+        """
+        entry = cls._entry(kind, data)
+        if entry is None:
+            return None
+        if entry[1] is None:
+            entry[1] = entry[0].to_json()
+        return entry[1]
+    
+    @classmethod
+    def create_pie_chart(cls, charges_summary: Dict) -> go.Figure:
+        """Create a pie chart of charge categories (cached; treat as read-only)"""
+        entry = cls._entry('pie', charges_summary)
+        return entry[0] if entry else None
+    
+    @staticmethod
+    def _build_pie_chart(charges_summary: Dict) -> go.Figure:
         labels = list(charges_summary.keys())
         values = list(charges_summary.values())
         
@@ -32,25 +176,27 @@ class Visualizer:
         
         return fig
     
+    @classmethod
+    def create_bar_chart(cls, charges_summary: Dict) -> go.Figure:
+        """Create a bar chart of charges (cached; treat as read-only)"""
+        entry = cls._entry('bar', charges_summary)
+        return entry[0] if entry else None
+    
     @staticmethod
-    def create_bar_chart(charges_summary: Dict) -> go.Figure:
-        """Create a bar chart of charges"""
-        if not charges_summary:
-            return None
-        
-        df = pd.DataFrame(list(charges_summary.items()), 
-                         columns=['Category', 'Amount'])
-        df = df.sort_values('Amount', ascending=False)
+    def _build_bar_chart(charges_summary: Dict) -> go.Figure:
+        items = sorted(charges_summary.items(), key=lambda item: item[1], reverse=True)
+        categories = [category for category, _ in items]
+        amounts = [amount for _, amount in items]
         
         fig = go.Figure(data=[go.Bar(
-            x=df['Category'],
-            y=df['Amount'],
+            x=categories,
+            y=amounts,
             marker=dict(
-                color=df['Amount'],
+                color=amounts,
                 colorscale='Viridis',
                 showscale=True
             ),
-            text=df['Amount'].apply(lambda x: f'Rs. {x:,.2f}'),
+            text=[f'Rs. {amount:,.2f}' for amount in amounts],
             textposition='auto'
         )])
         
@@ -65,6 +211,54 @@ class Visualizer:
         
         return fig
     
+    @classmethod
+    def create_portfolio_chart(cls, rollup: Dict, title: str = "Portfolio Spend",
+                               x_title: str = "Month") -> go.Figure:
+        """
+        Create a stacked bar chart from a RollupEngine cube
+        
+        Args:
+            rollup: Output of RollupEngine.rollup() with one or two dimensions,
+                e.g. rollup('month', 'provider')
+            title: Chart title
+            x_title: Label for the first dimension
+        """
+        if not rollup:
+            return None
+        
+        entry = cls._cached('portfolio', [rollup, title, x_title],
+                            lambda: cls._build_portfolio_chart(rollup, title, x_title))
+        return entry[0]
+    
+    @staticmethod
+    def _build_portfolio_chart(rollup: Dict, title: str, x_title: str) -> go.Figure:
+        series = {}
+        for key, amount in rollup.items():
+            x_value = key[0]
+            name = key[1] if len(key) > 1 else 'Total'
+            series.setdefault(name, {})[x_value] = amount
+        x_values = sorted({key[0] for key in rollup})
+        
+        fig = go.Figure(data=[
+            go.Bar(
+                name=name,
+                x=x_values,
+                y=[points.get(x_value, 0) for x_value in x_values]
+            )
+            for name, points in sorted(series.items())
+        ])
+        
+        fig.update_layout(
+            title=title,
+            barmode='stack',
+            xaxis_title=x_title,
+            yaxis_title="Amount (LKR)",
+            font=dict(size=12),
+            height=450
+        )
+        
+        return fig
+    
     @staticmethod
     def create_line_items_table(line_items: List[Dict]) -> pd.DataFrame:
         """Create a formatted table of line items"""
@@ -76,26 +270,44 @@ class Visualizer:
         df.columns = ['Description', 'Amount', 'Category']
         return df
     
+    @classmethod
+    def create_comparison_chart(cls, historical_data: List[Dict],
+                                max_points: int = MAX_CHART_POINTS) -> go.Figure:
+        """Create a line chart comparing bills over time (cached; treat as read-only)"""
+        entry = cls._entry('comparison', historical_data, max_points)
+        return entry[0] if entry else None
+    
     @staticmethod
-    def create_comparison_chart(historical_data: List[Dict]) -> go.Figure:
-        """Create a line chart comparing bills over time"""
-        if not historical_data or len(historical_data) < 2:
-            return None
+    def _build_comparison_chart(historical_data: List[Dict], max_points: int) -> go.Figure:
+        dates = [bill['date'] for bill in historical_data]
+        amounts = [bill['amount'] for bill in historical_data]
+        avg = sum(amounts) / len(amounts)
         
-        df = pd.DataFrame(historical_data)
+        # Plot (and downsample) in date order; LTTB needs ascending x
+        positions = _x_positions(dates)
+        if any(b < a for a, b in zip(positions, positions[1:])):
+            order = sorted(range(len(positions)), key=positions.__getitem__)
+            dates = [dates[i] for i in order]
+            amounts = [amounts[i] for i in order]
+            positions = [positions[i] for i in order]
+        
+        # Long histories are downsampled for plotting; the average uses every bill
+        if len(amounts) > max_points:
+            keep = lttb_downsample(positions, amounts, max_points)
+            dates = [dates[i] for i in keep]
+            amounts = [amounts[i] for i in keep]
         
         fig = go.Figure()
         fig.add_trace(go.Scatter(
-            x=df['date'],
-            y=df['amount'],
+            x=dates,
+            y=amounts,
             mode='lines+markers',
             name='Bill Amount',
             line=dict(color='#2E86AB', width=3),
-            marker=dict(size=10)
+            marker=dict(size=10 if len(amounts) <= 60 else 4)
         ))
         
         # Add average line
-        avg = df['amount'].mean()
         fig.add_hline(
             y=avg,
             line_dash="dash",
@@ -112,4 +324,4 @@ class Visualizer:
             hovermode='x unified'
         )
         
-        return fig
\ No newline at end of file
+        return fig